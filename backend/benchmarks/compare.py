@@ -0,0 +1,55 @@
+import argparse
+import json
+import sys
+
+
+def compare(base: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Porównuje dwa wyniki benchmarku i zwraca opisy regresji większych niż threshold procent:
+    wzrost p95, spadek przepustowości lub wzrost liczby zapytań SQL na żądanie
+    """
+    regressions = []
+    print(f"{'operation':<14}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'rps base':>10}{'rps now':>10}{'change':>9}")
+    for name, now in [*current["operations"].items(), ("total", current["total"])]:
+        before = base["total"] if name == "total" else base["operations"].get(name)
+        if not before or not before["requests"] or not now["requests"]:
+            continue
+        p95_change = _change(before["p95_ms"], now["p95_ms"])
+        rps_change = _change(before["throughput_rps"], now["throughput_rps"])
+        print(f"{name:<14}{before['p95_ms']:>10}{now['p95_ms']:>10}{p95_change:>+8.1f}%"
+              f"{before['throughput_rps']:>10}{now['throughput_rps']:>10}{rps_change:>+8.1f}%")
+        if p95_change > threshold:
+            regressions.append(f"{name}: p95 latency {p95_change:+.1f}%")
+        if -rps_change > threshold:
+            regressions.append(f"{name}: throughput {rps_change:+.1f}%")
+
+    for route, now in sorted(current.get("queries_per_request", {}).items()):
+        before = base.get("queries_per_request", {}).get(route)
+        if before and now["statements"] > before["statements"]:
+            regressions.append(f"{route}: {before['statements']} -> {now['statements']} queries per request")
+    return regressions
+
+
+def _change(before: float, now: float) -> float:
+    return (now - before) / before * 100 if before else 0.0
+
+
+def main(argv=None):
+    """
+    Porównanie wyników benchmarku uruchamiane poleceniem python -m benchmarks.compare base.json new.json
+    """
+    parser = argparse.ArgumentParser(prog="benchmarks.compare", description="Compare two benchmark results")
+    parser.add_argument("base")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed regression in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as base, open(args.current, encoding="utf-8") as current:
+        regressions = compare(json.load(base), json.load(current), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
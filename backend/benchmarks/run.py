@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from .workload import DEFAULT_MIX, Workload, parse_sql_metrics, queries_per_request, watch_stats
+
+DEFAULT_DATABASE_URL = "sqlite:///benchmarks/bench.db"
+RESULTS_DIR = os.path.join("benchmarks", "results")
+SERVER_START_TIMEOUT_SECONDS = 60
+
+
+def parse_mix(value: str) -> dict:
+    """
+    Zamienia opis mieszanki obciążenia "list_books=30,get_book=40" na słownik wag
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, workers: int, write_limits: bool = False) -> tuple[subprocess.Popen, str]:
+    """
+    Uruchamia aplikację w osobnym procesie uvicorn, żeby klient benchmarku nie dzielił z nią GIL.
+    Cały ruch benchmarku przychodzi z jednego adresu, więc bez write_limits limity zapisów są wyłączane -
+    inaczej pomiar zapisów mierzyłby limiter zamiast serwera
+    """
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": database_url}
+    if not write_limits:
+        env.update(RATE_LIMIT_BACKEND="none", WRITE_CONCURRENCY_LIMIT="0", POOL_WAIT_SHED_MS="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_ready(client: httpx.AsyncClient, process: Optional[subprocess.Popen]):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit("Server process exited during startup")
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Server did not become ready in time")
+
+
+async def fetch_book_ids(client: httpx.AsyncClient, limit: int = 10000) -> list[int]:
+    """
+    Pobiera ID istniejących książek, gdy baza nie była wypełniana przez benchmark
+    """
+    ids, after = [], None
+    while len(ids) < limit:
+        params = {"limit": 1000, "include_reviews": "false", **({"after": after} if after else {})}
+        page = (await client.get("/books/", params=params)).json()
+        ids.extend(book["id"] for book in page)
+        if len(page) < 1000:
+            break
+        after = page[-1]["id"]
+    return ids
+
+
+async def benchmark(args, base_url: str, process: Optional[subprocess.Popen], book_ids: Optional[list[int]]) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await wait_until_ready(client, process)
+        admission = (await client.get("/admission")).json()
+        if not book_ids:
+            book_ids = await fetch_book_ids(client)
+        if not book_ids:
+            raise SystemExit("Database has no books, run the benchmark with seeding enabled")
+
+        workload = Workload(client, book_ids, args.mix, args.skew, args.seed)
+        if args.warmup:
+            await workload.run(args.concurrency, args.warmup, record=False)
+
+        metrics_before = parse_sql_metrics((await client.get("/metrics")).text)
+        ws_url = base_url.replace("http", "ws", 1) + "/ws"
+        started = time.perf_counter()
+        _, websocket = await asyncio.gather(
+            workload.run(args.concurrency, args.duration),
+            watch_stats(ws_url, args.ws_clients, args.duration),
+        )
+        elapsed = time.perf_counter() - started
+        metrics_after = parse_sql_metrics((await client.get("/metrics")).text)
+
+    return {
+        "admission": admission,
+        **workload.report(elapsed),
+        "queries_per_request": queries_per_request(metrics_before, metrics_after),
+        "websocket": websocket,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(result: dict):
+    print(f"{'operation':<14}{'requests':>10}{'errors':>8}{'rejected':>10}{'rps':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in [*result["operations"].items(), ("total", result["total"])]:
+        print(f"{name:<14}{stats['requests']:>10}{stats['errors']:>8}{stats['rejected']:>10}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    for route, stats in sorted(result["queries_per_request"].items()):
+        print(f"{route:<30} {stats['statements']:>6} queries/request {stats['sql_ms']:>9} ms SQL/request")
+
+
+def main(argv=None):
+    """
+    Benchmark API uruchamiany poleceniem python -m benchmarks.run z katalogu backend
+    """
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description="Load test of the Book Grading App API")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL, help="Database used for seeding and the server")
+    parser.add_argument("--base-url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--no-seed", action="store_true", help="Use the existing data instead of a new catalogue")
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of book popularity")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the catalogue and the workload")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Operation weights, e.g. list_books=30,get_book=40,list_reviews=20,add_review=10")
+    parser.add_argument("--ws-clients", type=int, default=10, help="WebSocket clients listening on /ws")
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn workers of the started server")
+    parser.add_argument("--write-limits", action="store_true",
+                        help="Keep the write rate and concurrency limits of the started server (disabled by default)")
+    parser.add_argument("--output", help="Result file, by default benchmarks/results/<time>-<commit>.json")
+    args = parser.parse_args(argv)
+
+    book_ids = None
+    if not args.no_seed:
+        from .seed import seed_catalogue
+        started = time.perf_counter()
+        engine = create_engine(args.database_url)
+        book_ids = seed_catalogue(engine, args.books, args.reviews, args.skew, args.seed)
+        engine.dispose()
+        print(f"Seeded {args.books} books and {args.reviews} reviews in {time.perf_counter() - started:.1f}s")
+
+    process, base_url = (None, args.base_url) if args.base_url else start_server(args.database_url, args.workers, args.write_limits)
+    try:
+        result = asyncio.run(benchmark(args, base_url, process, book_ids))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    commit = git_commit()
+    settings = {**vars(args), "database_url": make_url(args.database_url).render_as_string(hide_password=True)}
+    result = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "settings": settings,
+            "admission": result.pop("admission"),
+        },
+        **result,
+    }
+    print_summary(result)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import itertools
+import random
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from src import models, schemas
+from src.database import Base
+from src.services import review_service
+
+WORDS = (
+    "shadow river crown winter garden silent empire broken star glass ocean secret "
+    "last city hidden fire night journey forgotten kingdom storm iron golden moon "
+    "wild heart lost house dark light paper north dream stone bridge song road"
+).split()
+AUTHORS = [f"{first} {last}" for first, last in itertools.product(
+    ("Anna", "Jan", "Maria", "Piotr", "Ewa", "Tomasz", "Olga", "Marek"),
+    ("Nowak", "Kowalski", "Wiśniewska", "Lewandowski", "Zielińska", "Mazur"),
+)]
+# Rozkład ocen przesunięty w stronę wysokich ocen, jak w prawdziwych serwisach z recenzjami
+RATING_WEIGHTS = (5, 8, 17, 35, 35)
+GENRE_WEIGHTS = (30, 12, 18, 15, 8, 9, 8)
+
+
+def zipf_weights(size: int, skew: float) -> list[float]:
+    """
+    Zwraca wagi rozkładu Zipfa dla size elementów (element o randze k ma wagę 1 / k^skew)
+    """
+    return [1 / rank ** skew for rank in range(1, size + 1)]
+
+
+def seed_catalogue(
+    engine: Engine,
+    books: int = 10000,
+    reviews: int = 100000,
+    skew: float = 1.1,
+    seed: int = 42,
+    chunk_size: int = 5000,
+) -> list[int]:
+    """
+    Tworzy od nowa schemat i wypełnia bazę syntetycznym katalogiem. Liczba recenzji książek
+    ma rozkład Zipfa (kilka bestsellerów, długi ogon), gatunki i oceny również są nierównomierne.
+    Zwraca ID książek od najpopularniejszej
+    """
+    rng = random.Random(seed)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    with Session(engine) as db:
+        genre_names = [genre.value for genre in schemas.GenreEnum]
+        db.execute(insert(models.GenreDB), [{"name": name} for name in genre_names])
+        genre_ids = list(db.scalars(select(models.GenreDB.id).order_by(models.GenreDB.id)))
+
+        for start in range(0, books, chunk_size):
+            db.execute(insert(models.BookDB), [_book_row(rng) for _ in range(start, min(start + chunk_size, books))])
+        book_ids = list(db.scalars(select(models.BookDB.id).order_by(models.BookDB.id)))
+
+        genre_rows = []
+        for book_id in book_ids:
+            for genre_id in set(rng.choices(genre_ids, weights=GENRE_WEIGHTS, k=rng.randint(1, 3))):
+                genre_rows.append({"book_id": book_id, "genre_id": genre_id})
+        for start in range(0, len(genre_rows), chunk_size):
+            db.execute(insert(models.book_genres), genre_rows[start:start + chunk_size])
+
+        popularity = list(book_ids)
+        rng.shuffle(popularity)
+        cum_weights = list(itertools.accumulate(zipf_weights(len(popularity), skew)))
+        for start in range(0, reviews, chunk_size):
+            size = min(chunk_size, reviews - start)
+            targets = rng.choices(popularity, cum_weights=cum_weights, k=size)
+            ratings = rng.choices(range(1, 6), weights=RATING_WEIGHTS, k=size)
+            db.execute(insert(models.ReviewDB), [
+                {"book_id": book_id, "rating": rating, "comment": _sentence(rng, 6)}
+                for book_id, rating in zip(targets, ratings)
+            ])
+        db.commit()
+        review_service.recompute_rating_aggregates(db, chunk_size=chunk_size)
+    return popularity
+
+
+def _book_row(rng: random.Random) -> dict:
+    return {
+        "title": _sentence(rng, rng.randint(2, 5)).title(),
+        "author": rng.choice(AUTHORS),
+        "description": _sentence(rng, rng.randint(15, 60)),
+        "year_published": rng.randint(1850, 2024),
+        "pages": rng.randint(80, 1200),
+    }
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
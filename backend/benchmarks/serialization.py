@@ -0,0 +1,59 @@
+import argparse
+import time
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from src import encoding, schemas
+from src.services import book_service
+from .seed import seed_catalogue
+
+DEFAULT_DATABASE_URL = "sqlite:///benchmarks/bench.db"
+
+
+def best_of(repeat: int, function) -> float:
+    """
+    Zwraca najkrótszy z repeat czasów wykonania funkcji (w sekundach)
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    """
+    Porównuje ścieżkę ORM + walidacja pydantic ze ścieżką wierszy Core + orjson dla listy książek.
+    Uruchamiany poleceniem python -m benchmarks.serialization z katalogu backend
+    """
+    parser = argparse.ArgumentParser(prog="benchmarks.serialization", description="Book response serialization benchmark")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--books", type=int, default=10000)
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=1000, help="Books per listing page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.database_url)
+    seed_catalogue(engine, args.books, args.reviews)
+    adapters = {True: TypeAdapter(list[schemas.BookResponse]), False: TypeAdapter(list[schemas.BookListItem])}
+
+    print(f"{'include_reviews':<17}{'ORM + pydantic ms':>20}{'Core + encoder ms':>20}{'speedup':>10}")
+    for include_reviews, adapter in adapters.items():
+        def orm_path():
+            with Session(engine) as db:
+                books = book_service.get_books(db, limit=args.limit, include_reviews=include_reviews)
+                adapter.dump_json(adapter.validate_python(books, from_attributes=True))
+
+        def core_path():
+            with Session(engine) as db:
+                encoding.dumps(book_service.get_book_rows(db, limit=args.limit, include_reviews=include_reviews))
+
+        orm, core = best_of(args.repeat, orm_path), best_of(args.repeat, core_path)
+        print(f"{str(include_reviews):<17}{orm * 1000:>20.1f}{core * 1000:>20.1f}{orm / core:>9.1f}x")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
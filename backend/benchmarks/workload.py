@@ -0,0 +1,191 @@
+import asyncio
+import itertools
+import math
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Optional
+import httpx
+import websockets
+from src import schemas
+from .seed import zipf_weights
+
+DEFAULT_MIX = {"list_books": 30, "get_book": 40, "list_reviews": 20, "add_review": 10}
+LIST_PAGE_SIZE = 100
+REVIEWS_PAGE_SIZE = 20
+REJECTED_STATUSES = (429, 503)
+METRIC_LINE = re.compile(r'^(http_request_sql_(?:statements|duration_seconds))_(sum|count)\{route="([^"]*)"\} (\S+)$')
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Zwraca percentyl q (0-100) posortowanej listy metodą najbliższej rangi
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float, rejected: int = 0) -> dict:
+    """
+    Zwraca podsumowanie czasów odpowiedzi (w milisekundach) i przepustowości jednej operacji.
+    rejected to żądania odrzucone przez limity zapisów (429/503), liczone osobno od błędów
+    """
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rejected": rejected,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0,
+    }
+
+
+def parse_sql_metrics(text: str) -> dict[str, dict[str, float]]:
+    """
+    Wyciąga z odpowiedzi /metrics sumy i liczniki statystyk SQL per trasa
+    """
+    result = defaultdict(dict)
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, kind, route, value = match.groups()
+            result[route][f"{name}_{kind}"] = float(value)
+    return result
+
+
+def queries_per_request(before: dict, after: dict) -> dict:
+    """
+    Zwraca średnią liczbę i czas zapytań SQL na żądanie w okresie między dwoma odczytami /metrics
+    """
+    result = {}
+    for route, values in after.items():
+        if route == "/metrics":
+            continue
+        previous = before.get(route, {})
+        requests = values.get("http_request_sql_statements_count", 0) - previous.get("http_request_sql_statements_count", 0)
+        if requests <= 0:
+            continue
+        statements = values.get("http_request_sql_statements_sum", 0) - previous.get("http_request_sql_statements_sum", 0)
+        sql_seconds = (values.get("http_request_sql_duration_seconds_sum", 0)
+                       - previous.get("http_request_sql_duration_seconds_sum", 0))
+        result[route] = {
+            "requests": int(requests),
+            "statements": round(statements / requests, 2),
+            "sql_ms": round(sql_seconds / requests * 1000, 3),
+        }
+    return result
+
+
+class Workload:
+    """
+    Mieszane obciążenie odczyt/zapis: concurrency równoległych klientów losuje operacje według wag mix,
+    książki wybierane są rozkładem Zipfa (popularne książki są odpytywane najczęściej)
+    """
+    def __init__(self, client: httpx.AsyncClient, book_ids: list[int], mix: dict, skew: float, seed: int):
+        self.client = client
+        self.book_ids = book_ids
+        self.operations = list(mix)
+        self.weights = list(itertools.accumulate(mix[name] for name in self.operations))
+        self.book_weights = list(itertools.accumulate(zipf_weights(len(book_ids), skew)))
+        self.rng = random.Random(seed)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.rejected: dict[str, int] = defaultdict(int)
+
+    def pick_book(self) -> int:
+        return self.rng.choices(self.book_ids, cum_weights=self.book_weights)[0]
+
+    async def list_books(self):
+        params = {"limit": LIST_PAGE_SIZE, "include_reviews": "false"}
+        if self.rng.random() < 0.3:
+            params["genre"] = self.rng.choice(list(schemas.GenreEnum)).value
+        if self.rng.random() < 0.5:
+            params["after"] = self.rng.choice(self.book_ids)
+        return await self.client.get("/books/", params=params)
+
+    async def get_book(self):
+        return await self.client.get(f"/books/{self.pick_book()}")
+
+    async def list_reviews(self):
+        return await self.client.get(f"/reviews/{self.pick_book()}", params={"limit": REVIEWS_PAGE_SIZE})
+
+    async def add_review(self):
+        review = {"rating": self.rng.randint(1, 5), "comment": "Benchmark review"}
+        return await self.client.post(f"/reviews/{self.pick_book()}", json=review)
+
+    async def run(self, concurrency: int, duration: float, record: bool = True):
+        """
+        Uruchamia concurrency klientów na duration sekund. Przy record=False (rozgrzewka) nic nie zapisuje
+        """
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(self._client_loop(deadline, record) for _ in range(concurrency)))
+
+    async def _client_loop(self, deadline: float, record: bool):
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(self.operations, cum_weights=self.weights)[0]
+            started = time.perf_counter()
+            status_code = None
+            try:
+                status_code = (await getattr(self, name)()).status_code
+            except httpx.HTTPError:
+                pass
+            if not record:
+                continue
+            if status_code in REJECTED_STATUSES:
+                self.rejected[name] += 1
+            elif status_code is None or status_code >= 400:
+                self.errors[name] += 1
+            else:
+                self.latencies[name].append(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> dict:
+        operations = {
+            name: summarize(self.latencies[name], self.errors[name], elapsed, self.rejected[name])
+            for name in self.operations
+        }
+        all_latencies = [latency for name in self.operations for latency in self.latencies[name]]
+        total = summarize(all_latencies, sum(self.errors.values()), elapsed, sum(self.rejected.values()))
+        return {"operations": operations, "total": total}
+
+
+async def watch_stats(ws_url: str, clients: int, duration: float) -> dict:
+    """
+    Podłącza clients klientów WebSocket do /ws na duration sekund i liczy otrzymane statystyki
+    """
+    if clients <= 0:
+        return {"clients": 0}
+
+    async def client() -> Optional[tuple[float, int]]:
+        started = time.perf_counter()
+        try:
+            async with websockets.connect(ws_url) as connection:
+                connect_seconds = time.perf_counter() - started
+                messages = 0
+                deadline = started + duration
+                while (remaining := deadline - time.perf_counter()) > 0:
+                    try:
+                        await asyncio.wait_for(connection.recv(), remaining)
+                        messages += 1
+                    except asyncio.TimeoutError:
+                        break
+                return connect_seconds, messages
+        except (OSError, websockets.WebSocketException):
+            return None
+
+    results = await asyncio.gather(*(client() for _ in range(clients)))
+    connected = [result for result in results if result is not None]
+    messages = sum(count for _, count in connected)
+    return {
+        "clients": clients,
+        "connected": len(connected),
+        "connect_p95_ms": round(percentile(sorted(seconds * 1000 for seconds, _ in connected), 95), 3),
+        "messages": messages,
+        "messages_per_client_per_second": round(messages / len(connected) / duration, 3) if connected else 0,
+    }
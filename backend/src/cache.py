@@ -0,0 +1,443 @@
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterable, NamedTuple, Optional
+from fastapi import Request, Response
+from .config import settings
+from .pubsub import CACHE_CHANNEL, REDIS_TIMEOUT_SECONDS, pubsub
+
+logger = logging.getLogger(__name__)
+
+ALL_GENRES = "*"
+
+
+class CachedResponse(NamedTuple):
+    """
+    Zserializowana odpowiedź JSON razem z jej ETagiem
+    """
+    body: bytes
+    etag: str
+
+
+class Validators(NamedTuple):
+    """
+    Walidatory odpowiedzi do zapytań warunkowych (If-None-Match / If-Modified-Since)
+    """
+    etag: str
+    last_modified: Optional[float] = None
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = formatdate(self.last_modified, usegmt=True)
+            headers["Cache-Control"] = "no-cache"
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """
+        Sprawdza czy klient ma aktualną wersję. If-None-Match ma pierwszeństwo przed If-Modified-Since,
+        ETagi porównywane są słabo (bez prefiksu W/)
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            etag = self.etag.removeprefix("W/")
+            return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        try:
+            return int(self.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+
+def content_etag(body: bytes, version: Optional[int] = None) -> str:
+    """
+    Zwraca silny ETag ze skrótu treści. Dla zasobów wersjonowanych ETag zaczyna się od numeru wersji
+    ("wersja-skrót"), dzięki czemu można go odesłać w If-Match przy edycji
+    """
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f'"{version}-{digest}"' if version is not None else f'"{digest}"'
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str) -> Optional[int]:
+    """
+    Wyciąga numer wersji z nagłówka If-Match (ETag "wersja-skrót" lub "wersja"). Prefiks W/ jest pomijany:
+    CompressionMiddleware osłabia ETag skompresowanych odpowiedzi, a klient odsyła go w takiej postaci.
+    Zwraca None dla "*", rzuca ValueError gdy nagłówek nie zawiera wersji
+    """
+    tag = if_match.split(",")[0].strip()
+    if tag == "*":
+        return None
+    return int(tag.removeprefix("W/").strip('"').split("-")[0])
+
+
+class MemoryCacheBackend:
+    """
+    Cache w pamięci procesu z wypieraniem LRU i czasem życia wpisów. Liczniki z czasem życia
+    (generacje książek) są usuwane po wygaśnięciu, gdy ich liczba przekroczy max_entries
+    """
+    shared = False
+    remote = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._counters: dict[str, tuple[float, int]] = {}
+        self._sweep_at = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counter(key)
+
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            value = self._counter(key) + 1
+            self._counters[key] = (time.monotonic() + ttl if ttl else math.inf, value)
+            if len(self._counters) > self._sweep_at:
+                now = time.monotonic()
+                for expired in [name for name, (expires_at, _) in self._counters.items() if expires_at < now]:
+                    del self._counters[expired]
+                self._sweep_at = max(self.max_entries, 2 * len(self._counters))
+            return value
+
+    def set_counter(self, key: str, value: int):
+        with self._lock:
+            self._counters[key] = (math.inf, value)
+
+    def init_counter(self, key: str, value: int) -> int:
+        with self._lock:
+            if not self._counter(key):
+                self._counters[key] = (math.inf, value)
+            return self._counters[key][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+    def _counter(self, key: str) -> int:
+        expires_at, value = self._counters.get(key, (math.inf, 0))
+        if expires_at < time.monotonic():
+            del self._counters[key]
+            return 0
+        return value
+
+
+class RedisCacheBackend:
+    """
+    Cache współdzielony przez procesy, w Redisie lub serwerze zgodnym z jego protokołem.
+    Każda operacja to zapytanie sieciowe, więc trasy async wywołują ją przez ResponseCache.run
+    """
+    shared = True
+    remote = True
+
+    def __init__(self, url: str = None, client=None, prefix: str = "bookapp:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT_SECONDS)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def get_counter(self, key: str) -> int:
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        if not ttl:
+            return self.client.incr(self.prefix + key)
+        pipe = self.client.pipeline()
+        pipe.incr(self.prefix + key)
+        pipe.pexpire(self.prefix + key, int(ttl * 1000))
+        return pipe.execute()[0]
+
+    def set_counter(self, key: str, value: int):
+        self.client.set(self.prefix + key, value)
+
+    def init_counter(self, key: str, value: int) -> int:
+        self.client.set(self.prefix + key, value, nx=True)
+        return self.get_counter(key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Cache zserializowanych odpowiedzi dla szczegółów książki i listy książek.
+    Wpisy list zawierają w kluczu generację gatunku, a wpisy szczegółów generację książki, więc zapis
+    unieważnia je podbiciem licznika - odpowiedź odczytana z bazy przed zapisem trafia pod stary klucz.
+    Gdy backend jest lokalny dla procesu, unieważnienia są rozsyłane przez events do pozostałych procesów
+    """
+    def __init__(self, backend, ttl: float, events=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.events = events if not backend.shared else None
+        if self.events is not None:
+            self.events.subscribe(CACHE_CHANNEL, self._apply_remote_invalidation, include_own=False)
+        self._invalidations = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-invalidation") if backend.remote else None
+        )
+
+    async def run(self, method, *args, **kwargs):
+        """
+        Wywołuje metodę cache z trasy async. Metody backendu sieciowego (Redis) wykonywane są w wątku,
+        żeby zapytania nie blokowały pętli zdarzeń
+        """
+        if self.backend.remote:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def flush(self):
+        """
+        Czeka na unieważnienia zlecone w tle przez zapisy, żeby klient po zapisie odczytał nowe dane
+        """
+        if self._invalidations is not None:
+            await asyncio.wrap_future(self._invalidations.submit(lambda: None))
+
+    def book_key(self, book_id: int) -> str:
+        return f"book:{book_id}:{self.epoch()}.{self.backend.get_counter(f'gen:book:{book_id}')}"
+
+    def epoch(self) -> int:
+        """
+        Zwraca losowy identyfikator stanu liczników, zmieniany gdy backend je utraci (restart procesu
+        lub serwera Redis). Dzięki niemu po wyzerowaniu generacji nie powtarzają się wersje katalogu.
+        Dla backendu bez liczników (none) zwraca 0
+        """
+        epoch = self.backend.get_counter("epoch")
+        if not epoch:
+            self.backend.init_counter("started", int(time.time()))
+            epoch = self.backend.init_counter("epoch", random.getrandbits(48) or 1)
+        return epoch
+
+    def catalogue_version(self, genre: Optional[str]) -> str:
+        """
+        Wersja katalogu (wszystkich książek lub gatunku), zmienia się przy każdym zapisie książki lub recenzji
+        """
+        genre = genre or ALL_GENRES
+        return f"{self.epoch()}.{self.backend.get_counter(f'gen:{genre}')}"
+
+    def ttl_window(self) -> int:
+        """
+        Numer bieżącego okna czasu długości ttl. Wersja katalogu zmienia się tylko przy zapisach widzianych
+        przez aplikację, więc klucze i walidatory list wygasają dodatkowo z końcem okna - zmiany wprowadzone
+        poza aplikacją (inne połączenie z bazą) są widoczne najpóźniej po ttl sekundach
+        """
+        return int(time.time() // self.ttl) if self.ttl > 0 else 0
+
+    def listing_key(self, genre: Optional[str], **params) -> str:
+        genre = genre or ALL_GENRES
+        query = "&".join(f"{name}={value}" for name, value in sorted(params.items()))
+        return f"books:{genre}:{self.catalogue_version(genre)}:{self.ttl_window()}:{query}"
+
+    def listing(self, genre: Optional[str], **params) -> tuple[str, Optional[Validators]]:
+        """
+        Zwraca klucz listy razem z jej walidatorami
+        """
+        key = self.listing_key(genre, **params)
+        return key, self.listing_validators(genre, key)
+
+    def listing_validators(self, genre: Optional[str], key: str) -> Optional[Validators]:
+        """
+        Zwraca słaby ETag (z klucza listy, który zawiera wersję katalogu i okno ttl) i czas ostatniej zmiany
+        katalogu, nie wcześniejszy niż początek okna. Pozwala odpowiedzieć 304 bez zaglądania do cache
+        i bazy danych. None gdy cache jest wyłączony
+        """
+        if not self.backend.get_counter("epoch"):
+            return None
+        genre = genre or ALL_GENRES
+        last_modified = max(self.backend.get_counter(f"modified:{genre}"), self.backend.get_counter("started"))
+        last_modified = max(last_modified, int(self.ttl_window() * self.ttl))
+        etag = 'W/"' + hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + '"'
+        return Validators(etag, last_modified or None)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        etag, body = value.split(b"\n", 1)
+        return CachedResponse(body, etag.decode())
+
+    def set(self, key: str, body: bytes, version: Optional[int] = None) -> CachedResponse:
+        etag = content_etag(body, version)
+        self.backend.set(key, etag.encode() + b"\n" + body, self.ttl)
+        return CachedResponse(body, etag)
+
+    def invalidate_book(self, book_id: Optional[int], genres: Iterable[str] = ()):
+        """
+        Usuwa szczegóły książki i unieważnia listy: wszystkich książek oraz gatunków książki
+        """
+        self.invalidate_books([] if book_id is None else [book_id], genres)
+
+    def invalidate_books(self, book_ids: Iterable[int], genres: Iterable[str] = ()):
+        """
+        Jak invalidate_book, ale dla wielu książek naraz: każdy licznik gatunku zwiększany jest tylko raz
+        """
+        book_ids, genres = list(book_ids), sorted(set(genres))
+        if self._invalidations is not None and _on_event_loop():
+            # Serwisy wywoływane przez run_sync działają w wątku pętli zdarzeń. Jeden wątek w tle
+            # zachowuje kolejność unieważnień, a trasa zapisu czeka na nie przez flush()
+            self._invalidations.submit(self._invalidate_logged, book_ids, genres)
+        else:
+            self._invalidate(book_ids, genres)
+        if self.events is not None:
+            self.events.publish(CACHE_CHANNEL, {"books": book_ids, "genres": genres})
+
+    def invalidate_all(self):
+        """
+        Unieważnia wszystkie odpowiedzi, np. po przeliczeniu ocen wszystkich książek. Nowa epoka zmienia
+        klucze szczegółów i list (a więc i ETagi list), a nowy czas startu - ich Last-Modified
+        """
+        self._invalidate_all()
+        if self.events is not None:
+            self.events.publish(CACHE_CHANNEL, {"all": True})
+
+    def _invalidate_all(self):
+        self.backend.set_counter("epoch", random.getrandbits(48) or 1)
+        self.backend.set_counter("started", int(time.time()))
+
+    def _invalidate(self, book_ids: list[int], genres: list[str]):
+        epoch = self.epoch()
+        stale_keys = []
+        for book_id in book_ids:
+            # Generacja książki żyje dłużej niż jej wpisy, więc po wygaśnięciu nie wraca klucz z żywym wpisem
+            generation = self.backend.incr(f"gen:book:{book_id}", ttl=2 * self.ttl)
+            stale_keys.append(f"book:{book_id}:{epoch}.{generation - 1}")
+        if stale_keys:
+            self.backend.delete(*stale_keys)
+        modified = int(time.time())
+        for genre in {ALL_GENRES, *genres}:
+            self.backend.incr(f"gen:{genre}")
+            self.backend.set_counter(f"modified:{genre}", modified)
+
+    def _invalidate_logged(self, book_ids: list[int], genres: list[str]):
+        try:
+            self._invalidate(book_ids, genres)
+        except Exception:
+            logger.exception("Invalidating cached responses failed")
+
+    def _apply_remote_invalidation(self, event: dict):
+        """
+        Stosuje unieważnienie opublikowane przez inny proces
+        """
+        if event.get("all"):
+            self._invalidate_all()
+        else:
+            self._invalidate(event["books"], event["genres"])
+
+
+class NoCacheBackend:
+    """
+    Backend wyłączający cache
+    """
+    shared = True
+    remote = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    def delete(self, *keys: str):
+        pass
+
+    def get_counter(self, key: str) -> int:
+        return 0
+
+    def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        return 0
+
+    def set_counter(self, key: str, value: int):
+        pass
+
+    def init_counter(self, key: str, value: int) -> int:
+        return 0
+
+    def clear(self):
+        pass
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def create_backend():
+    """
+    Tworzy backend cache wybrany w ustawieniach: memory, redis lub none
+    """
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.CACHE_URL)
+    if settings.CACHE_BACKEND == "none":
+        return NoCacheBackend()
+    return MemoryCacheBackend(settings.CACHE_MAX_ENTRIES)
+
+
+def not_modified_response(validators: Validators) -> Response:
+    return Response(status_code=304, headers=validators.headers())
+
+
+def cached_json_response(request: Request, cached: CachedResponse, validators: Optional[Validators] = None) -> Response:
+    """
+    Zwraca odpowiedź z cache lub 304, gdy klient ma już aktualną wersję. Bez podanych walidatorów
+    ETagiem jest skrót treści odpowiedzi
+    """
+    validators = validators or Validators(cached.etag)
+    if validators.matches(request):
+        return not_modified_response(validators)
+    return Response(content=cached.body, media_type="application/json", headers=validators.headers())
+
+
+response_cache = ResponseCache(create_backend(), settings.CACHE_TTL_SECONDS, events=pubsub)
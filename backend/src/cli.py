@@ -0,0 +1,144 @@
+import argparse
+import os
+import time
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from . import models  # noqa: F401 - rejestruje tabele w Base.metadata
+from .database import Base, SessionLocal, backoff_delays, engine
+from .pubsub import pubsub
+from .services import genre_service, import_service, review_service
+from .services.purge_service import book_purger
+
+
+def upgrade_schema(bind) -> list[str]:
+    """
+    Dodaje do istniejących tabel brakujące kolumny (ALTER TABLE ... ADD COLUMN) i indeksy, których
+    create_all nie tworzy w istniejących tabelach. Nowa kolumna NOT NULL musi mieć server_default,
+    który wypełni istniejące wiersze. Zwraca wykonane polecenia - przy aktualnym schemacie nic nie robi
+    """
+    applied = []
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            table_name = connection.dialect.identifier_preparer.format_table(table)
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                definition = CreateColumn(column).compile(dialect=connection.dialect)
+                statement = f"ALTER TABLE {table_name} ADD COLUMN {definition}"
+                connection.exec_driver_sql(statement)
+                applied.append(statement)
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            missing_indexes = [index for index in table.indexes if index.name not in existing_indexes]
+            if not missing_indexes:
+                continue
+            # Indeksy tylko dla innego dialektu (ddl_if, np. FULLTEXT) są pomijane, stąd ponowna inspekcja
+            for index in missing_indexes:
+                index.create(connection)
+            created = {index["name"] for index in inspect(connection).get_indexes(table.name)} - existing_indexes
+            applied.extend(f"CREATE INDEX {name} ON {table.name}" for name in sorted(created))
+    return applied
+
+
+def migrate(args):
+    """
+    Tworzy brakujące tabele, kolumny i indeksy oraz słownik gatunków, czekając najpierw na dostępność bazy danych
+    """
+    deadline = time.monotonic() + args.wait
+    for delay in backoff_delays():
+        try:
+            with engine.connect():
+                break
+        except Exception as e:
+            if time.monotonic() + delay > deadline:
+                raise SystemExit(f"Database unavailable: {e}")
+            print(f"Waiting for DB... {e}")
+            time.sleep(delay)
+    Base.metadata.create_all(bind=engine)
+    for statement in upgrade_schema(engine):
+        print(f"Applied: {statement}")
+    with SessionLocal() as db:
+        genre_service.seed_genres(db)
+    print(f"Schema is up to date ({len(Base.metadata.tables)} tables).")
+
+
+def reconcile_ratings(args):
+    """
+    Przelicza zagregowane oceny wszystkich książek i unieważnia odpowiedzi zapisane w cache
+    """
+    db = SessionLocal()
+    try:
+        updated = review_service.recompute_rating_aggregates(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(f"Recomputed rating aggregates for {updated} books.")
+
+
+def import_books(args):
+    """
+    Importuje książki z pliku NDJSON lub CSV i wypisuje raport
+    """
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip(".").lower()
+    if fmt not in import_service.FORMATS:
+        raise SystemExit(f"Cannot infer import format from {args.path}, use --format")
+
+    db = SessionLocal()
+    try:
+        with open(args.path, encoding="utf-8", newline="") as lines:
+            report = import_service.import_books(db, import_service.parse_rows(lines, fmt), args.chunk_size)
+    finally:
+        db.close()
+    print(report.model_dump_json(indent=2))
+
+
+def purge_deleted(args):
+    """
+    Fizycznie usuwa książki usunięte logicznie razem z ich recenzjami
+    """
+    book_purger.batch_size = args.batch_size
+    book_purger.pause = args.pause_ms / 1000
+    with SessionLocal() as db:
+        purged = book_purger.purge_pending(db)
+    print(f"Purged {purged} books and {book_purger.reviews_purged} reviews.")
+
+
+def main(argv=None):
+    """
+    Narzędzia administracyjne uruchamiane poleceniem python -m src.cli <polecenie>
+    """
+    parser = argparse.ArgumentParser(prog="cli", description="Book Grading App maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrator = commands.add_parser("migrate", help="Create or upgrade database tables and indexes")
+    migrator.add_argument("--wait", type=float, default=120, help="Seconds to wait for the database")
+    migrator.set_defaults(handler=migrate)
+
+    reconcile = commands.add_parser("reconcile-ratings", help="Recompute rating aggregates of all books")
+    reconcile.add_argument("--chunk-size", type=int, default=1000)
+    reconcile.set_defaults(handler=reconcile_ratings)
+
+    importer = commands.add_parser("import-books", help="Import books and reviews from an NDJSON or CSV file")
+    importer.add_argument("path")
+    importer.add_argument("--format", choices=import_service.FORMATS)
+    importer.add_argument("--chunk-size", type=int, default=1000)
+    importer.set_defaults(handler=import_books)
+
+    purger = commands.add_parser("purge-deleted", help="Remove soft-deleted books and their reviews")
+    purger.add_argument("--batch-size", type=int, default=1000)
+    purger.add_argument("--pause-ms", type=int, default=50, help="Pause between review batches")
+    purger.set_defaults(handler=purge_deleted)
+
+    args = parser.parse_args(argv)
+    try:
+        args.handler(args)
+    finally:
+        # Unieważnienia cache i zmiany statystyk są publikowane w tle, muszą wyjść przed końcem procesu
+        pubsub.stop()
+
+
+if __name__ == "__main__":
+    main()
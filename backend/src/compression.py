@@ -0,0 +1,173 @@
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # pragma: no cover - brotli jest opcjonalny
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+NOT_COMPRESSIBLE_STATUSES = (204, 304)
+
+
+def available_encodings() -> tuple[str, ...]:
+    """
+    Zwraca obsługiwane kodowania w kolejności preferencji serwera
+    """
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str, available: tuple[str, ...]) -> Optional[str]:
+    """
+    Wybiera kodowanie z nagłówka Accept-Encoding według wag q. Przy równych wagach
+    decyduje kolejność available. Zwraca None gdy klient nie przyjmuje żadnego z kodowań
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI kompresujące odpowiedzi (brotli lub gzip, wybrane według Accept-Encoding).
+    Kompresowane są tylko typy tekstowe i JSON nie mniejsze niż minimum_size bajtów.
+    Odpowiedzi strumieniowe kompresowane są fragment po fragmencie, bez buforowania całej treści
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), available_encodings())
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressingResponder(send, encoding, self.minimum_size, self._encoder_factory(encoding))
+        await self.app(scope, receive, responder.send)
+
+    def _encoder_factory(self, encoding: str):
+        if encoding == "br":
+            return lambda: BrotliEncoder(self.brotli_quality)
+        return lambda: GzipEncoder(self.gzip_level)
+
+
+class CompressingResponder:
+    """
+    Opakowanie funkcji send jednej odpowiedzi. Decyzja o kompresji zapada przy pierwszym fragmencie treści,
+    gdy znany jest typ odpowiedzi i (dla odpowiedzi w jednym kawałku) jej rozmiar
+    """
+    def __init__(self, send: Send, encoding: str, minimum_size: int, encoder_factory):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._encoder_factory = encoder_factory
+        self._start: Optional[Message] = None
+        self._encoder = None
+        self._passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._encoder is None:
+            if not self._should_compress(body, more_body):
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+            self._encoder = self._encoder_factory()
+            if not more_body:
+                compressed = self._encoder.compress(body) + self._encoder.finish()
+                self._set_compressed_headers(len(compressed))
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+            self._set_compressed_headers(None)
+            await self._send(self._start)
+
+        if more_body:
+            chunk = self._encoder.compress(body) + self._encoder.flush()
+            if chunk:
+                await self._send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self._send({"type": "http.response.body", "body": self._encoder.compress(body) + self._encoder.finish()})
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = MutableHeaders(scope=self._start)
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if not media_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        headers.add_vary_header("Accept-Encoding")
+        return not (
+            self._start["status"] in NOT_COMPRESSIBLE_STATUSES
+            or "content-encoding" in headers
+            or (not more_body and len(body) < self.minimum_size)
+        )
+
+    def _set_compressed_headers(self, content_length: Optional[int]):
+        headers = MutableHeaders(scope=self._start)
+        headers["Content-Encoding"] = self.encoding
+        if content_length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(content_length)
+        # Skompresowana reprezentacja różni się bajtowo od oryginału, więc silny ETag staje się słaby
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
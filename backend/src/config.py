@@ -1,3 +1,4 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -8,5 +9,42 @@ class Settings(BaseSettings):
     Klasa dostępu do zmiennych środowiskowych
     """
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    CACHE_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    CACHE_URL: Optional[str] = None
+    CACHE_TTL_SECONDS: float = 60
+    CACHE_MAX_ENTRIES: int = 10000
+    PUBSUB_BACKEND: Literal["memory", "redis"] = "memory"
+    PUBSUB_URL: Optional[str] = None
+    SLOW_REQUEST_MS: float = 500
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    STATS_INTERVAL_SECONDS: float = 1.0
+    STATS_MAX_PENDING: int = 8
+    STATS_RESYNC_SECONDS: float = 60
+    REVIEW_WRITE_MODE: Literal["direct", "buffered"] = "direct"
+    REVIEW_BUFFER_CAPACITY: int = 10000
+    REVIEW_BUFFER_BATCH_SIZE: int = 1000
+    REVIEW_BUFFER_FLUSH_MS: int = 50
+    REVIEW_SPOOL_PATH: str = "review_spool.ndjson"
+    REVIEW_SPOOL_FSYNC: bool = False
+    RATE_LIMIT_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    RATE_LIMIT_URL: Optional[str] = None
+    RATE_LIMIT_WRITES_PER_SECOND: float = 5
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_BULK_PER_SECOND: float = 0.1
+    RATE_LIMIT_BULK_BURST: int = 2
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    WRITE_CONCURRENCY_LIMIT: int = 4
+    POOL_WAIT_SHED_MS: float = 250
+    PURGE_BATCH_SIZE: int = 1000
+    PURGE_PAUSE_MS: int = 50
+    PURGE_INTERVAL_SECONDS: float = 30
 
 settings = Settings()
\ No newline at end of file
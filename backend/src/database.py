@@ -1,9 +1,137 @@
-from sqlalchemy import create_engine
+import asyncio
+import time
+from typing import Iterator
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
+from .metrics import Histogram
 
-engine = create_engine(settings.DATABASE_URL)
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+BACKOFF_INITIAL_SECONDS = 0.1
+BACKOFF_MAX_SECONDS = 5.0
+
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+RECENT_WAIT_WEIGHT = 0.2
+RECENT_WAIT_HALF_LIFE_SECONDS = 1.0
+
+
+class PoolMetrics:
+    """
+    Czas oczekiwania na połączenie z puli i liczba przekroczeń pool_timeout.
+    Bieżące obciążenie puli opisuje recent_wait() - średnia krocząca czasu oczekiwania
+    """
+    def __init__(self):
+        self.wait_seconds = Histogram(POOL_WAIT_BUCKETS)
+        self.timeouts = 0
+        self._recent_wait = 0.0
+        self._recent_wait_at = time.monotonic()
+
+    def observe_wait(self, seconds: float):
+        self.wait_seconds.observe(seconds)
+        self._recent_wait += RECENT_WAIT_WEIGHT * (seconds - self._recent_wait)
+        self._recent_wait_at = time.monotonic()
+
+    def recent_wait(self) -> float:
+        """
+        Zwraca wykładniczą średnią kroczącą czasu oczekiwania na połączenie w sekundach. Średnia wygasa
+        z czasem bez nowych pobrań, więc po odrzuceniu ruchu nie blokuje puli na stałe
+        """
+        idle = time.monotonic() - self._recent_wait_at
+        return self._recent_wait * 0.5 ** (idle / RECENT_WAIT_HALF_LIFE_SECONDS)
+
+
+# Metryki trzymane są po nazwie puli, bo pula tworzona jest od nowa np. po dispose()
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+class _TimedPoolMixin:
+    """
+    Mierzy czas pobrania połączenia z puli, łącznie z czekaniem w kolejce
+    """
+    def _do_get(self):
+        metrics = pool_metrics.setdefault(self.logging_name, PoolMetrics())
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.observe_wait(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def to_async_url(url: str) -> str:
+    """
+    Zamienia adres bazy danych ze sterownikiem synchronicznym na odpowiednik asynchroniczny
+    """
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+def engine_options(url: str, name: str, poolclass) -> dict:
+    """
+    Zwraca parametry puli połączeń z ustawień. SQLite zostaje przy domyślnej puli SQLAlchemy
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_logging_name": name,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def pool_stats(name: str, pool) -> dict:
+    """
+    Zwraca bieżący stan puli połączeń razem z histogramem czasu oczekiwania
+    """
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+        })
+    metrics = pool_metrics.get(name)
+    if metrics:
+        stats["timeouts"] = metrics.timeouts
+        stats["recent_wait_seconds"] = round(metrics.recent_wait(), 6)
+        stats["wait_seconds"] = metrics.wait_seconds.snapshot()
+    return stats
+
+
+_async_url = settings.ASYNC_DATABASE_URL or to_async_url(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, "sync", TimedQueuePool)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(
+    _async_url, **engine_options(_async_url, "async", TimedAsyncAdaptedQueuePool)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -14,4 +142,77 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """
+    Zwraca obiekt asynchronicznej sesji bazy danych.
+    Funkcje serwisów wywołuje się przez await db.run_sync(funkcja, *argumenty)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def recent_pool_wait(name: str) -> float:
+    """
+    Zwraca bieżący średni czas oczekiwania na połączenie z puli o danej nazwie, 0 dla puli bez metryk (SQLite)
+    """
+    metrics = pool_metrics.get(name)
+    return metrics.recent_wait() if metrics else 0.0
+
+def get_pool_stats() -> dict:
+    """
+    Zwraca statystyki obu pul połączeń aplikacji
+    """
+    return {
+        "sync": pool_stats("sync", engine.pool),
+        "async": pool_stats("async", async_engine.sync_engine.pool),
+    }
+
+def backoff_delays(initial: float = BACKOFF_INITIAL_SECONDS, maximum: float = BACKOFF_MAX_SECONDS) -> Iterator[float]:
+    """
+    Generuje kolejne opóźnienia ponowień rosnące wykładniczo aż do maximum
+    """
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * 2, maximum)
+
+async def check_connection():
+    """
+    Sprawdza połączenie z bazą danych zapytaniem SELECT 1
+    """
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+async def wait_for_database(on_retry=None):
+    """
+    Czeka na dostępność bazy danych, ponawiając próby połączenia z wykładniczym opóźnieniem
+    """
+    for delay in backoff_delays():
+        try:
+            await check_connection()
+            return
+        except Exception as e:
+            if on_retry is not None:
+                on_retry(e, delay)
+            await asyncio.sleep(delay)
+
+async def warm_up_pools():
+    """
+    Otwiera z góry stałą liczbę połączeń obu pul, żeby pierwsze żądania nie płaciły za nawiązanie połączenia
+    """
+    size = settings.DB_POOL_SIZE
+    results = await asyncio.gather(*(async_engine.connect() for _ in range(size)), return_exceptions=True)
+    for result in results:
+        if not isinstance(result, BaseException):
+            await result.close()
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+    def warm_up_sync_pool():
+        connections = [engine.connect() for _ in range(size)]
+        for connection in connections:
+            connection.close()
+
+    await asyncio.to_thread(warm_up_sync_pool)
@@ -0,0 +1,15 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson jest opcjonalny
+    orjson = None
+from pydantic_core import to_json
+
+
+def dumps(value) -> bytes:
+    """
+    Koduje gotowe słowniki i listy do JSON bez walidacji pydantic - przez orjson,
+    a gdy nie jest zainstalowany, przez serializer pydantic-core
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return to_json(value)
@@ -0,0 +1,208 @@
+import functools
+import inspect
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+from .metrics import HistogramFamily, render_counters, render_histograms
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_STATEMENTS = 100
+MAX_STATEMENT_LENGTH = 500
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000, 100000)
+
+request_duration = HistogramFamily(
+    "http_request_duration_seconds", "Request latency by route", ("method", "route", "status")
+)
+request_sql_statements = HistogramFamily(
+    "http_request_sql_statements", "Number of SQL statements executed per request", ("route",), COUNT_BUCKETS
+)
+request_sql_duration = HistogramFamily(
+    "http_request_sql_duration_seconds", "Total time of SQL statements per request", ("route",)
+)
+request_rows_loaded = HistogramFamily(
+    "http_request_orm_rows_loaded", "Number of ORM objects materialized per request", ("route",), COUNT_BUCKETS
+)
+request_serialization = HistogramFamily(
+    "http_response_serialization_seconds", "Response serialization time by route", ("route",)
+)
+sql_statement_duration = HistogramFamily("sql_statement_duration_seconds", "Duration of single SQL statements")
+
+
+class RequestStats:
+    """
+    Statystyki bazy danych i serializacji zbierane w trakcie obsługi jednego żądania
+    """
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.rows_loaded = 0
+        self.serialization_seconds = 0.0
+        self.endpoint_finished: Optional[float] = None
+        self.statements: list[tuple[float, str]] = []
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine: Engine):
+    """
+    Rejestruje zdarzenia silnika SQLAlchemy mierzące liczbę i czas zapytań SQL
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        sql_statement_duration.labels().observe(elapsed)
+        stats = current_request.get()
+        if stats is None:
+            return
+        stats.sql_statements += 1
+        stats.sql_seconds += elapsed
+        if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((elapsed, statement))
+
+
+def instrument_orm(base):
+    """
+    Rejestruje zdarzenie liczące obiekty ORM zmaterializowane z wyników zapytań
+    """
+    @event.listens_for(base, "load", propagate=True)
+    def on_load(target, context):
+        stats = current_request.get()
+        if stats is not None:
+            stats.rows_loaded += 1
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Dolicza czas bloku do czasu serializacji odpowiedzi bieżącego żądania
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - started
+
+
+def _mark_endpoint_finished():
+    stats = current_request.get()
+    if stats is not None:
+        stats.endpoint_finished = time.perf_counter()
+
+
+def _timed_endpoint(endpoint):
+    """
+    Opakowuje funkcję endpointu tak, by zapamiętać moment jej zakończenia.
+    Wszystko co FastAPI robi później to serializacja odpowiedzi
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_finished()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_finished()
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Trasa FastAPI mierząca czas serializacji odpowiedzi (walidacja response_model i kodowanie JSON)
+    """
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def instrumented_handler(request: Request):
+            response = await handler(request)
+            stats = current_request.get()
+            if stats is not None and stats.endpoint_finished is not None:
+                stats.serialization_seconds += time.perf_counter() - stats.endpoint_finished
+                stats.endpoint_finished = None
+            return response
+
+        return instrumented_handler
+
+
+async def record_request(request: Request, call_next):
+    """
+    Middleware HTTP zapisujące czas żądania i statystyki SQL do histogramów trasy.
+    Żądania wolniejsze niż SLOW_REQUEST_MS są logowane razem z wykonanymi zapytaniami
+    """
+    stats = RequestStats()
+    token = current_request.set(stats)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        current_request.reset(token)
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        request_duration.labels(request.method, route_path, status).observe(elapsed)
+        request_sql_statements.labels(route_path).observe(stats.sql_statements)
+        request_sql_duration.labels(route_path).observe(stats.sql_seconds)
+        request_rows_loaded.labels(route_path).observe(stats.rows_loaded)
+        request_serialization.labels(route_path).observe(stats.serialization_seconds)
+        if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+            _log_slow_request(request, status, elapsed, stats)
+
+
+def _log_slow_request(request: Request, status: int, elapsed: float, stats: RequestStats):
+    lines = [
+        f"Slow request {request.method} {request.url.path} -> {status} in {elapsed * 1000:.1f} ms: "
+        f"{stats.sql_statements} SQL statements ({stats.sql_seconds * 1000:.1f} ms), "
+        f"{stats.rows_loaded} ORM rows, serialization {stats.serialization_seconds * 1000:.1f} ms"
+    ]
+    for duration, statement in stats.statements:
+        lines.append(f"  {duration * 1000:8.1f} ms  {' '.join(statement.split())[:MAX_STATEMENT_LENGTH]}")
+    if stats.sql_statements > len(stats.statements):
+        lines.append(f"  ... {stats.sql_statements - len(stats.statements)} more statements")
+    logger.warning("\n".join(lines))
+
+
+def render_metrics(pool_metrics: dict) -> str:
+    """
+    Zwraca wszystkie metryki aplikacji w formacie tekstowym Prometheus
+    """
+    lines = []
+    for family in (
+        request_duration, request_sql_statements, request_sql_duration,
+        request_rows_loaded, request_serialization, sql_statement_duration,
+    ):
+        lines.extend(family.render())
+    lines.extend(render_histograms(
+        "db_pool_wait_seconds", "Time spent waiting for a pooled connection",
+        [({"pool": name}, metrics.wait_seconds) for name, metrics in pool_metrics.items()],
+    ))
+    lines.extend(render_counters(
+        "db_pool_timeouts_total", "Connection checkouts that exceeded pool_timeout",
+        [({"pool": name}, metrics.timeouts) for name, metrics in pool_metrics.items()],
+    ))
+    return "\n".join(lines) + "\n"
@@ -1,30 +1,96 @@
-import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import JSONResponse
-from .database import engine, Base
-from .routes import books, reviews, websockets
+from .compression import CompressionMiddleware
+from .config import settings
+from .database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine, wait_for_database, warm_up_pools
+from .instrumentation import instrument_engine, instrument_orm, record_request
+from .pubsub import pubsub
+from .routes import books, reviews, system, websockets
+from .services import genre_service, search_service
+from .services.purge_service import book_purger
+from .services.review_buffer import review_buffer
 
-def wait_for_db():
+logger = logging.getLogger(__name__)
+
+def load_sync_genre_ids():
+    """
+    Wczytuje mapę gatunków dla synchronicznego silnika bazy danych
+    """
+    with SessionLocal() as db:
+        genre_service.load_genre_ids(db)
+
+def build_search_index():
+    """
+    Buduje indeks wyszukiwania w pamięci procesu (bazy bez FULLTEXT), zanim trafi do niego pierwsze zapytanie
+    """
+    if engine.dialect.name == "mysql":
+        return
+    with SessionLocal() as db:
+        search_service.build_index(db, search_service.search_index)
+    logger.info("Search index built with %d books.", len(search_service.search_index))
+
+async def prepare_database(app: FastAPI):
+    """
+    Czeka na dostępność bazy danych, wczytuje mapę gatunków, rozgrzewa pule połączeń i buduje w wątku
+    indeks wyszukiwania, po czym oznacza aplikację jako gotową. Schemat bazy tworzy osobny krok migracji: python -m src.cli migrate
+    """
+    await wait_for_database(lambda e, delay: logger.warning("Waiting for DB (retry in %.1fs): %s", delay, e))
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(genre_service.load_genre_ids)
+        await asyncio.to_thread(load_sync_genre_ids)
+    except Exception:
+        logger.exception("Loading genres failed, is the schema created (python -m src.cli migrate)?")
+        return
+    try:
+        await warm_up_pools()
+    except Exception as e:
+        logger.warning("Connection pool warm-up failed: %s", e)
+    try:
+        await asyncio.to_thread(build_search_index)
+    except Exception:
+        search_service.search_index.clear()
+        logger.exception("Building the search index failed, it will be built on the first search")
+    app.state.ready = True
+    logger.info("Database connected.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Nawiązuje połaczenie z bazą danych do momentu jej poprawnego utworzenia.
-    Przydatne przy uruchamianiu aplikacji w kontenerze Docker.
+    Sprawdza połączenie z bazą w tle (bez blokowania startu), uruchamia odbiór zdarzeń od innych procesów,
+    bufor zapisu recenzji (w trybie buffered) i opróżnia go do bazy przy zamykaniu aplikacji
+    oraz wątek fizycznie usuwający książki usunięte logicznie
     """
-    retries = 20
-    while retries > 0:
-        try:
-            Base.metadata.create_all(bind=engine)
-            print("Database connected.")
-            return
-        except Exception as e:
-            print(f"Waiting for DB... {e}")
-            retries -= 1
-            time.sleep(10)
+    app.state.ready = False
+    startup = asyncio.create_task(prepare_database(app))
+    await asyncio.to_thread(pubsub.start)
+    if settings.REVIEW_WRITE_MODE == "buffered":
+        review_buffer.start()
+    book_purger.start()
+    yield
+    startup.cancel()
+    await asyncio.to_thread(book_purger.stop)
+    await asyncio.to_thread(review_buffer.stop)
+    await asyncio.to_thread(pubsub.stop)
+    await async_engine.dispose()
 
-wait_for_db()
+app = FastAPI(title="Book Grading App", lifespan=lifespan)
 
-app = FastAPI(title="Book Grading App")
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+instrument_orm(Base)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+app.middleware("http")(record_request)
 
 
 @app.exception_handler(RequestValidationError)
@@ -58,4 +124,5 @@ app.add_middleware(
 
 app.include_router(books.router)
 app.include_router(reviews.router)
-app.include_router(websockets.router)
\ No newline at end of file
+app.include_router(websockets.router)
+app.include_router(system.router)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import bisect
+import threading
+from typing import Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Histogram o stałych kubełkach (górnych granicach w sekundach), zgodny z formatem Prometheus
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """
+        Rejestruje pojedynczą obserwację
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        """
+        Zwraca skumulowane liczności kubełków łącznie z +Inf
+        """
+        with self._lock:
+            counts = list(self._counts)
+        result = []
+        total = 0
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self) -> dict:
+        """
+        Zwraca stan histogramu jako słownik do serializacji JSON
+        """
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": dict(self.cumulative_counts()),
+        }
+
+
+class HistogramFamily:
+    """
+    Zbiór histogramów o wspólnej nazwie, rozróżnianych wartościami etykiet (np. trasą żądania)
+    """
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children: dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        """
+        Zwraca histogram dla podanych wartości etykiet, tworząc go przy pierwszym użyciu
+        """
+        key = tuple(str(value) for value in values)
+        histogram = self._children.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._children.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def render(self) -> list[str]:
+        """
+        Zwraca linie histogramów w formacie tekstowym Prometheus
+        """
+        series = [(dict(zip(self.labelnames, key)), histogram) for key, histogram in list(self._children.items())]
+        return render_histograms(self.name, self.documentation, series)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_histograms(name: str, documentation: str, series: Iterable[tuple[dict, Histogram]]) -> list[str]:
+    """
+    Zwraca linie podanych histogramów (etykiety, histogram) w formacie tekstowym Prometheus
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        for bound, count in histogram.cumulative_counts():
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    return lines
+
+
+def render_counters(name: str, documentation: str, series: Iterable[tuple[dict, float]]) -> list[str]:
+    """
+    Zwraca linie liczników (etykiety, wartość) w formacie tekstowym Prometheus
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+    lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in series)
+    return lines
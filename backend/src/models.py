@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Table
+from sqlalchemy import Column, DateTime, Integer, String, ForeignKey, Text, Table, Float, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -6,7 +6,7 @@ from .database import Base
 book_genres = Table(
     'book_genres',
     Base.metadata,
-    Column('book_id', Integer, ForeignKey('books.id'), primary_key=True),
+    Column('book_id', Integer, ForeignKey('books.id', ondelete="CASCADE"), primary_key=True),
     Column('genre_id', Integer, ForeignKey('genres.id'), primary_key=True)
 )
 
@@ -30,9 +30,36 @@ class BookDB(Base):
     description = Column(Text)
     year_published = Column(Integer)
     pages = Column(Integer)
-    reviews = relationship("ReviewDB", back_populates="book", cascade="all, delete-orphan")
+    # Numer wersji do optymistycznej kontroli współbieżności, podbijany przy każdej edycji książki
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    average_rating = Column(Float, nullable=False, default=0, server_default="0")
+    rating_count_1 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count_2 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count_3 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count_4 = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count_5 = Column(Integer, nullable=False, default=0, server_default="0")
+    # Znacznik usunięcia logicznego - książkę i jej recenzje fizycznie usuwa później purge_service
+    deleted_at = Column(DateTime, nullable=True, index=True)
+    reviews = relationship("ReviewDB", back_populates="book", cascade="all, delete-orphan", passive_deletes=True)
     genres = relationship("GenreDB", secondary=book_genres, back_populates="books")
 
+    __table_args__ = (
+        Index("ix_books_rating_rank", "average_rating", "review_count", "id"),
+        Index("ix_books_fulltext", "title", "author", "description", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+    # Podgląd najnowszych recenzji ustawiany przez book_service, nie jest kolumną
+    recent_reviews = ()
+
+    @property
+    def rating_histogram(self) -> dict[int, int]:
+        """
+        Liczba recenzji dla każdej oceny od 1 do 5
+        """
+        return {rating: getattr(self, f"rating_count_{rating}") or 0 for rating in range(1, 6)}
+
 class ReviewDB(Base):
     """
     Klasa encji dla tabeli reviews
@@ -41,5 +68,11 @@ class ReviewDB(Base):
     id = Column(Integer, primary_key=True, index=True)
     rating = Column(Integer)
     comment = Column(Text)
-    book_id = Column(Integer, ForeignKey("books.id"))
-    book = relationship("BookDB", back_populates="reviews")
\ No newline at end of file
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"))
+    book = relationship("BookDB", back_populates="reviews")
+
+    __table_args__ = (
+        Index("ix_reviews_book_id_id", "book_id", "id"),
+        Index("ix_reviews_book_id_rating_id", "book_id", "rating", "id"),
+    )
+
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Callable, Optional
+from .config import settings
+from .encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+STATS_CHANNEL = "stats"
+CACHE_CHANNEL = "cache"
+MAX_RECONNECT_DELAY_SECONDS = 5.0
+MAX_PENDING_PUBLISHES = 10000
+REDIS_TIMEOUT_SECONDS = 0.5
+
+Handler = Callable[[dict], None]
+
+
+def new_worker_id() -> str:
+    """
+    Zwraca identyfikator procesu roboczego unikalny w obrębie wdrożenia (host, PID i losowy sufiks)
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class _Subscribers:
+    """
+    Rejestr handlerów kanałów wspólny dla backendów. Handlery mogą odrzucać
+    zdarzenia opublikowane przez własny proces (include_own=False)
+    """
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self._handlers: dict[str, list[tuple[Handler, bool]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    @property
+    def channels(self) -> list[str]:
+        with self._lock:
+            return list(self._handlers)
+
+    def add(self, channel: str, handler: Handler, include_own: bool):
+        with self._lock:
+            self._handlers[channel].append((handler, include_own))
+
+    def dispatch(self, channel: str, envelope: dict):
+        own = envelope.get("origin") == self.worker_id
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler, include_own in handlers:
+            if own and not include_own:
+                continue
+            try:
+                handler(envelope["data"])
+            except Exception:
+                logger.exception("Handler of %r event failed", channel)
+
+
+class MemoryPubSub:
+    """
+    Rozgłaszanie zdarzeń w obrębie jednego procesu. Handlery wywoływane są synchronicznie
+    w wątku publikującym, więc muszą być bezpieczne wątkowo
+    """
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or new_worker_id()
+        self._subscribers = _Subscribers(self.worker_id)
+        self.published = 0
+
+    def subscribe(self, channel: str, handler: Handler, include_own: bool = True):
+        self._subscribers.add(channel, handler, include_own)
+
+    def publish(self, channel: str, data: dict):
+        self.published += 1
+        self._subscribers.dispatch(channel, {"origin": self.worker_id, "data": data})
+
+    def start(self):
+        pass
+
+    def stop(self, timeout: float = 5):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "worker_id": self.worker_id, "published": self.published, "received": self.published}
+
+
+class RedisPubSub:
+    """
+    Rozgłaszanie zdarzeń między procesami i replikami przez Redis PUBLISH/SUBSCRIBE.
+    Zdarzenia odbiera wątek w tle, który po utracie połączenia łączy się ponownie. Publikowanie też
+    odbywa się w osobnym wątku, w kolejności publish(), żeby zapis wywołany z pętli zdarzeń na nie nie czekał.
+    Kanały trzeba zasubskrybować przed start()
+    """
+    def __init__(self, url: str = None, client=None, prefix: str = "bookapp:", worker_id: Optional[str] = None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT_SECONDS)
+        self.client = client
+        self.prefix = prefix
+        self.worker_id = worker_id or new_worker_id()
+        self._subscribers = _Subscribers(self.worker_id)
+        self._stopping = threading.Event()
+        self._subscribed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubsub-publisher")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, channel: str, handler: Handler, include_own: bool = True):
+        self._subscribers.add(channel, handler, include_own)
+
+    def publish(self, channel: str, data: dict):
+        """
+        Zleca publikację zdarzenia wątkowi w tle i wraca od razu. Gdy Redis nie nadąża i czeka już
+        MAX_PENDING_PUBLISHES zdarzeń, nowe są odrzucane - zapis w bazie już się odbył
+        """
+        message = dumps({"origin": self.worker_id, "data": data})
+        with self._pending_lock:
+            if self._pending >= MAX_PENDING_PUBLISHES:
+                self.dropped += 1
+                logger.warning("Dropping %r event, too many events waiting to be published", channel)
+                return
+            self._pending += 1
+        self._publisher.submit(self._publish, channel, message)
+
+    def flush(self, timeout: float = 5):
+        """
+        Czeka do timeout sekund, aż zostaną opublikowane wcześniej zlecone zdarzenia
+        """
+        self._publisher.submit(lambda: None).result(timeout)
+
+    def start(self, timeout: float = 5) -> bool:
+        """
+        Uruchamia wątek odbierający zdarzenia i czeka do timeout sekund na subskrypcję kanałów
+        """
+        if self.running:
+            return True
+        self._stopping.clear()
+        self._subscribed.clear()
+        self._thread = threading.Thread(target=self._run, name="pubsub-listener", daemon=True)
+        self._thread.start()
+        return self._subscribed.wait(timeout)
+
+    def stop(self, timeout: float = 5):
+        try:
+            self.flush(timeout)
+        except FuturesTimeoutError:
+            logger.warning("Stopped with %d events not published", self._pending)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "worker_id": self.worker_id,
+            "running": self.running,
+            "published": self.published,
+            "received": self.received,
+            "publish_errors": self.publish_errors,
+            "pending": self._pending,
+            "dropped": self.dropped,
+        }
+
+    def _publish(self, channel: str, message: str):
+        """
+        Publikuje zdarzenie w wątku w tle. Błąd Redisa jest logowany, a nie zgłaszany
+        """
+        try:
+            self.client.publish(self.prefix + channel, message)
+            self.published += 1
+        except Exception as e:
+            self.publish_errors += 1
+            logger.warning("Publishing %r event failed: %s", channel, e)
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def _run(self):
+        """
+        Pętla wątku odbierającego: subskrybuje kanały i przekazuje zdarzenia handlerom
+        """
+        retry_delay = 0.1
+        while not self._stopping.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                channels = [self.prefix + channel for channel in self._subscribers.channels]
+                if not channels:
+                    self._subscribed.set()
+                    self._stopping.wait()
+                    return
+                pubsub.subscribe(*channels)
+                self._subscribed.set()
+                retry_delay = 0.1
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=0.5)
+                    if message:
+                        self._receive(message)
+            except Exception as e:
+                logger.warning("Pub/sub connection lost (retry in %.1fs): %s", retry_delay, e)
+                self._stopping.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+            finally:
+                pubsub.close()
+
+    def _receive(self, message: dict):
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        try:
+            envelope = json.loads(message["data"])
+        except (TypeError, ValueError):
+            logger.warning("Ignoring malformed event on %s", channel)
+            return
+        self.received += 1
+        self._subscribers.dispatch(channel.removeprefix(self.prefix), envelope)
+
+
+def create_pubsub():
+    """
+    Tworzy backend rozgłaszania zdarzeń wybrany w ustawieniach: memory (jeden proces) lub redis
+    """
+    if settings.PUBSUB_BACKEND == "redis":
+        return RedisPubSub(settings.PUBSUB_URL or settings.CACHE_URL)
+    return MemoryPubSub()
+
+
+def publish_stats_delta(books: int = 0, reviews: int = 0):
+    """
+    Rozsyła do wszystkich procesów zmianę liczby książek i recenzji po zatwierdzonym zapisie
+    """
+    if books or reviews:
+        pubsub.publish(STATS_CHANNEL, {"books": books, "reviews": reviews})
+
+
+pubsub = create_pubsub()
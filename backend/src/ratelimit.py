@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable
+from fastapi import HTTPException, Request
+from .config import settings
+from .database import recent_pool_wait
+
+logger = logging.getLogger(__name__)
+
+WRITES_BUCKET = "writes"
+BULK_BUCKET = "bulk"
+REDIS_TIMEOUT_SECONDS = 0.5
+WRITE_LIMIT_RESPONSES = {
+    429: {"description": "Write rate limit of the client exceeded, retry after Retry-After seconds"},
+    503: {"description": "Too many concurrent writes or the database is overloaded"},
+}
+
+
+class MemoryTokenBuckets:
+    """
+    Kubełki tokenów w pamięci procesu, zapisane w postaci GCRA: dla klucza pamiętany jest tylko
+    teoretyczny czas przybycia (TAT) kolejnego żądania. Najdawniej używane klucze są wypierane po max_keys
+    """
+    shared = False
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tats: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        """
+        Pobiera cost tokenów z kubełka klucza, który napełnia się rate tokenami na sekundę do pojemności burst.
+        Zwraca 0 gdy żądanie jest dozwolone, w przeciwnym razie liczbę sekund do uzbierania tokenów
+        """
+        with self._lock:
+            now = self.clock()
+            tat = max(self._tats.pop(key, now), now)
+            new_tat = tat + cost / rate
+            wait = new_tat - now - burst / rate
+            self._tats[key] = tat if wait > 0 else new_tat
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+            return max(wait, 0.0)
+
+
+class RedisTokenBuckets:
+    """
+    Kubełki tokenów współdzielone przez procesy, w Redisie lub serwerze zgodnym z jego protokołem.
+    TAT klucza aktualizowany jest w transakcji WATCH/MULTI z czasem serwera, bez skryptów Lua.
+    Gdy Redis jest niedostępny, żądania są przepuszczane - limit nie może zatrzymać zapisów
+    """
+    shared = True
+
+    def __init__(self, url: str = None, client=None, prefix: str = "bookapp:ratelimit:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=REDIS_TIMEOUT_SECONDS)
+        self.client = client
+        self.prefix = prefix
+        self.errors = 0
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        key = self.prefix + key
+
+        def update(pipe) -> float:
+            seconds, microseconds = pipe.time()
+            now = seconds + microseconds / 1_000_000
+            tat = max(float(pipe.get(key) or 0), now)
+            new_tat = tat + cost / rate
+            wait = new_tat - now - burst / rate
+            if wait > 0:
+                return wait
+            pipe.multi()
+            pipe.set(key, repr(new_tat), px=math.ceil((new_tat - now) * 1000) + 1000)
+            return 0.0
+
+        try:
+            return self.client.transaction(update, key, value_from_callable=True)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limit check failed, letting the request through: %s", e)
+            return 0.0
+
+
+class NoTokenBuckets:
+    """
+    Wyłączony limit żądań
+    """
+    shared = False
+
+    def take(self, key: str, rate: float, burst: int, cost: float = 1) -> float:
+        return 0.0
+
+
+class ConcurrencyLimiter:
+    """
+    Limit równocześnie obsługiwanych żądań na trasę w obrębie procesu. limit 0 wyłącza ograniczenie
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._active: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, route: str) -> bool:
+        with self._lock:
+            if self.limit and self._active[route] >= self.limit:
+                return False
+            self._active[route] += 1
+            return True
+
+    def release(self, route: str):
+        with self._lock:
+            self._active[route] -= 1
+
+    def active(self) -> dict[str, int]:
+        with self._lock:
+            return {route: count for route, count in self._active.items() if count}
+
+
+class AdmissionControl:
+    """
+    Kontrola przyjmowania żądań zapisu, zanim pobiorą połączenie z puli bazy danych:
+    - kubełek tokenów klienta (rate zapisów na sekundę, burst naraz) - po wyczerpaniu 429; zapisy zbiorcze
+      (import, paczki recenzji) mają osobny kubełek bulk_rate/bulk_burst,
+    - przeciążenie puli (średni czas oczekiwania na połączenie ponad max_pool_wait sekund) - 503,
+    - limit równoczesnych zapisów na trasę - 503.
+    Odpowiedzi odrzucone mają nagłówek Retry-After. Ograniczenie zapisów zostawia część puli odczytom
+    """
+    def __init__(
+        self,
+        buckets,
+        rate: float,
+        burst: int,
+        max_concurrency: int = 0,
+        max_pool_wait: float = 0,
+        pool_wait: Callable[[], float] = lambda: 0.0,
+        trust_forwarded: bool = False,
+        bulk_rate: float = 0,
+        bulk_burst: int = 1,
+    ):
+        self.buckets = buckets
+        self.rate = rate
+        self.burst = burst
+        self.bulk_rate = bulk_rate
+        self.bulk_burst = bulk_burst
+        self.concurrency = ConcurrencyLimiter(max_concurrency)
+        self.max_pool_wait = max_pool_wait
+        self.pool_wait = pool_wait
+        self.trust_forwarded = trust_forwarded
+        self.admitted = 0
+        self.rejected: Counter[str] = Counter()
+
+    def client_key(self, request: Request) -> str:
+        """
+        Identyfikuje klienta po adresie IP, za zaufanym proxy po ostatnim adresie z X-Forwarded-For -
+        tym, który dopisało proxy. Wcześniejsze adresy podaje klient, więc nie mogą wyznaczać kubełka
+        """
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for", "").split(",")[-1].strip()
+            if forwarded:
+                return forwarded
+        return request.client.host if request.client else "unknown"
+
+    def limit(self, route: str, bucket: str = WRITES_BUCKET):
+        """
+        Zwraca zależność FastAPI ograniczającą zapisy trasy route, do użycia w dependencies=[Depends(...)].
+        bucket wybiera kubełek tokenów: WRITES_BUCKET dla pojedynczych zapisów, BULK_BUCKET dla zbiorczych
+        """
+        async def dependency(request: Request):
+            await self.admit(route, request, bucket)
+            try:
+                yield
+            finally:
+                self.concurrency.release(route)
+
+        return dependency
+
+    async def admit(self, route: str, request: Request, bucket: str = WRITES_BUCKET):
+        """
+        Przyjmuje żądanie (zajmując miejsce w limicie równoczesnych zapisów trasy) albo rzuca HTTPException 429/503.
+        Kubełki współdzielone (Redis) sprawdzane są w wątku, żeby zapytanie sieciowe nie blokowało pętli zdarzeń
+        """
+        rate, burst = (self.bulk_rate, self.bulk_burst) if bucket == BULK_BUCKET else (self.rate, self.burst)
+        if rate > 0:
+            key = f"{bucket}:{self.client_key(request)}"
+            if self.buckets.shared:
+                wait = await asyncio.to_thread(self.buckets.take, key, rate, burst)
+            else:
+                wait = self.buckets.take(key, rate, burst)
+            if wait > 0:
+                self._reject("rate_limited", 429, "Too many write requests", wait)
+        if self.max_pool_wait > 0:
+            wait = self.pool_wait()
+            if wait > self.max_pool_wait:
+                self._reject("pool_saturated", 503, "Database is overloaded", wait)
+        if not self.concurrency.try_acquire(route):
+            self._reject("concurrency", 503, "Too many concurrent writes", 1)
+        self.admitted += 1
+
+    def stats(self) -> dict:
+        """
+        Zwraca ustawienia i liczniki kontroli przyjmowania do serializacji JSON
+        """
+        return {
+            "backend": type(self.buckets).__name__,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "bulk_rate_per_second": self.bulk_rate,
+            "bulk_burst": self.bulk_burst,
+            "max_concurrency": self.concurrency.limit,
+            "active": self.concurrency.active(),
+            "max_pool_wait_seconds": self.max_pool_wait,
+            "pool_wait_seconds": round(self.pool_wait(), 6),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+    def _reject(self, reason: str, status_code: int, detail: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise HTTPException(
+            status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+
+def create_buckets():
+    """
+    Tworzy backend kubełków tokenów wybrany w ustawieniach: memory, redis lub none
+    """
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBuckets(settings.RATE_LIMIT_URL or settings.CACHE_URL)
+    if settings.RATE_LIMIT_BACKEND == "none":
+        return NoTokenBuckets()
+    return MemoryTokenBuckets()
+
+
+admission = AdmissionControl(
+    create_buckets(),
+    rate=settings.RATE_LIMIT_WRITES_PER_SECOND,
+    burst=settings.RATE_LIMIT_WRITE_BURST,
+    max_concurrency=settings.WRITE_CONCURRENCY_LIMIT,
+    max_pool_wait=settings.POOL_WAIT_SHED_MS / 1000,
+    pool_wait=lambda: recent_pool_wait("async"),
+    trust_forwarded=settings.RATE_LIMIT_TRUST_FORWARDED,
+    bulk_rate=settings.RATE_LIMIT_BULK_PER_SECOND,
+    bulk_burst=settings.RATE_LIMIT_BULK_BURST,
+)
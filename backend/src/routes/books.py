@@ -1,69 +1,336 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+import codecs
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from .. import schemas
-from ..services import book_service
-from ..database import get_db
+from ..cache import cached_json_response, not_modified_response, parse_if_match, response_cache, version_etag
+from ..services import book_service, export_service, import_service, search_service
+from ..database import get_async_db, get_db
+from ..encoding import dumps
+from ..instrumentation import InstrumentedRoute, measure_serialization
+from ..ratelimit import BULK_BUCKET, WRITE_LIMIT_RESPONSES, admission
 
-router = APIRouter(prefix="/books", tags=["Books"])
+router = APIRouter(prefix="/books", tags=["Books"], route_class=InstrumentedRoute)
 
-@router.get("/", response_model=List[schemas.BookResponse])
-def get_books(
-    db: Session = Depends(get_db),
-    genre: Optional[schemas.GenreEnum] = Query(None, description="Filter books by genre")
+def to_json(rows) -> bytes:
+    """
+    Koduje do JSON słowniki z book_service.get_book_rows, które mają już kształt schematu odpowiedzi
+    """
+    with measure_serialization():
+        return dumps(rows)
+
+def book_filter(
+    genre: List[schemas.GenreEnum] = Query([], description="Filter by genres, repeat the parameter for more genres"),
+    genre_match: Literal["any", "all"] = Query("any", description="Books with any or with all of the genres"),
+    year_from: Optional[int] = Query(None, description="Minimum year of publication"),
+    year_to: Optional[int] = Query(None, description="Maximum year of publication"),
+    pages_min: Optional[int] = Query(None, ge=0, description="Minimum number of pages"),
+    pages_max: Optional[int] = Query(None, ge=0, description="Maximum number of pages")
+) -> schemas.BookFilter:
+    """
+    Zależność zbierająca filtry listy książek z query string
+    """
+    return schemas.BookFilter(
+        genre=genre, genre_match=genre_match, year_from=year_from, year_to=year_to,
+        pages_min=pages_min, pages_max=pages_max
+    )
+
+def book_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields of the book to return (id is always included), "
+                    "or summary for id, title, author and genres"
+    )
+) -> Optional[tuple[str, ...]]:
+    """
+    Zależność zamieniająca parametr fields na uporządkowaną krotkę nazw pól BookResponse
+    """
+    if fields is None:
+        return None
+    names = set()
+    for name in filter(None, (part.strip() for part in fields.split(","))):
+        names.update(schemas.BOOK_FIELD_SETS.get(name, (name,)))
+    unknown = names - set(schemas.BOOK_FIELDS)
+    if unknown or not names:
+        raise RequestValidationError([{
+            "type": "value_error",
+            "loc": ("query", "fields"),
+            "msg": f"Unknown fields: {', '.join(sorted(unknown))}" if unknown else "No fields given",
+            "input": fields,
+        }])
+    return tuple(name for name in schemas.BOOK_FIELDS if name in names)
+
+def filter_cache_key(filters: schemas.BookFilter) -> tuple:
+    """
+    Zwraca gatunek, którego generacja unieważnia wpis (tylko przy filtrze jednego gatunku,
+    w przeciwnym razie generacja wszystkich książek) i opis filtrów do klucza cache
+    """
+    genres = sorted({genre.value for genre in filters.genre})
+    generation_genre = genres[0] if len(genres) == 1 else None
+    return generation_genre, filters.model_dump_json(exclude_defaults=True)
+
+@router.get("/", response_model=List[Union[schemas.BookResponse, schemas.BookListItem, schemas.BookSummary]])
+async def get_books(
+    request: Request,
+    filters: schemas.BookFilter = Depends(book_filter),
+    fields: Optional[tuple[str, ...]] = Depends(book_fields),
+    db: AsyncSession = Depends(get_async_db),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of books on a page"),
+    after: Optional[int] = Query(None, description="ID of the last book from the previous page"),
+    include_reviews: bool = Query(True, description="Include a preview of the latest reviews of every book")
 ):
     """
-    Endpoint do pobrania wszystkich książek z opcjonalnym filtrowaniem po gatunkach
+    Endpoint do pobrania strony książek z opcjonalnym filtrowaniem po gatunkach (?genre=a&genre=b,
+    genre_match=any/all), roku wydania i liczbie stron.
+    Kolejną stronę pobiera się podając ID ostatniej książki w parametrze after.
+    Parametr fields ogranicza odpowiedź do wybranych pól (wtedy include_reviews jest pomijany).
+    Odpowiedzi są cache'owane i unieważniane przy zapisach książek i recenzji. ETag i Last-Modified
+    wynikają z wersji katalogu, więc niezmieniony katalog daje 304 bez zapytań do bazy.
+    :param filters: filtry z query string
+    :param fields: wybrane pola książki lub None dla pełnej odpowiedzi
     :param db: sesja bazy danych
+    :param limit: rozmiar strony
+    :param after: kursor - ID ostatniej książki z poprzedniej strony
+    :param include_reviews: czy zwracać książki razem z podglądem ostatnich recenzji
+    """
+    generation_genre, filter_key = filter_cache_key(filters)
+    if fields is not None:
+        include_reviews = "recent_reviews" in fields
+    key, validators = await response_cache.run(
+        response_cache.listing, generation_genre, filters=filter_key, limit=limit, after=after,
+        include_reviews=include_reviews, fields=",".join(fields or ())
+    )
+    if validators is not None and validators.matches(request):
+        return not_modified_response(validators)
+    cached = await response_cache.run(response_cache.get, key)
+    if cached is None:
+        rows = await db.run_sync(book_service.get_book_rows, limit, after, include_reviews, filters, None, fields)
+        cached = await response_cache.run(response_cache.set, key, to_json(rows))
+    return cached_json_response(request, cached, validators)
+
+@router.get("/facets", response_model=schemas.BookFacets)
+async def get_book_facets(
+    request: Request,
+    filters: schemas.BookFilter = Depends(book_filter),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint zwracający liczbę książek pasujących do filtrów w podziale na gatunki i dekady wydania,
+    np. do wyświetlenia liczników przy filtrach listy
+    """
+    generation_genre, filter_key = filter_cache_key(filters)
+    key, validators = await response_cache.run(response_cache.listing, generation_genre, facets=filter_key)
+    if validators is not None and validators.matches(request):
+        return not_modified_response(validators)
+    cached = await response_cache.run(response_cache.get, key)
+    if cached is None:
+        facets = await db.run_sync(book_service.get_book_facets, filters)
+        cached = await response_cache.run(response_cache.set, key, facets.model_dump_json().encode())
+    return cached_json_response(request, cached, validators)
+
+@router.get("/top", response_model=List[schemas.BookListItem])
+async def get_top_books(
+    db: AsyncSession = Depends(get_async_db),
+    genre: Optional[schemas.GenreEnum] = Query(None, description="Rank books only within this genre"),
+    min_reviews: int = Query(1, ge=1, description="Minimum number of reviews to be ranked"),
+    limit: int = Query(10, ge=1, le=100, description="Number of books in the ranking")
+):
+    """
+    Endpoint do pobrania rankingu najwyżej ocenianych książek
     :param genre: gatunek z query string ?genre=
+    :param min_reviews: minimalna liczba recenzji
+    :param limit: długość rankingu
+    """
+    return await db.run_sync(book_service.get_top_books, genre, min_reviews, limit)
+
+@router.get("/search", response_model=schemas.BookSearchResponse)
+async def search_books(
+    q: str = Query(..., min_length=1, max_length=200, description="Words searched in title, author and description"),
+    prefix: bool = Query(False, description="Treat the last word of the query as a prefix"),
+    limit: int = Query(20, ge=1, le=100, description="Number of results on a page"),
+    offset: int = Query(0, ge=0, le=10000, description="Number of results to skip"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do wyszukiwania pełnotekstowego książek po tytule, autorze i opisie
+    :param q: zapytanie
+    :param prefix: czy ostatnie słowo traktować jako prefiks (wyszukiwanie w trakcie pisania)
+    """
+    total, books = await db.run_sync(search_service.search_books, q, limit, offset, prefix)
+    return {"total": total, "items": books}
+
+@router.get("/search/suggest", response_model=List[str])
+async def suggest_terms(
+    q: str = Query(..., min_length=1, max_length=100, description="Text typed so far"),
+    limit: int = Query(10, ge=1, le=50, description="Number of suggestions"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint z podpowiedziami tytułów do autouzupełniania wyszukiwarki
+    """
+    return await db.run_sync(search_service.suggest_titles, q, limit)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_books(
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Format of the export"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do strumieniowego eksportu całego katalogu z gatunkami i zagregowanymi ocenami.
+    Książki czytane są paczkami, więc zużycie pamięci nie zależy od rozmiaru katalogu
     """
-    return book_service.get_books(db, genre)
+    return StreamingResponse(
+        export_service.EXPORTERS[format](db),
+        media_type=export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'}
+    )
 
-@router.get("/{book_id}", response_model=schemas.BookResponse)
-def get_book_by_id(
+@router.get("/{book_id}", response_model=Union[schemas.BookResponse, schemas.BookSummary])
+async def get_book_by_id(
     book_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    fields: Optional[tuple[str, ...]] = Depends(book_fields),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Endpoint do pobrania książki po jej ID
+    Endpoint do pobrania książki po jej ID, odpowiedź pochodzi z cache jeśli książka nie zmieniła się.
+    Odpowiedzi z wybranymi polami (fields) nie są cache'owane - to odczyt jednego wiersza po kluczu
     """
-    return book_service.get_book_by_id(db, book_id)
+    if fields is not None:
+        rows = await db.run_sync(book_service.get_book_rows, None, None, False, None, book_id, fields)
+        if not rows:
+            raise HTTPException(status_code=404, detail="Book not found")
+        return Response(content=to_json(rows[0]), media_type="application/json")
+    key = await response_cache.run(response_cache.book_key, book_id)
+    cached = await response_cache.run(response_cache.get, key)
+    if cached is None:
+        rows = await db.run_sync(book_service.get_book_rows, None, None, True, None, book_id)
+        if not rows:
+            raise HTTPException(status_code=404, detail="Book not found")
+        cached = await response_cache.run(response_cache.set, key, to_json(rows[0]), rows[0]["version"])
+    return cached_json_response(request, cached)
 
 
-@router.post("/", response_model=schemas.BookResponse)
-def create_book(
+@router.post(
+    "/",
+    response_model=schemas.BookResponse,
+    responses=WRITE_LIMIT_RESPONSES,
+    dependencies=[Depends(admission.limit("create_book"))]
+)
+async def create_book(
     book: schemas.BookCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint do dodania nowej książki
     """
-    return book_service.create_book(db, book)
+    db_book = await db.run_sync(book_service.create_book, book)
+    await response_cache.flush()
+    return db_book
 
-@router.put("/{book_id}", response_model=schemas.BookResponse)
-def update_book(
-        book_id: int,
-        book: schemas.BookUpdate,
-        db: Session = Depends(get_db)
+@router.post(
+    "/bulk",
+    response_model=schemas.ImportReport,
+    responses=WRITE_LIMIT_RESPONSES,
+    dependencies=[Depends(admission.limit("import_books", BULK_BUCKET))]
+)
+def import_books(
+    file: UploadFile = File(..., description="NDJSON or CSV file with books"),
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Format of the uploaded file"),
+    chunk_size: int = Query(1000, ge=1, le=10000, description="Number of books saved in one transaction"),
+    db: Session = Depends(get_db)
 ):
     """
-    Endpoint do aktualizacji książki po ID
+    Endpoint do masowego importu książek (z recenzjami) z pliku NDJSON lub CSV.
+    Plik czytany jest strumieniowo, a książki zapisywane w paczkach po chunk_size.
+    Walidacja wierszy obciąża CPU, dlatego import działa synchronicznie w puli wątków, poza pętlą zdarzeń.
+    Gatunki i recenzje wstawiane są zbiorczo, a książki zbiorczo tylko na bazach z INSERT ... RETURNING
+    (PostgreSQL) - na MySQL i SQLite każda książka to osobny INSERT, bo jej ID jest potrzebne do powiązań
     """
-    db_book = book_service.get_book_by_id(db, book_id)
+    # SpooledTemporaryFile przed Pythonem 3.11 nie ma readable(), więc nie da się go opakować TextIOWrapperem
+    lines = codecs.iterdecode(file.file, "utf-8")
+    return import_service.import_books(db, import_service.parse_rows(lines, format), chunk_size)
+
+async def apply_book_update(
+        request: Request,
+        response: Response,
+        book_id: int,
+        changes: Union[schemas.BookUpdate, schemas.BookPatch],
+        db: AsyncSession
+) -> schemas.BookResponse:
+    """
+    Wspólna obsługa PUT i PATCH: wersja z nagłówka If-Match (ETag z GET /books/{id} lub poprzedniego zapisu)
+    musi być aktualna, inaczej zwracane jest 412. ETag skompresowanej odpowiedzi ma prefiks W/ i też jest
+    przyjmowany, bo porównywany jest tylko numer wersji. Bez If-Match książka jest nadpisywana bezwarunkowo
+    """
+    if_match = request.headers.get("if-match")
+    try:
+        expected_version = parse_if_match(if_match) if if_match is not None else None
+    except ValueError:
+        raise HTTPException(status_code=412, detail="If-Match does not contain a book version")
+    try:
+        db_book = await db.run_sync(book_service.update_book, book_id, changes, expected_version)
+    except book_service.VersionConflict as e:
+        raise HTTPException(
+            status_code=412,
+            detail="Book was modified by someone else, reload it and try again",
+            headers={"ETag": version_etag(e.current_version)}
+        )
+    await response_cache.flush()
     if not db_book:
         raise HTTPException(status_code=404, detail="Book not found")
+    response.headers["ETag"] = version_etag(db_book.version)
+    return db_book
+
+@router.put(
+    "/{book_id}",
+    response_model=schemas.BookResponse,
+    responses=WRITE_LIMIT_RESPONSES,
+    dependencies=[Depends(admission.limit("update_book"))]
+)
+async def update_book(
+        book_id: int,
+        book: schemas.BookUpdate,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do aktualizacji książki po ID. Obsługuje optymistyczne blokowanie przez If-Match
+    """
+    return await apply_book_update(request, response, book_id, book, db)
 
-    return book_service.update_book(db, book_id, book)
+@router.patch(
+    "/{book_id}",
+    response_model=schemas.BookResponse,
+    responses=WRITE_LIMIT_RESPONSES,
+    dependencies=[Depends(admission.limit("update_book"))]
+)
+async def patch_book(
+        book_id: int,
+        book: schemas.BookPatch,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do częściowej aktualizacji książki - zmienia tylko przesłane pola. Obsługuje If-Match
+    """
+    return await apply_book_update(request, response, book_id, book, db)
 
 @router.delete("/{book_id}")
-def delete_book(
+async def delete_book(
         book_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint do usuwania książki po ID
     """
-    success = book_service.delete_book(db, book_id)
+    success = await db.run_sync(book_service.delete_book, book_id)
+    await response_cache.flush()
     if not success:
         raise HTTPException(status_code=404, detail="Book not found")
 
@@ -1,21 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import schemas
+from ..cache import response_cache
 from ..services import review_service, book_service
-from ..database import get_db
+from ..services.review_buffer import ReviewBufferFull, review_buffer
+from ..database import get_async_db
+from ..instrumentation import InstrumentedRoute
+from ..ratelimit import BULK_BUCKET, WRITE_LIMIT_RESPONSES, admission
 
-router = APIRouter(prefix="/reviews", tags=["Reviews"])
+router = APIRouter(prefix="/reviews", tags=["Reviews"], route_class=InstrumentedRoute)
 
-@router.post("/{book_id}", response_model=schemas.ReviewResponse)
-def rate_book(
+@router.post(
+    "/batch",
+    response_model=schemas.ReviewBatchResult,
+    responses=WRITE_LIMIT_RESPONSES,
+    dependencies=[Depends(admission.limit("create_reviews_batch", BULK_BUCKET))]
+)
+async def rate_books_batch(
+    batch: schemas.ReviewBatchCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do zbiorczego dodania recenzji wielu książek w jednej transakcji.
+    Wynik zawiera status każdej recenzji, recenzje nieistniejących książek są pomijane
+    """
+    result = await db.run_sync(review_service.create_reviews_batch, batch.items)
+    await response_cache.flush()
+    return result
+
+@router.get("/{book_id}", response_model=List[schemas.ReviewResponse])
+async def get_reviews(
+    book_id: int,
+    after: Optional[int] = Query(None, description="ID of the last review from the previous page"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of reviews on a page"),
+    rating: Optional[int] = Query(None, ge=1, le=5, description="Return only reviews with this rating"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint do pobrania strony recenzji książki, od najnowszych.
+    Kolejną stronę pobiera się podając ID ostatniej recenzji w parametrze after
+    """
+    reviews = await db.run_sync(review_service.get_reviews, book_id, after, limit, rating)
+    if not reviews and after is None and not await db.run_sync(book_service.book_exists, book_id):
+        raise HTTPException(status_code=404, detail="Book not found")
+    return reviews
+
+@router.post(
+    "/{book_id}",
+    response_model=schemas.ReviewResponse,
+    responses={
+        **WRITE_LIMIT_RESPONSES,
+        202: {"model": schemas.ReviewAccepted},
+        503: {"description": "Review buffer is full, too many concurrent writes or the database is overloaded"},
+    },
+    dependencies=[Depends(admission.limit("create_review"))]
+)
+async def rate_book(
     book_id: int,
     review: schemas.ReviewCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Endpoint do dodania recenzji dla książki po jej ID
+    Endpoint do dodania recenzji dla książki po jej ID.
+    Przy włączonym buforze zapisu recenzja jest przyjmowana do bufora i zwracane jest 202
     """
-    book = book_service.get_book_by_id(db, book_id)
-    if not book:
+    if not await db.run_sync(book_service.book_exists, book_id):
         raise HTTPException(status_code=404, detail="Book not found")
-    return review_service.create_review(db, review, book_id)
\ No newline at end of file
+    if review_buffer.running:
+        item = schemas.ReviewAccepted(book_id=book_id, **review.model_dump())
+        try:
+            # Zapis do spoola (z opcjonalnym fsync) odbywa się w wątku, poza pętlą zdarzeń
+            await asyncio.to_thread(review_buffer.submit, item)
+        except ReviewBufferFull:
+            raise HTTPException(status_code=503, detail="Review buffer is full", headers={"Retry-After": "1"})
+        return JSONResponse(status_code=202, content=item.model_dump())
+    db_review = await db.run_sync(review_service.create_review, review, book_id)
+    await response_cache.flush()
+    return db_review
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ..database import check_connection, get_pool_stats, pool_metrics
+from ..instrumentation import InstrumentedRoute, render_metrics
+from ..pubsub import pubsub
+from ..ratelimit import admission
+from ..services.stats_service import broadcaster
+from ..services.purge_service import book_purger
+from ..services.review_buffer import review_buffer
+
+router = APIRouter(tags=["System"], route_class=InstrumentedRoute)
+
+READINESS_CHECK_TIMEOUT_SECONDS = 2
+
+@router.get("/healthz")
+async def healthz():
+    """
+    Endpoint żywotności - odpowiada gdy proces obsługuje żądania, bez sprawdzania bazy danych
+    """
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    """
+    Endpoint gotowości - 200 dopiero gdy baza danych jest osiągalna i pule połączeń zostały rozgrzane
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await asyncio.wait_for(check_connection(), READINESS_CHECK_TIMEOUT_SECONDS)
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+    return {"status": "ready"}
+
+@router.get("/pool")
+async def pool_stats():
+    """
+    Endpoint zwracający bieżący stan pul połączeń i histogram czasu oczekiwania na połączenie
+    """
+    return get_pool_stats()
+
+@router.get("/review-buffer")
+async def review_buffer_stats():
+    """
+    Endpoint zwracający stan bufora zapisu recenzji i histogram czasu zapisu paczek
+    """
+    return review_buffer.stats()
+
+@router.get("/purge")
+async def purge_stats():
+    """
+    Endpoint zwracający postęp fizycznego usuwania książek usuniętych logicznie
+    """
+    return book_purger.stats()
+
+@router.get("/admission")
+async def admission_stats():
+    """
+    Endpoint zwracający ustawienia i liczniki limitów zapisów (429/503) oraz bieżące obciążenie puli
+    """
+    return admission.stats()
+
+@router.get("/pubsub")
+async def pubsub_stats():
+    """
+    Endpoint zwracający stan rozgłaszania zdarzeń między procesami i liczbę klientów WebSocket procesu
+    """
+    return {
+        **pubsub.stats(),
+        "websocket_clients": broadcaster.subscriber_count,
+        "stats_resyncs": broadcaster.resyncs,
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Endpoint z metrykami żądań, zapytań SQL i pul połączeń w formacie tekstowym Prometheus
+    """
+    return PlainTextResponse(render_metrics(pool_metrics), media_type="text/plain; version=0.0.4")
@@ -1,33 +1,27 @@
-import asyncio
-from fastapi import APIRouter, WebSocket
-from ..database import SessionLocal
-from ..services import book_service, review_service
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+from ..services.stats_service import broadcaster
 
 router = APIRouter()
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
-    Endpoint do połączenia z WebSocket który wysyła statystyki z systemu
+    Endpoint do połączenia z WebSocket który wysyła statystyki z systemu.
+    Statystyki liczy jedno współdzielone zadanie, klient dostaje je tylko gdy się zmienią.
     """
     await websocket.accept()
+    subscription = broadcaster.subscribe()
     try:
         while True:
-            db = SessionLocal()
-            try:
-                book_count = book_service.count_books(db)
-                review_count = review_service.count_reviews(db)
-
-                payload = {
-                    "total_books": book_count,
-                    "total_reviews": review_count
-                }
-            finally:
-                db.close()
-
+            payload = await subscription.get()
+            if payload is None:
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                return
             await websocket.send_json(payload)
 
-            await asyncio.sleep(1)
-
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        print(f"WebSocket disconnected: {e}")
\ No newline at end of file
+        print(f"WebSocket disconnected: {e}")
+    finally:
+        broadcaster.unsubscribe(subscription)
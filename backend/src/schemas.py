@@ -1,6 +1,6 @@
 from datetime import date
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field, ConfigDict
 
 class GenreEnum(str, Enum):
@@ -27,6 +27,40 @@ class ReviewCreate(BaseModel):
         description="Comment must be between 5 and 500 characters"
     )
 
+class ReviewBatchItem(ReviewCreate):
+    """
+    Klasa DTO dla pojedynczej recenzji w zbiorczym dodawaniu recenzji
+    """
+    book_id: int
+
+class ReviewAccepted(ReviewBatchItem):
+    """
+    Klasa DTO zwracana gdy recenzja została przyjęta do bufora i zostanie zapisana później
+    """
+    status: Literal["queued"] = "queued"
+
+class ReviewBatchCreate(BaseModel):
+    """
+    Klasa DTO do zbiorczego dodawania recenzji wielu książek
+    """
+    items: List[ReviewBatchItem] = Field(..., min_length=1, max_length=50000)
+
+class ReviewBatchItemResult(BaseModel):
+    """
+    Klasa DTO z wynikiem zapisu pojedynczej recenzji z paczki
+    """
+    index: int
+    book_id: int
+    status: Literal["created", "book_not_found"]
+
+class ReviewBatchResult(BaseModel):
+    """
+    Klasa DTO z podsumowaniem zbiorczego dodawania recenzji
+    """
+    created: int = 0
+    failed: int = 0
+    items: List[ReviewBatchItemResult] = []
+
 class ReviewResponse(ReviewCreate):
     """
     Klasa DTO do zwracania recenzji
@@ -67,6 +101,17 @@ class BookUpdate(BookCreate):
     """
     genres: Optional[List[GenreEnum]] = None
 
+class BookPatch(BaseModel):
+    """
+    Klasa DTO dla częściowej aktualizacji książki (PATCH) - zmieniane są tylko przesłane pola
+    """
+    title: Optional[str] = Field(None, min_length=1, max_length=150)
+    author: Optional[str] = Field(None, min_length=1, max_length=100)
+    description: Optional[str] = Field(None, min_length=10, max_length=2000)
+    year_published: Optional[int] = Field(None, ge=1800, le=date.today().year)
+    pages: Optional[int] = Field(None, ge=0)
+    genres: Optional[List[GenreEnum]] = None
+
 class GenreResponse(BaseModel):
     """
     Klasa DTO do zwracania gatunku
@@ -74,12 +119,87 @@ class GenreResponse(BaseModel):
     name: GenreEnum
     model_config = ConfigDict(from_attributes=True)
 
-class BookResponse(BookCreate):
+class BookFilter(BaseModel):
+    """
+    Klasa DTO z filtrami listy książek
+    """
+    genre: List[GenreEnum] = []
+    genre_match: Literal["any", "all"] = "any"
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    pages_min: Optional[int] = None
+    pages_max: Optional[int] = None
+
+class BookFacets(BaseModel):
+    """
+    Klasa DTO z liczbą książek pasujących do filtrów w podziale na gatunki i dekady wydania
+    """
+    total: int
+    genres: Dict[str, int]
+    decades: Dict[int, int]
+
+class BookListItem(BookCreate):
+    """
+    Klasa DTO do zwracania książki na liście, bez treści recenzji
+    """
+    id: int
+    version: int = 1
+    genres: List[GenreResponse] = []
+    review_count: int = 0
+    average_rating: float = 0
+    rating_histogram: Dict[int, int] = {}
+    model_config = ConfigDict(from_attributes=True)
+
+class BookResponse(BookListItem):
+    """
+    Klasa DTO do zwracania książki z podglądem najnowszych recenzji.
+    Pełna lista recenzji dostępna jest stronicowana pod /reviews/{book_id}
+    """
+    recent_reviews: List[ReviewResponse] = []
+
+
+class BookSummary(BaseModel):
     """
-    Klasa DTO do zwracania książki
+    Klasa DTO ze skróconym opisem książki do widoków list (?fields=summary)
     """
     id: int
-    reviews: List[ReviewResponse] = []
+    title: str
+    author: str
     genres: List[GenreResponse] = []
     model_config = ConfigDict(from_attributes=True)
 
+BOOK_FIELDS = tuple(BookResponse.model_fields)
+BOOK_FIELD_SETS = {"summary": tuple(BookSummary.model_fields)}
+
+
+class BookSearchResponse(BaseModel):
+    """
+    Klasa DTO z wynikami wyszukiwania pełnotekstowego
+    """
+    total: int
+    items: List[BookListItem]
+
+class BookImport(BookCreate):
+    """
+    Klasa DTO dla pojedynczego wiersza importu książek, opcjonalnie razem z recenzjami
+    """
+    reviews: List[ReviewCreate] = []
+
+class ImportRowError(BaseModel):
+    """
+    Klasa DTO opisująca błąd w wierszu importu
+    """
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    """
+    Klasa DTO z podsumowaniem importu
+    """
+    processed: int = 0
+    imported_books: int = 0
+    imported_reviews: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    elapsed_seconds: float = 0
+    rows_per_second: float = 0
@@ -1,87 +1,450 @@
+from typing import Collection, Iterable, Optional, Union
 from .. import models, schemas
-from sqlalchemy.orm import Session
+from ..cache import response_cache
+from ..pubsub import publish_stats_delta
+from . import genre_service, search_service
+from .purge_service import book_purger
+from sqlalchemy import delete, func, insert, literal, select, union_all, update
+from sqlalchemy.orm import Session, aliased, noload, selectinload
 
+REVIEW_PREVIEW_SIZE = 5
+IN_CHUNK_SIZE = 1000
+# Pola BookResponse odpowiadające wprost kolumnom tabeli books
+BOOK_COLUMN_FIELDS = (
+    "title", "author", "description", "year_published", "pages", "version", "review_count", "average_rating"
+)
 
-def get_books(db: Session, genre: schemas.GenreEnum = None):
+
+class VersionConflict(Exception):
+    """
+    Książka została w międzyczasie zmieniona - jej wersja różni się od oczekiwanej
+    """
+    def __init__(self, current_version: int):
+        super().__init__(f"Book is at version {current_version}")
+        self.current_version = current_version
+
+
+def get_books(
+    db: Session,
+    genre: schemas.GenreEnum = None,
+    limit: int = None,
+    after: int = None,
+    include_reviews: bool = True,
+    filters: schemas.BookFilter = None
+):
     """
-    Pobiera wszyskie ksiązki z bazy danych lub tylko te z danego gatunku
-    :param genre: gatunek po którym będzie filtrowanie
+    Pobiera stronę książek posortowanych po ID (paginacja keyset), opcjonalnie przefiltrowaną.
+    Gatunki i podgląd ostatnich recenzji są dociągane zbiorczo, więc liczba zapytań nie zależy od liczby książek.
+    :param genre: gatunek po którym będzie filtrowanie (skrót dla filters z jednym gatunkiem)
     :param db: sesja bazy danych
+    :param limit: maksymalna liczba zwróconych książek, None zwraca wszystkie
+    :param after: ID ostatniej książki z poprzedniej strony
+    :param include_reviews: czy dociągać podgląd ostatnich recenzji książek
+    :param filters: filtry gatunków, roku wydania i liczby stron
+    """
+    if genre:
+        filters = schemas.BookFilter(genre=[genre])
+    query = (
+        db.query(models.BookDB)
+        .options(selectinload(models.BookDB.genres), noload(models.BookDB.reviews))
+        .filter(models.BookDB.deleted_at.is_(None))
+    )
+    if filters:
+        query = query.filter(*book_filter_criteria(db, filters))
+    if after is not None:
+        query = query.filter(models.BookDB.id > after)
+    query = query.order_by(models.BookDB.id)
+    if limit is not None:
+        query = query.limit(limit)
+    books = query.all()
+    if include_reviews:
+        attach_review_previews(db, books)
+    return books
+
+def book_filter_criteria(db: Session, filters: schemas.BookFilter) -> list:
     """
-    query = db.query(models.BookDB)
+    Zamienia filtry listy książek na warunki WHERE tabeli books. Gatunki sprawdzane są
+    półzłączeniem z book_genres po ID z mapy gatunków, bez złączenia z tabelą genres
+    """
+    book = models.BookDB
+    book_genres = models.book_genres
+    criteria = []
+    if filters.genre:
+        genre_ids = genre_service.get_genre_ids(db)
+        wanted = {genre_ids[genre.value] for genre in filters.genre}
+        matching = select(book_genres.c.book_id).where(book_genres.c.genre_id.in_(wanted))
+        if filters.genre_match == "all" and len(wanted) > 1:
+            matching = matching.group_by(book_genres.c.book_id).having(func.count() == len(wanted))
+        criteria.append(book.id.in_(matching))
+    if filters.year_from is not None:
+        criteria.append(book.year_published >= filters.year_from)
+    if filters.year_to is not None:
+        criteria.append(book.year_published <= filters.year_to)
+    if filters.pages_min is not None:
+        criteria.append(book.pages >= filters.pages_min)
+    if filters.pages_max is not None:
+        criteria.append(book.pages <= filters.pages_max)
+    return criteria
+
+def get_book_facets(db: Session, filters: schemas.BookFilter) -> schemas.BookFacets:
+    """
+    Zlicza książki pasujące do filtrów w podziale na gatunki i dekady wydania jednym zapytaniem
+    (UNION ALL dwóch zapytań grupujących)
+    """
+    book = models.BookDB
+    book_genres = models.book_genres
+    criteria = [book.deleted_at.is_(None), *book_filter_criteria(db, filters)]
+    decade = book.year_published - book.year_published % 10
+    by_genre = (
+        select(literal("genre").label("facet"), book_genres.c.genre_id.label("value"), func.count().label("books"))
+        .select_from(book_genres.join(book, book.id == book_genres.c.book_id))
+        .where(*criteria)
+        .group_by(book_genres.c.genre_id)
+    )
+    by_decade = (
+        select(literal("decade").label("facet"), decade.label("value"), func.count().label("books"))
+        .where(*criteria)
+        .group_by(decade)
+    )
+    genre_names = genre_service.get_genre_names(db)
+    facets = schemas.BookFacets(total=0, genres={}, decades={})
+    for facet, value, count in db.execute(union_all(by_genre, by_decade)):
+        if facet == "genre":
+            facets.genres[genre_names[value]] = count
+        elif value is not None:
+            facets.decades[int(value)] = count
+            facets.total += count
+        else:
+            facets.total += count
+    return facets
+
+def get_top_books(db: Session, genre: schemas.GenreEnum = None, min_reviews: int = 1, limit: int = 10):
+    """
+    Pobiera najwyżej oceniane książki, ogólnie lub w danym gatunku.
+    Ranking czytany jest z indeksu ix_books_rating_rank na zagregowanych ocenach, bez sortowania recenzji.
+    Gatunek sprawdzany jest przez EXISTS po kluczu głównym book_genres dla kolejnych książek rankingu,
+    więc zapytanie kończy się po limit trafieniach zamiast sortować wszystkie książki gatunku
+    :param genre: gatunek, w którym liczony jest ranking
+    :param min_reviews: minimalna liczba recenzji książki w rankingu
+    :param limit: liczba zwróconych książek
+    """
+    book = models.BookDB
+    query = (
+        db.query(book)
+        .options(selectinload(book.genres), noload(book.reviews))
+        .filter(book.review_count >= min_reviews, book.deleted_at.is_(None))
+    )
     if genre:
-        query = query.join(models.BookDB.genres).filter(models.GenreDB.name == genre.value)
-    return query.all()
+        book_genres = models.book_genres
+        genre_id = genre_service.get_genre_ids(db)[genre.value]
+        query = query.filter(
+            select(book_genres.c.book_id)
+            .where(book_genres.c.book_id == book.id, book_genres.c.genre_id == genre_id)
+            .exists()
+        )
+    return (
+        query.order_by(book.average_rating.desc(), book.review_count.desc(), book.id.desc())
+        .limit(limit)
+        .all()
+    )
 
 def get_book_by_id(db: Session, book_id: int):
     """
-    Pobiera książke po jej ID
+    Pobiera książke po jej ID razem z gatunkami i podglądem ostatnich recenzji,
+    tak aby serializacja nie wykonywała już zapytań
+    """
+    db_book = (
+        db.query(models.BookDB)
+        .options(selectinload(models.BookDB.genres))
+        .populate_existing()
+        .filter(models.BookDB.id == book_id, models.BookDB.deleted_at.is_(None))
+        .first()
+    )
+    if db_book:
+        attach_review_previews(db, [db_book])
+    return db_book
+
+def attach_review_previews(db: Session, books: list[models.BookDB], size: int = REVIEW_PREVIEW_SIZE):
+    """
+    Ustawia książkom recent_reviews - do size najnowszych recenzji każdej książki, jednym zapytaniem
+    """
+    if not books:
+        return
+    review = models.ReviewDB
+    if len(books) == 1:
+        query = (
+            db.query(review)
+            .filter(review.book_id == books[0].id)
+            .order_by(review.id.desc())
+            .limit(size)
+        )
+    else:
+        ranked = _ranked_reviews([book.id for book in books])
+        ranked_review = aliased(review, ranked)
+        query = (
+            db.query(ranked_review)
+            .filter(ranked.c.position <= size)
+            .order_by(ranked.c.book_id, ranked.c.position)
+        )
+
+    previews = {book.id: [] for book in books}
+    for db_review in query:
+        previews[db_review.book_id].append(db_review)
+    for book in books:
+        book.recent_reviews = previews[book.id]
+
+def _ranked_reviews(book_ids: list[int]):
+    """
+    Podzapytanie recenzji podanych książek z numerem pozycji (od najnowszej) w obrębie książki
+    """
+    review = models.ReviewDB
+    return select(
+        review,
+        func.row_number().over(partition_by=review.book_id, order_by=review.id.desc()).label("position")
+    ).where(review.book_id.in_(book_ids)).subquery()
+
+def get_book_rows(
+    db: Session,
+    limit: int = None,
+    after: int = None,
+    include_reviews: bool = True,
+    filters: schemas.BookFilter = None,
+    book_id: int = None,
+    fields: Collection[str] = None
+) -> list[dict]:
+    """
+    Szybka ścieżka odpowiedzi: to samo co get_books (lub get_book_by_id dla book_id), ale zwraca
+    słowniki w kształcie BookListItem / BookResponse zbudowane wprost z krotek Core select(),
+    bez obiektów ORM i walidacji pydantic. Gatunki i podgląd recenzji dociągane są zbiorczo.
+    Podanie fields (nazwy pól BookResponse) ogranicza wynik do tych pól i id - wybierane są tylko
+    potrzebne kolumny, a gatunki i recenzje ładowane tylko gdy są wśród pól
+    """
+    if fields is None:
+        fields = set(schemas.BOOK_FIELDS) - ({"recent_reviews"} if not include_reviews else set())
+    book = models.BookDB
+    scalar_fields = [name for name in BOOK_COLUMN_FIELDS if name in fields]
+    with_histogram = "rating_histogram" in fields
+    with_genres = "genres" in fields
+    with_reviews = "recent_reviews" in fields
+
+    query = select(*_book_columns(scalar_fields, with_histogram)).where(book.deleted_at.is_(None))
+    if filters:
+        query = query.where(*book_filter_criteria(db, filters))
+    if book_id is not None:
+        query = query.where(book.id == book_id)
+    if after is not None:
+        query = query.where(book.id > after)
+    query = query.order_by(book.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows = {}
+    for values in db.execute(query):
+        row = _book_row(scalar_fields, with_histogram, values)
+        if with_genres:
+            row["genres"] = []
+        if with_reviews:
+            row["recent_reviews"] = []
+        rows[row["id"]] = row
+
+    ids = list(rows) if with_genres or with_reviews else []
+    genre_names = genre_service.get_genre_names(db) if ids and with_genres else {}
+    book_genres = models.book_genres
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[start:start + IN_CHUNK_SIZE]
+        if with_genres:
+            genre_query = select(book_genres.c.book_id, book_genres.c.genre_id).where(book_genres.c.book_id.in_(chunk))
+            for row_book_id, genre_id in db.execute(genre_query):
+                rows[row_book_id]["genres"].append({"name": genre_names[genre_id]})
+        if with_reviews:
+            for row_book_id, preview in _review_previews(db, chunk):
+                rows[row_book_id]["recent_reviews"].append(preview)
+    return list(rows.values())
+
+def _book_columns(scalar_fields: Collection[str], with_histogram: bool) -> list:
+    """
+    Kolumny tabeli books potrzebne do zbudowania wiersza odpowiedzi: id, podane pola i opcjonalnie histogram ocen
+    """
+    table = models.BookDB.__table__
+    columns = [table.c.id, *(table.c[name] for name in scalar_fields)]
+    if with_histogram:
+        columns.extend(table.c[f"rating_count_{rating}"] for rating in range(1, 6))
+    return columns
+
+def _book_row(scalar_fields: Collection[str], with_histogram: bool, values) -> dict:
+    """
+    Buduje słownik odpowiedzi z krotki kolumn zwróconych dla _book_columns
+    """
+    row = {"id": values[0], **dict(zip(scalar_fields, values[1:]))}
+    if with_histogram:
+        histogram = values[1 + len(scalar_fields):]
+        row["rating_histogram"] = {str(rating): count or 0 for rating, count in enumerate(histogram, start=1)}
+    return row
+
+def _review_previews(db: Session, book_ids: list[int]):
+    """
+    Zwraca pary (ID książki, recenzja) z najnowszymi recenzjami podanych książek, od najnowszej
     """
-    return db.query(models.BookDB).filter(models.BookDB.id == book_id).first()
+    ranked = _ranked_reviews(book_ids)
+    preview_query = (
+        select(ranked.c.book_id, ranked.c.rating, ranked.c.comment, ranked.c.id)
+        .where(ranked.c.position <= REVIEW_PREVIEW_SIZE)
+        .order_by(ranked.c.book_id, ranked.c.position)
+    )
+    for book_id, rating, comment, review_id in db.execute(preview_query):
+        yield book_id, {"rating": rating, "comment": comment, "id": review_id}
+
+def book_exists(db: Session, book_id: int) -> bool:
+    """
+    Sprawdza czy książka o danym ID istnieje, bez ładowania jej relacji
+    """
+    book = models.BookDB
+    return db.query(book.id).filter(book.id == book_id, book.deleted_at.is_(None)).first() is not None
+
+def existing_book_ids(db: Session, book_ids: Iterable[int]) -> set[int]:
+    """
+    Zwraca te z podanych ID, które należą do istniejących książek (jedno zapytanie IN)
+    """
+    book_ids = set(book_ids)
+    if not book_ids:
+        return set()
+    book = models.BookDB
+    return set(db.scalars(select(book.id).where(book.id.in_(book_ids), book.deleted_at.is_(None))))
 
 def create_book(db: Session, book: schemas.BookCreate):
     """
     Dodaje nową książke do bazy danych
     """
+    genre_ids = genre_service.get_genre_ids(db)
     book_data = book.dict(exclude={"genres"})
     db_book = models.BookDB(**book_data)
+    db.add(db_book)
+    db.flush()
 
     if book.genres:
-        db_book.genres = __get_or_create_genres(db, book.genres)
+        db.execute(insert(models.book_genres), [
+            {"book_id": db_book.id, "genre_id": genre_ids[genre.value]} for genre in dict.fromkeys(book.genres)
+        ])
 
-    db.add(db_book)
     db.commit()
-    db.refresh(db_book)
-    return db_book
+    response_cache.invalidate_book(db_book.id, [genre.value for genre in book.genres])
+    publish_stats_delta(books=1)
+    search_service.index_book(db_book.id, book.title, book.author, book.description)
+    return get_book_by_id(db, db_book.id)
 
-def update_book(db: Session, book_id: int, book_update: schemas.BookUpdate):
+def update_book(
+    db: Session,
+    book_id: int,
+    book_update: Union[schemas.BookUpdate, schemas.BookPatch],
+    expected_version: int = None
+) -> Optional[schemas.BookResponse]:
     """
-    Aktualizuje istniejącą książke
+    Aktualizuje książkę jednym poleceniem UPDATE ... WHERE id = ? [AND version = ?], które podbija wersję
+    i zwraca nowy wiersz (RETURNING, a gdy baza go nie obsługuje - odczyt po kluczu).
+    Zmieniane są tylko pola ustawione w book_update, więc ta sama funkcja obsługuje PUT i PATCH.
+    Zwraca None gdy książki nie ma, rzuca VersionConflict gdy expected_version jest nieaktualna
     """
-    db_book = db.query(models.BookDB).filter(models.BookDB.id == book_id).first()
-    if db_book:
-        db_book.title = book_update.title
-        db_book.author = book_update.author
-        db_book.description = book_update.description
-        db_book.year_published = book_update.year_published
-        db_book.pages = book_update.pages
+    changes = {name: value for name, value in book_update.model_dump(exclude_unset=True).items() if value is not None}
+    genres = changes.pop("genres", None)
+    genre_ids = genre_service.get_genre_ids(db)
+    table = models.BookDB.__table__
+    columns = _book_columns(BOOK_COLUMN_FIELDS, with_histogram=True)
 
-        if book_update.genres is not None:
-            db_book.genres = __get_or_create_genres(db, book_update.genres)
+    statement = update(table).where(table.c.id == book_id, table.c.deleted_at.is_(None)).values(**changes, version=table.c.version + 1)
+    if expected_version is not None:
+        statement = statement.where(table.c.version == expected_version)
+    if db.get_bind().dialect.update_returning:
+        values = db.execute(statement.returning(*columns)).first()
+    else:
+        updated = db.execute(statement).rowcount
+        values = db.execute(select(*columns).where(table.c.id == book_id)).first() if updated else None
+    if values is None:
+        current_version = db.scalar(select(table.c.version).where(table.c.id == book_id, table.c.deleted_at.is_(None)))
+        db.rollback()
+        if current_version is None:
+            return None
+        raise VersionConflict(current_version)
 
-        db.commit()
-        db.refresh(db_book)
-    return db_book
+    current = set(db.scalars(
+        select(models.book_genres.c.genre_id).where(models.book_genres.c.book_id == book_id)
+    ))
+    wanted = current if genres is None else {genre_ids[genre.value] for genre in genres}
+    _set_book_genres(db, book_id, current, wanted)
+    book = _book_row(BOOK_COLUMN_FIELDS, True, values)
+    book["recent_reviews"] = [preview for _, preview in _review_previews(db, [book_id])]
+    db.commit()
+
+    genre_names = genre_service.get_genre_names(db)
+    book["genres"] = [{"name": genre_names[genre_id]} for genre_id in sorted(wanted)]
+    response_cache.invalidate_book(book_id, [genre_names[genre_id] for genre_id in current | wanted])
+    search_service.index_book(book_id, book["title"], book["author"], book["description"])
+    return schemas.BookResponse.model_validate(book)
+
+def _set_book_genres(db: Session, book_id: int, current: set[int], wanted: set[int]) -> set[int]:
+    """
+    Zmienia gatunki książki wstawiając i usuwając tylko zmienione wiersze book_genres
+    """
+    book_genres = models.book_genres
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        db.execute(delete(book_genres).where(book_genres.c.book_id == book_id, book_genres.c.genre_id.in_(removed)))
+    if added:
+        db.execute(insert(book_genres), [{"book_id": book_id, "genre_id": genre_id} for genre_id in sorted(added)])
 
 def delete_book(db: Session, book_id: int):
     """
-    Usuwa książke po jej ID
+    Usuwa książke po jej ID logicznie: ustawia znacznik deleted_at jednym poleceniem UPDATE,
+    więc czas usuwania nie zależy od liczby recenzji. Od zatwierdzenia książka jest niewidoczna
+    dla odczytów, a ją i jej recenzje fizycznie usuwa w tle purge_service
     """
-    db_book = db.query(models.BookDB).filter(models.BookDB.id == book_id).first()
-    if db_book:
-        db.delete(db_book)
-        db.commit()
-        return True
-    return False
+    table = models.BookDB.__table__
+    live = (table.c.id == book_id, table.c.deleted_at.is_(None))
+    statement = update(table).where(*live).values(deleted_at=func.now())
+    # Liczba recenzji musi pochodzić z usuwanego wiersza: RETURNING albo blokada FOR UPDATE, bo dodanie
+    # recenzji zmienia review_count tego wiersza i inaczej mogłoby wejść między odczyt a UPDATE
+    if db.get_bind().dialect.update_returning:
+        review_count = db.scalar(statement.returning(table.c.review_count))
+    else:
+        review_count = db.scalar(select(table.c.review_count).where(*live).with_for_update())
+        if review_count is not None and not db.execute(statement).rowcount:
+            review_count = None
+    if review_count is None:
+        db.rollback()
+        return False
+    genres = get_book_genre_names(db, book_id)
+    db.commit()
+    response_cache.invalidate_book(book_id, genres)
+    publish_stats_delta(books=-1, reviews=-review_count)
+    search_service.unindex_book(book_id)
+    book_purger.wake()
+    return True
 
-def count_books(db: Session) -> int:
+def get_book_genre_names(db: Session, book_id: int) -> list[str]:
     """
-    Zwraca liczbę książek w systemie
+    Zwraca nazwy gatunków książki bez ładowania samej książki
     """
-    return db.query(models.BookDB).count()
+    return [
+        name for (name,) in
+        db.query(models.GenreDB.name)
+        .join(models.book_genres, models.book_genres.c.genre_id == models.GenreDB.id)
+        .filter(models.book_genres.c.book_id == book_id)
+    ]
 
-def __get_or_create_genres(db: Session, genre_enums: list[schemas.GenreEnum]):
+def get_genre_names_of_books(db: Session, book_ids: Iterable[int]) -> set[str]:
+    """
+    Zwraca nazwy wszystkich gatunków, do których należy którakolwiek z podanych książek
+    """
+    return {
+        name for (name,) in
+        db.query(models.GenreDB.name)
+        .join(models.book_genres, models.book_genres.c.genre_id == models.GenreDB.id)
+        .filter(models.book_genres.c.book_id.in_(set(book_ids)))
+        .distinct()
+    }
+
+def count_books(db: Session) -> int:
     """
-    Zwraca listę gatunków na podstawie enuma i dodaje je do bazy danych
+    Zwraca liczbę książek w systemie, bez usuniętych logicznie
     """
-    genres_db = []
-    for genre_enum in genre_enums:
-        name = genre_enum.value
-        genre = db.query(models.GenreDB).filter(models.GenreDB.name == name).first()
-        if not genre:
-            genre = models.GenreDB(name=name)
-            db.add(genre)
-            db.commit()
-            db.refresh(genre)
-        genres_db.append(genre)
-    return genres_db
\ No newline at end of file
+    return db.query(models.BookDB).filter(models.BookDB.deleted_at.is_(None)).count()
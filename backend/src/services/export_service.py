@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import noload, selectinload
+from .. import models
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = [
+    "id", "title", "author", "description", "year_published", "pages", "genres",
+    "review_count", "average_rating",
+    "rating_count_1", "rating_count_2", "rating_count_3", "rating_count_4", "rating_count_5",
+]
+
+
+async def iter_book_batches(db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[list[models.BookDB]]:
+    """
+    Strumieniowo pobiera wszystkie książki kursorem po stronie serwera, po batch_size wierszy naraz.
+    Gatunki dociągane są zbiorczo dla każdej paczki, recenzje nie są ładowane
+    """
+    stmt = (
+        select(models.BookDB)
+        .options(selectinload(models.BookDB.genres), noload(models.BookDB.reviews))
+        .where(models.BookDB.deleted_at.is_(None))
+        .order_by(models.BookDB.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream_scalars(stmt)
+    async for partition in result.partitions():
+        yield partition
+
+
+def book_to_row(book: models.BookDB) -> dict:
+    """
+    Zamienia książkę na płaski słownik eksportu, zgodny z formatem importu
+    """
+    row = {column: getattr(book, column) for column in CSV_COLUMNS if column != "genres"}
+    row["genres"] = [genre.name for genre in book.genres]
+    return row
+
+
+async def export_ndjson(db: AsyncSession) -> AsyncIterator[str]:
+    """
+    Generuje eksport katalogu w formacie NDJSON, jedna książka na linię i jeden fragment odpowiedzi na paczkę
+    """
+    async for batch in iter_book_batches(db):
+        yield "".join(json.dumps(book_to_row(book), ensure_ascii=False) + "\n" for book in batch)
+
+
+async def export_csv(db: AsyncSession) -> AsyncIterator[str]:
+    """
+    Generuje eksport katalogu w formacie CSV, gatunki rozdzielone znakiem |
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    async for batch in iter_book_batches(db):
+        for book in batch:
+            row = book_to_row(book)
+            row["genres"] = "|".join(row["genres"])
+            writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORTERS = {"ndjson": export_ndjson, "csv": export_csv}
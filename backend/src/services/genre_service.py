@@ -0,0 +1,62 @@
+import threading
+import weakref
+from types import MappingProxyType
+from typing import Mapping
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+from .. import models, schemas
+
+_genre_ids: "weakref.WeakKeyDictionary[object, Mapping[str, int]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def seed_genres(db: Session):
+    """
+    Dodaje do tabeli genres brakujące wartości GenreEnum i zatwierdza sesję. Gdy wszystkie już są,
+    nic nie zapisuje. Zapis jest odporny na wyścig równoległych procesów: istniejące nazwy są pomijane
+    (INSERT IGNORE / ON CONFLICT DO NOTHING)
+    """
+    existing = set(db.scalars(select(models.GenreDB.name)))
+    rows = [{"name": genre.value} for genre in schemas.GenreEnum if genre.value not in existing]
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(models.GenreDB).prefix_with("IGNORE")
+    elif dialect == "sqlite":
+        statement = sqlite.insert(models.GenreDB).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        statement = insert(models.GenreDB)
+    if rows:
+        db.execute(statement, rows)
+    db.commit()
+
+
+def load_genre_ids(db: Session) -> Mapping[str, int]:
+    """
+    Zasiewa gatunki i wczytuje niezmienną mapę nazwa gatunku -> ID dla bazy danych sesji
+    """
+    seed_genres(db)
+    genre_ids = MappingProxyType(dict(db.execute(select(models.GenreDB.name, models.GenreDB.id)).all()))
+    with _lock:
+        _genre_ids[db.get_bind()] = genre_ids
+    return genre_ids
+
+
+def get_genre_ids(db: Session) -> Mapping[str, int]:
+    """
+    Zwraca mapę nazwa gatunku -> ID. Po pierwszym wczytaniu (przy starcie aplikacji) nie wykonuje zapytań.
+    Zimną mapę wczytuje osobna sesja, bo zasiewanie zatwierdza transakcję - nie może to być
+    niedokończona transakcja wywołującego
+    """
+    genre_ids = _genre_ids.get(db.get_bind())
+    if genre_ids is None or len(genre_ids) < len(schemas.GenreEnum):
+        with Session(db.get_bind()) as genre_db:
+            genre_ids = load_genre_ids(genre_db)
+    return genre_ids
+
+
+def get_genre_names(db: Session) -> Mapping[int, str]:
+    """
+    Zwraca odwrotną mapę ID gatunku -> nazwa
+    """
+    return {genre_id: name for name, genre_id in get_genre_ids(db).items()}
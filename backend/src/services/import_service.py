@@ -0,0 +1,150 @@
+import csv
+import json
+import time
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .. import models, schemas
+from ..cache import response_cache
+from ..pubsub import publish_stats_delta
+from . import genre_service, search_service
+
+FORMATS = ("ndjson", "csv")
+MAX_REPORTED_ERRORS = 1000
+CSV_GENRE_SEPARATOR = "|"
+
+
+def parse_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple[int, object]]:
+    """
+    Strumieniowo zamienia linie pliku NDJSON lub CSV na pary (numer linii, surowy wiersz).
+    W CSV gatunki rozdzielone są znakiem |, recenzje można importować tylko z NDJSON
+    """
+    if fmt == "ndjson":
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+    elif fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            genres = row.get("genres") or ""
+            row["genres"] = [genre.strip() for genre in genres.split(CSV_GENRE_SEPARATOR) if genre.strip()]
+            yield reader.line_num, row
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def import_books(db: Session, rows: Iterable[tuple[int, object]], chunk_size: int = 1000) -> schemas.ImportReport:
+    """
+    Importuje książki z recenzjami w paczkach, każda paczka to jedna transakcja.
+    Wiersze są walidowane schematem BookImport, błędne wiersze trafiają do raportu
+    """
+    report = schemas.ImportReport()
+    started = time.perf_counter()
+    chunk = []
+    for line_no, raw in rows:
+        report.processed += 1
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            chunk.append((line_no, schemas.BookImport.model_validate(raw)))
+        except (ValidationError, ValueError) as e:
+            _record_error(report, line_no, e)
+        if len(chunk) >= chunk_size:
+            _import_chunk(db, chunk, report)
+            chunk = []
+    if chunk:
+        _import_chunk(db, chunk, report)
+
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    if report.elapsed_seconds:
+        report.rows_per_second = round(report.processed / report.elapsed_seconds, 1)
+    return report
+
+
+def _import_chunk(db: Session, chunk: list[tuple[int, schemas.BookImport]], report: schemas.ImportReport):
+    """
+    Zapisuje paczkę książek: ID gatunków pochodzą z mapy w pamięci,
+    a powiązania z gatunkami i recenzje wstawiane są zbiorczo (executemany)
+    """
+    try:
+        genre_ids = genre_service.get_genre_ids(db)
+        genres = {genre.value for _, book in chunk for genre in book.genres}
+        book_ids = _insert_books(db, [_to_book_row(book) for _, book in chunk])
+
+        genre_rows = [
+            {"book_id": book_id, "genre_id": genre_ids[genre.value]}
+            for book_id, (_, book) in zip(book_ids, chunk)
+            for genre in dict.fromkeys(book.genres)
+        ]
+        review_rows = [
+            {**review.model_dump(), "book_id": book_id}
+            for book_id, (_, book) in zip(book_ids, chunk)
+            for review in book.reviews
+        ]
+        if genre_rows:
+            db.execute(insert(models.book_genres), genre_rows)
+        if review_rows:
+            db.execute(insert(models.ReviewDB), review_rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        for line_no, _ in chunk:
+            _record_error(report, line_no, e)
+        return
+
+    response_cache.invalidate_book(None, genres)
+    publish_stats_delta(books=len(chunk), reviews=len(review_rows))
+    for book_id, (_, book) in zip(book_ids, chunk):
+        search_service.index_book(book_id, book.title, book.author, book.description)
+    report.imported_books += len(chunk)
+    report.imported_reviews += sum(len(book.reviews) for _, book in chunk)
+
+
+def _insert_books(db: Session, rows: list[dict]) -> list[int]:
+    """
+    Wstawia wiersze książek i zwraca ich ID w kolejności wierszy. Gdy dialekt zwraca ID z INSERT ... RETURNING
+    w kolejności parametrów, SQLAlchemy wstawia je wielowierszowo (PostgreSQL; w SQLite i tak wiersz po wierszu).
+    MySQL nie ma RETURNING, a ID z wielowierszowego INSERT nie muszą być kolejne
+    (innodb_autoinc_lock_mode=2), więc tam każda książka to osobny INSERT
+    """
+    table = models.BookDB.__table__
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(db.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows))
+    return [db.execute(insert(table), row).inserted_primary_key[0] for row in rows]
+
+
+def _to_book_row(book: schemas.BookImport) -> dict:
+    """
+    Zwraca wiersz książki z od razu wyliczonymi zagregowanymi ocenami importowanych recenzji
+    """
+    ratings = [review.rating for review in book.reviews]
+    row = {
+        **book.model_dump(exclude={"genres", "reviews"}),
+        "review_count": len(ratings),
+        "rating_sum": sum(ratings),
+        "average_rating": sum(ratings) / len(ratings) if ratings else 0,
+    }
+    for rating in range(1, 6):
+        row[f"rating_count_{rating}"] = ratings.count(rating)
+    return row
+
+
+def _record_error(report: schemas.ImportReport, line_no: int, error: Exception):
+    """
+    Dopisuje błąd wiersza do raportu, zachowując tylko pierwsze MAX_REPORTED_ERRORS błędów
+    """
+    report.failed += 1
+    if len(report.errors) >= MAX_REPORTED_ERRORS:
+        return
+    if isinstance(error, ValidationError):
+        first_error = error.errors()[0]
+        field = ".".join(str(part) for part in first_error["loc"])
+        message = f"{field}: {first_error['msg']}"
+    else:
+        message = str(error)
+    report.errors.append(schemas.ImportRowError(line=line_no, error=message))
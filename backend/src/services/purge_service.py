@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from .. import models
+from ..config import settings
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class BookPurger:
+    """
+    Fizyczne usuwanie książek usuniętych logicznie (deleted_at). Wątek w tle usuwa recenzje każdej
+    książki paczkami po batch_size wierszy, każdą w osobnej krótkiej transakcji z przerwą pause sekund
+    między paczkami, a na końcu gatunki książki i samą książkę. Przerwane usuwanie jest kontynuowane
+    przy kolejnym przebiegu, który startuje co interval sekund lub od razu po wake()
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 1000,
+        pause: float = 0.05,
+        interval: float = 30,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.current_book: Optional[int] = None
+        self.current_reviews_deleted = 0
+        self.books_purged = 0
+        self.reviews_purged = 0
+        self.batches = 0
+        self.failed_runs = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._wakeup.set()
+        self._thread = threading.Thread(target=self._run, name="book-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """
+        Zatrzymuje wątek po bieżącej paczce. Niedokończona książka zostanie dokończona po restarcie
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """
+        Rozpoczyna przebieg usuwania bez czekania na upływ interval
+        """
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        """
+        Zwraca postęp i liczniki usuwania do serializacji JSON
+        """
+        return {
+            "running": self.running,
+            "current_book": self.current_book,
+            "current_reviews_deleted": self.current_reviews_deleted,
+            "books_purged": self.books_purged,
+            "reviews_purged": self.reviews_purged,
+            "batches": self.batches,
+            "failed_runs": self.failed_runs,
+            "last_error": self.last_error,
+        }
+
+    def purge_pending(self, db: Session) -> int:
+        """
+        Usuwa fizycznie wszystkie książki usunięte logicznie, od najdawniej usuniętej. Zwraca liczbę usuniętych książek
+        """
+        books = models.BookDB.__table__
+        pending = list(db.scalars(
+            select(books.c.id).where(books.c.deleted_at.is_not(None)).order_by(books.c.deleted_at, books.c.id)
+        ))
+        db.rollback()
+        purged = 0
+        for book_id in pending:
+            if self._stopping.is_set():
+                break
+            if self.purge_book(db, book_id):
+                purged += 1
+        return purged
+
+    def purge_book(self, db: Session, book_id: int) -> bool:
+        """
+        Usuwa recenzje książki paczkami, a potem jej gatunki i ją samą. Książka musi być usunięta logicznie.
+        Zwraca False gdy przerwano usuwanie przez stop() lub książka nie jest usunięta logicznie
+        """
+        books = models.BookDB.__table__
+        reviews = models.ReviewDB.__table__
+        deleted_at = db.scalar(select(books.c.deleted_at).where(books.c.id == book_id))
+        db.rollback()
+        if deleted_at is None:
+            return False
+        self.current_book = book_id
+        self.current_reviews_deleted = 0
+        try:
+            while True:
+                # SELECT ... LIMIT + DELETE ... IN działa na każdej bazie (MySQL nie pozwala na LIMIT w podzapytaniu IN)
+                review_ids = list(db.scalars(
+                    select(reviews.c.id).where(reviews.c.book_id == book_id).limit(self.batch_size)
+                ))
+                if not review_ids:
+                    break
+                db.execute(delete(reviews).where(reviews.c.id.in_(review_ids)))
+                db.commit()
+                self.current_reviews_deleted += len(review_ids)
+                self.reviews_purged += len(review_ids)
+                self.batches += 1
+                if self._stopping.wait(self.pause):
+                    return False
+
+            db.execute(delete(models.book_genres).where(models.book_genres.c.book_id == book_id))
+            deleted = db.execute(
+                delete(books).where(books.c.id == book_id, books.c.deleted_at.is_not(None))
+            ).rowcount
+            db.commit()
+        finally:
+            self.current_book = None
+        if deleted:
+            self.books_purged += 1
+            logger.info("Purged book %d and %d of its reviews", book_id, self.current_reviews_deleted)
+        return bool(deleted)
+
+    def _run(self):
+        """
+        Pętla wątku: czeka na wake() lub upływ interval i usuwa oczekujące książki
+        """
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            started = time.perf_counter()
+            try:
+                with self.session_factory() as db:
+                    purged = self.purge_pending(db)
+            except Exception as e:
+                self.failed_runs += 1
+                self.last_error = str(e)
+                logger.exception("Purging deleted books failed")
+                continue
+            if purged:
+                logger.info("Purged %d deleted books in %.1fs", purged, time.perf_counter() - started)
+
+
+book_purger = BookPurger(
+    SessionLocal,
+    batch_size=settings.PURGE_BATCH_SIZE,
+    pause=settings.PURGE_PAUSE_MS / 1000,
+    interval=settings.PURGE_INTERVAL_SECONDS,
+)
@@ -0,0 +1,303 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+from sqlalchemy.orm import Session
+from .. import schemas
+from ..config import settings
+from ..database import SessionLocal
+from ..metrics import Histogram
+from . import review_service
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # pragma: no cover - bez flock (Windows) zakładany jest jeden proces na katalog spoola
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY_SECONDS = 5.0
+DRAIN_ATTEMPTS = 3
+
+
+class ReviewBufferFull(Exception):
+    """
+    Bufor recenzji jest pełny (lub zamykany) i nie przyjmuje kolejnych recenzji
+    """
+
+
+class ReviewBuffer:
+    """
+    Bufor zapisu recenzji (write-behind). Przyjęte recenzje trafiają najpierw do pliku spool
+    (append-only), a wątek w tle zapisuje je do bazy zbiorczo (group commit) co flush_interval
+    sekund lub po zebraniu batch_size recenzji. Po restarcie niezapisane recenzje są odtwarzane ze spoola.
+    Każdy proces pisze do własnego pliku spool_path.<pid> zablokowanego flock, a przy starcie przejmuje
+    niezablokowane spoole procesów, które już nie działają
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        spool_path: str,
+        capacity: int = 10000,
+        batch_size: int = 1000,
+        flush_interval: float = 0.05,
+        fsync: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.spool_path = spool_path
+        self.own_spool_path = f"{spool_path}.{os.getpid()}"
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending: list[tuple[int, schemas.ReviewBatchItem]] = []
+        self._seq = 0
+        self._spool = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.flush_duration = Histogram()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Blokuje własny spool, przejmuje niezapisane recenzje z własnego i osieroconych spooli
+        i uruchamia wątek zapisujący
+        """
+        if self.running:
+            return
+        with self._cond:
+            spool = open(self.own_spool_path, "a+", encoding="utf-8")
+            if not _try_lock(spool):
+                spool.close()
+                raise RuntimeError(f"Review spool {self.own_spool_path} is locked by another process")
+            orphans = self._lock_orphans()
+            try:
+                items = self._recover(spool)
+                for orphan in orphans:
+                    items.extend(self._recover(orphan))
+                self._pending = list(enumerate(items, start=1))
+                self._seq = len(self._pending)
+                self._rewrite_spool(spool)
+                for orphan in orphans:
+                    os.unlink(orphan.name)
+            finally:
+                for orphan in orphans:
+                    orphan.close()
+            self._spool = spool
+            self._stopping = False
+        if self._pending:
+            logger.info("Recovered %d buffered reviews into %s", len(self._pending), self.own_spool_path)
+        self._thread = threading.Thread(target=self._run, name="review-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """
+        Zatrzymuje przyjmowanie recenzji i czeka aż bufor zostanie opróżniony do bazy.
+        Recenzje, których nie udało się zapisać, zostają w spoolu do odtworzenia przy kolejnym starcie
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._cond:
+            if self._spool is not None:
+                if not self._pending:
+                    os.unlink(self.own_spool_path)
+                self._spool.close()
+                self._spool = None
+
+    def submit(self, item: schemas.ReviewBatchItem) -> int:
+        """
+        Przyjmuje recenzję do bufora i zapisuje ją w spoolu. Zwraca jej numer w buforze.
+        Rzuca ReviewBufferFull gdy bufor jest pełny (backpressure) lub zamykany
+        """
+        with self._cond:
+            if self._stopping or self._spool is None or len(self._pending) >= self.capacity:
+                self.rejected += 1
+                raise ReviewBufferFull()
+            self._seq += 1
+            self._append({"seq": self._seq, "item": item.model_dump()})
+            self._pending.append((self._seq, item))
+            self.accepted += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            return self._seq
+
+    def stats(self) -> dict:
+        """
+        Zwraca metryki bufora do serializacji JSON
+        """
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "running": self.running,
+            "spool": self.own_spool_path,
+            "pending": pending,
+            "capacity": self.capacity,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "flush_duration_seconds": self.flush_duration.snapshot(),
+        }
+
+    def _run(self):
+        """
+        Pętla wątku zapisującego: czeka na pełną paczkę lub upływ flush_interval i zapisuje paczkę do bazy
+        """
+        retry_delay = self.flush_interval
+        failed_drains = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._stopping,
+                    timeout=self.flush_interval,
+                )
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = self._pending[:self.batch_size]
+
+            if self._flush(batch):
+                retry_delay = self.flush_interval
+                with self._cond:
+                    del self._pending[:len(batch)]
+                    self._checkpoint(batch[-1][0])
+                continue
+
+            if self._stopping:
+                failed_drains += 1
+                if failed_drains >= DRAIN_ATTEMPTS:
+                    logger.error("Could not drain review buffer, %d reviews left in spool", len(self._pending))
+                    return
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY_SECONDS)
+
+    def _flush(self, batch: list[tuple[int, schemas.ReviewBatchItem]]) -> bool:
+        """
+        Zapisuje paczkę recenzji w jednej transakcji, zwraca False w przypadku błędu bazy
+        """
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            result = review_service.create_reviews_batch(db, [item for _, item in batch])
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Flushing %d buffered reviews failed", len(batch))
+            return False
+        finally:
+            db.close()
+        self.flush_duration.observe(time.perf_counter() - started)
+        self.flushed += result.created
+        if result.failed:
+            logger.warning("Skipped %d buffered reviews of deleted books", result.failed)
+        return True
+
+    def _append(self, record: dict):
+        """
+        Dopisuje rekord do spoola (wywoływane pod blokadą)
+        """
+        self._spool.write(json.dumps(record) + "\n")
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _checkpoint(self, seq: int):
+        """
+        Oznacza w spoolu recenzje do seq włącznie jako zapisane. Gdy bufor jest pusty, spool jest czyszczony
+        """
+        if self._spool is None:
+            return
+        if self._pending:
+            self._append({"committed": seq})
+        else:
+            self._spool.truncate(0)
+
+    def _lock_orphans(self) -> list:
+        """
+        Otwiera i blokuje spoole procesów, które już nie działają (ich flock został zwolniony).
+        Spoole działających procesów są zablokowane i pomijane
+        """
+        orphans = []
+        for path in sorted({self.spool_path, *glob.glob(glob.escape(self.spool_path) + ".*")}):
+            if path == self.own_spool_path or path.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            try:
+                spool = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            # Plik mógł zostać przejęty i usunięty przez inny proces między open() a flock()
+            if _try_lock(spool) and os.fstat(spool.fileno()).st_nlink > 0:
+                orphans.append(spool)
+            else:
+                spool.close()
+        return orphans
+
+    @staticmethod
+    def _recover(spool) -> list[schemas.ReviewBatchItem]:
+        """
+        Czyta spool od początku i zwraca recenzje, które nie zostały oznaczone jako zapisane
+        """
+        spool.seek(0)
+        entries = []
+        committed = 0
+        for line in spool:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Niedokończony zapis ostatniej linii przy awarii procesu
+                continue
+            if "committed" in record:
+                committed = max(committed, record["committed"])
+            else:
+                entries.append((record["seq"], schemas.ReviewBatchItem.model_validate(record["item"])))
+        return [item for seq, item in entries if seq > committed]
+
+    def _rewrite_spool(self, spool):
+        """
+        Zapisuje od nowa własny spool zawierający tylko niezapisane recenzje. Osierocone spoole
+        można usunąć dopiero po fsync, więc recenzje nie giną przy awarii w trakcie przejmowania
+        """
+        spool.seek(0)
+        spool.truncate()
+        for seq, item in self._pending:
+            spool.write(json.dumps({"seq": seq, "item": item.model_dump()}) + "\n")
+        spool.flush()
+        os.fsync(spool.fileno())
+
+
+def _try_lock(spool) -> bool:
+    """
+    Zakłada na plik wyłączną blokadę flock bez czekania, zwraca False gdy trzyma ją inny proces
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+review_buffer = ReviewBuffer(
+    SessionLocal,
+    settings.REVIEW_SPOOL_PATH,
+    capacity=settings.REVIEW_BUFFER_CAPACITY,
+    batch_size=settings.REVIEW_BUFFER_BATCH_SIZE,
+    flush_interval=settings.REVIEW_BUFFER_FLUSH_MS / 1000,
+    fsync=settings.REVIEW_SPOOL_FSYNC,
+)
@@ -1,18 +1,165 @@
+from collections import Counter, defaultdict
+from sqlalchemy import Float, bindparam, case, cast, func, insert, select, update
 from .. import models, schemas
+from ..cache import response_cache
+from ..pubsub import publish_stats_delta
+from . import book_service
 from sqlalchemy.orm import Session
 
+RATINGS = range(1, 6)
+BATCH_CHUNK_SIZE = 1000
+
 def create_review(db: Session, review: schemas.ReviewCreate, book_id: int):
     """
-    Dodaje recenzję do książki
+    Dodaje recenzję do książki i w tej samej transakcji aktualizuje zagregowane oceny książki
     """
     db_review = models.ReviewDB(**review.dict(), book_id=book_id)
     db.add(db_review)
+    add_ratings(db, book_id, [review.rating])
     db.commit()
+    response_cache.invalidate_book(book_id, book_service.get_book_genre_names(db, book_id))
+    publish_stats_delta(reviews=1)
     db.refresh(db_review)
     return db_review
 
+def get_reviews(db: Session, book_id: int, after: int = None, limit: int = 20, rating: int = None):
+    """
+    Pobiera stronę recenzji książki od najnowszych (paginacja keyset po indeksie book_id, id)
+    :param after: ID ostatniej recenzji z poprzedniej strony
+    :param limit: rozmiar strony
+    :param rating: opcjonalny filtr oceny
+    """
+    review = models.ReviewDB
+    book = models.BookDB
+    live_book = select(book.id).where(book.id == book_id, book.deleted_at.is_(None)).exists()
+    query = db.query(review).filter(review.book_id == book_id, live_book)
+    if rating is not None:
+        query = query.filter(review.rating == rating)
+    if after is not None:
+        query = query.filter(review.id < after)
+    return query.order_by(review.id.desc()).limit(limit).all()
+
 def count_reviews(db: Session) -> int:
     """
-    Zwraca liczbę wszystkich recenzji w systemie
+    Zwraca liczbę wszystkich recenzji w systemie, bez recenzji książek usuniętych
+    logicznie i czekających jeszcze na fizyczne usunięcie. Pozostałe recenzje takich książek
+    liczone są wprost z tabeli (po indeksie book_id), więc wynik jest dokładny także w trakcie usuwania
+    """
+    books = models.BookDB.__table__
+    reviews = models.ReviewDB.__table__
+    deleted_books = select(books.c.id).where(books.c.deleted_at.is_not(None))
+    pending = db.scalar(select(func.count()).select_from(reviews).where(reviews.c.book_id.in_(deleted_books)))
+    return db.query(models.ReviewDB).count() - pending
+
+def add_ratings(db: Session, book_id: int, ratings: list[int]):
+    """
+    Dolicza oceny do zagregowanych statystyk książki jednym poleceniem UPDATE, bez zatwierdzania transakcji
+    """
+    add_ratings_many(db, {book_id: ratings})
+
+def add_ratings_many(db: Session, ratings_by_book: dict[int, list[int]]):
+    """
+    Dolicza oceny do zagregowanych statystyk wielu książek naraz: jedno polecenie UPDATE
+    wykonywane zbiorczo (executemany) z przyrostami każdej książki, bez zatwierdzania transakcji
+    """
+    params = []
+    for book_id, ratings in ratings_by_book.items():
+        counts = Counter(ratings)
+        row = {"b_id": book_id, "added_count": len(ratings), "added_sum": sum(ratings)}
+        row.update({f"added_{rating}": counts[rating] for rating in RATINGS})
+        params.append(row)
+    if params:
+        db.execute(_add_ratings_statement(), params)
+
+def _add_ratings_statement():
+    """
+    Buduje UPDATE doliczający przyrosty ocen podane jako parametry b_id, added_count, added_sum i added_1..5
+    """
+    book = models.BookDB.__table__.c
+    added_count = bindparam("added_count")
+    added_sum = bindparam("added_sum")
+    # Średnia jest pierwsza, bo MySQL wylicza kolejne przypisania SET na już zmienionych wartościach
+    values = [
+        (book.average_rating, cast(book.rating_sum + added_sum, Float) / (book.review_count + added_count)),
+        (book.review_count, book.review_count + added_count),
+        (book.rating_sum, book.rating_sum + added_sum),
+    ]
+    for rating in RATINGS:
+        column = book[f"rating_count_{rating}"]
+        values.append((column, column + bindparam(f"added_{rating}")))
+    return update(models.BookDB.__table__).where(book.id == bindparam("b_id")).ordered_values(*values)
+
+def create_reviews_batch(
+    db: Session,
+    items: list[schemas.ReviewBatchItem],
+    chunk_size: int = BATCH_CHUNK_SIZE
+) -> schemas.ReviewBatchResult:
+    """
+    Zapisuje wiele recenzji w jednej transakcji: istnienie książek sprawdzane jest jednym zapytaniem IN,
+    recenzje wstawiane wielowierszowym INSERT po chunk_size, a oceny doliczane zbiorczo.
+    Recenzje nieistniejących książek są pomijane i oznaczane w wyniku
+    """
+    existing = book_service.existing_book_ids(db, (item.book_id for item in items))
+    result = schemas.ReviewBatchResult()
+    rows = []
+    ratings_by_book = defaultdict(list)
+    for index, item in enumerate(items):
+        if item.book_id in existing:
+            rows.append({"book_id": item.book_id, "rating": item.rating, "comment": item.comment})
+            ratings_by_book[item.book_id].append(item.rating)
+            status = "created"
+        else:
+            status = "book_not_found"
+        result.items.append(schemas.ReviewBatchItemResult(index=index, book_id=item.book_id, status=status))
+    result.created = len(rows)
+    result.failed = len(items) - len(rows)
+    if not rows:
+        return result
+
+    try:
+        for start in range(0, len(rows), chunk_size):
+            db.execute(insert(models.ReviewDB).values(rows[start:start + chunk_size]))
+        add_ratings_many(db, ratings_by_book)
+        genres = book_service.get_genre_names_of_books(db, ratings_by_book.keys())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    response_cache.invalidate_books(ratings_by_book.keys(), genres)
+    publish_stats_delta(reviews=result.created)
+    return result
+
+def recompute_rating_aggregates(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Przelicza od nowa zagregowane oceny wszystkich książek na podstawie tabeli reviews
+    i unieważnia wszystkie odpowiedzi w cache. Zwraca liczbę książek posiadających recenzje
     """
-    return db.query(models.ReviewDB).count()
\ No newline at end of file
+    review = models.ReviewDB
+    histogram_columns = [
+        func.sum(case((review.rating == rating, 1), else_=0)) for rating in RATINGS
+    ]
+    rows = (
+        db.query(review.book_id, func.count(review.id), func.sum(review.rating), *histogram_columns)
+        .group_by(review.book_id)
+        .all()
+    )
+
+    reset = {f"rating_count_{rating}": 0 for rating in RATINGS}
+    db.execute(update(models.BookDB).values(review_count=0, rating_sum=0, average_rating=0, **reset))
+
+    params = []
+    for book_id, review_count, rating_sum, *histogram in rows:
+        row = {
+            "id": book_id,
+            "review_count": review_count,
+            "rating_sum": rating_sum,
+            "average_rating": rating_sum / review_count,
+        }
+        row.update({f"rating_count_{rating}": count for rating, count in zip(RATINGS, histogram)})
+        params.append(row)
+
+    for start in range(0, len(params), chunk_size):
+        db.execute(update(models.BookDB), params[start:start + chunk_size])
+    db.commit()
+    response_cache.invalidate_all()
+    return len(params)
@@ -0,0 +1,273 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from operator import itemgetter
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, noload, selectinload
+from .. import models
+
+TOKEN_RE = re.compile(r"\w+")
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "description": 1.0}
+MAX_PREFIX_EXPANSIONS = 50
+CANDIDATES_PER_TERM = 1000
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Dzieli tekst na znormalizowane tokeny: małe litery, bez znaków diakrytycznych
+    """
+    text = (text or "").lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text.replace("ł", "l"))
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_RE.findall(text)
+
+
+class SearchIndex:
+    """
+    Odwrócony indeks tytułów, autorów i opisów książek w pamięci procesu, z rankingiem BM25,
+    dla baz bez indeksu FULLTEXT (np. SQLite).
+    Wkład terminu w wynik (bez idf) liczony jest przy dodawaniu książki, a dla każdego terminu
+    trzymana jest lista najlepszych kandydatów, więc zapytanie nie przegląda całych list postingów.
+    Posortowany słownik terminów obsługuje wyszukiwanie po prefiksie
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75, candidates_per_term: int = CANDIDATES_PER_TERM):
+        self.k1 = k1
+        self.b = b
+        self.candidates_per_term = candidates_per_term
+        self.ready = False
+        self._postings: dict[str, dict[int, float]] = {}
+        self._documents: dict[int, tuple[list[str], float]] = {}
+        self._candidates: dict[str, list[tuple[int, float]]] = {}
+        self._total_length = 0.0
+        self._terms: list[str] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, book_id: int, title: str, author: str, description: str):
+        """
+        Dodaje książkę do indeksu lub zastępuje jej poprzednią wersję
+        """
+        frequencies = Counter()
+        for field, text in (("title", title), ("author", author), ("description", description)):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                frequencies[token] += weight
+        length = sum(frequencies.values())
+
+        with self._lock:
+            self._remove(book_id)
+            self._documents[book_id] = (list(frequencies), length)
+            self._total_length += length
+            average_length = self._total_length / len(self._documents)
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            for term, frequency in frequencies.items():
+                impact = frequency * (self.k1 + 1) / (frequency + norm)
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[book_id] = impact
+                candidates = self._candidates.get(term)
+                if candidates is not None and (len(candidates) < self.candidates_per_term
+                                               or impact > candidates[-1][1]):
+                    del self._candidates[term]
+
+    def remove(self, book_id: int):
+        """
+        Usuwa książkę z indeksu
+        """
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id: int):
+        document = self._documents.pop(book_id, None)
+        if document is None:
+            return
+        terms, length = document
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            impact = postings.pop(book_id)
+            candidates = self._candidates.get(term)
+            if candidates is not None and impact >= candidates[-1][1]:
+                del self._candidates[term]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def clear(self):
+        with self._lock:
+            self.ready = False
+            self._postings.clear()
+            self._documents.clear()
+            self._candidates.clear()
+            self._terms.clear()
+            self._total_length = 0.0
+
+    def expand_prefix(self, prefix: str, limit: int = MAX_PREFIX_EXPANSIONS) -> list[str]:
+        """
+        Zwraca terminy zaczynające się od prefiksu, najczęstsze najpierw
+        """
+        with self._lock:
+            start = bisect.bisect_left(self._terms, prefix)
+            end = bisect.bisect_left(self._terms, prefix + "\U0010ffff")
+            candidates = self._terms[start:end]
+            return heapq.nlargest(limit, candidates, key=lambda term: len(self._postings[term]))
+
+    def _term_candidates(self, term: str, needed: int) -> list[tuple[int, float]]:
+        """
+        Zwraca książki z największym wkładem terminu; lista jest cache'owana do zmiany postingów
+        """
+        postings = self._postings[term]
+        if needed > self.candidates_per_term:
+            return heapq.nlargest(needed, postings.items(), key=itemgetter(1))
+        candidates = self._candidates.get(term)
+        if candidates is None:
+            candidates = heapq.nlargest(self.candidates_per_term, postings.items(), key=itemgetter(1))
+            self._candidates[term] = candidates
+        return candidates
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, prefix: bool = False) -> tuple[int, list[tuple[int, float]]]:
+        """
+        Zwraca liczbę trafień i stronę par (ID książki, wynik BM25) posortowanych malejąco po wyniku.
+        Przy prefix=True ostatnie słowo zapytania traktowane jest jako prefiks
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return 0, []
+
+        with self._lock:
+            document_count = len(self._documents)
+            terms = dict.fromkeys(tokens)
+            if prefix:
+                terms.pop(tokens[-1], None)
+                terms.update(dict.fromkeys(self.expand_prefix(tokens[-1])))
+            postings = {term: self._postings[term] for term in terms if term in self._postings}
+            if not postings:
+                return 0, []
+
+            idf = {
+                term: math.log(1 + (document_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for term, term_postings in postings.items()
+            }
+            candidates = set()
+            for term in postings:
+                candidates.update(book_id for book_id, _ in self._term_candidates(term, offset + limit))
+            scores = {
+                book_id: sum(idf[term] * term_postings.get(book_id, 0.0) for term, term_postings in postings.items())
+                for book_id in candidates
+            }
+            if len(postings) == 1:
+                total = len(next(iter(postings.values())))
+            else:
+                total = len(set().union(*postings.values()))
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return total, top[offset:]
+
+
+def build_index(db: Session, index: SearchIndex, batch_size: int = 1000):
+    """
+    Buduje indeks od zera ze wszystkich książek w bazie. Indeks przyjmuje zmiany już w trakcie budowania
+    """
+    index.clear()
+    index.ready = True
+    stmt = (
+        select(models.BookDB.id, models.BookDB.title, models.BookDB.author, models.BookDB.description)
+        .where(models.BookDB.deleted_at.is_(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for book_id, title, author, description in db.execute(stmt):
+        index.add(book_id, title, author, description)
+
+
+def ensure_index(db: Session, index: SearchIndex = None) -> SearchIndex:
+    """
+    Buduje indeks przy pierwszym użyciu, jeśli nie zbudowano go przy starcie aplikacji (np. w skryptach i testach)
+    """
+    index = index or search_index
+    if not index.ready:
+        build_index(db, index)
+    return index
+
+
+def search_books(db: Session, query: str, limit: int = 20, offset: int = 0, prefix: bool = False,
+                 index: SearchIndex = None) -> tuple[int, list[models.BookDB]]:
+    """
+    Wyszukuje książki pełnotekstowo i zwraca liczbę trafień oraz stronę książek w kolejności rankingu.
+    Na MySQL używa indeksu FULLTEXT, na pozostałych bazach indeksu w pamięci procesu
+    """
+    if db.get_bind().dialect.name == "mysql":
+        total, ids = _search_fulltext(db, query, limit, offset, prefix)
+    else:
+        total, hits = ensure_index(db, index).search(query, limit, offset, prefix)
+        ids = [book_id for book_id, _ in hits]
+
+    books = {
+        book.id: book
+        for book in db.query(models.BookDB)
+        .options(selectinload(models.BookDB.genres), noload(models.BookDB.reviews))
+        .filter(models.BookDB.id.in_(ids), models.BookDB.deleted_at.is_(None))
+    }
+    return total, [books[book_id] for book_id in ids if book_id in books]
+
+
+def suggest_titles(db: Session, text: str, limit: int = 10) -> list[str]:
+    """
+    Podpowiedzi do autouzupełniania: tytuły najlepiej pasujących książek, ostatnie słowo jako prefiks
+    """
+    _, books = search_books(db, text, limit, 0, prefix=True)
+    return [book.title for book in books]
+
+
+def _search_fulltext(db: Session, query: str, limit: int, offset: int, prefix: bool) -> tuple[int, list[int]]:
+    """
+    Wyszukiwanie w indeksie FULLTEXT MySQL w trybie boolean, ranking według trafności MATCH ... AGAINST
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return 0, []
+    if prefix:
+        tokens[-1] += "*"
+    relevance = mysql.match(
+        models.BookDB.title, models.BookDB.author, models.BookDB.description, against=" ".join(tokens)
+    ).in_boolean_mode()
+
+    live = models.BookDB.deleted_at.is_(None)
+    total = db.query(func.count(models.BookDB.id)).filter(relevance > 0, live).scalar()
+    ids = [
+        book_id for (book_id,) in
+        db.query(models.BookDB.id)
+        .filter(relevance > 0, live)
+        .order_by(relevance.desc(), models.BookDB.id)
+        .offset(offset)
+        .limit(limit)
+    ]
+    return total, ids
+
+
+def index_book(book_id: int, title: str, author: str, description: str):
+    """
+    Aktualizuje wpis książki w indeksie, jeśli indeks jest używany w tym procesie (MySQL go nie buduje)
+    """
+    if search_index.ready:
+        search_index.add(book_id, title, author, description)
+
+
+def unindex_book(book_id: int):
+    """
+    Usuwa książkę z indeksu, jeśli indeks jest używany w tym procesie
+    """
+    if search_index.ready:
+        search_index.remove(book_id)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..pubsub import STATS_CHANNEL, pubsub
+from . import book_service, review_service
+
+logger = logging.getLogger(__name__)
+
+
+def read_stats(db: Session) -> dict:
+    """
+    Zwraca statystyki systemu wysyłane przez WebSocket
+    """
+    return {
+        "total_books": book_service.count_books(db),
+        "total_reviews": review_service.count_reviews(db)
+    }
+
+async def _read_stats_with_new_session() -> dict:
+    """
+    Odczytuje statystyki we własnej asynchronicznej sesji bazy danych
+    """
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(read_stats)
+
+
+class Subscription:
+    """
+    Kolejka statystyk jednego klienta WebSocket o ograniczonym rozmiarze
+    """
+    def __init__(self, max_pending: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = False
+
+    def offer(self, stats: dict) -> bool:
+        """
+        Wstawia statystyki do kolejki. Zwraca False gdy klient nie nadąża z odbiorem
+        """
+        try:
+            self.queue.put_nowait(stats)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def drop(self):
+        """
+        Odłącza wolnego klienta - czyści kolejkę i wstawia znacznik końca
+        """
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[dict]:
+        """
+        Czeka na kolejne statystyki, None oznacza że klient został odłączony
+        """
+        return await self.queue.get()
+
+
+class StatsBroadcaster:
+    """
+    Jedno współdzielone zadanie, które raz na tick rozsyła statystyki wszystkim podłączonym klientom,
+    tylko wtedy gdy się zmieniły. Statystyki nie są liczone w bazie co tick: zapisy publikują przez events
+    zmiany liczby książek i recenzji, a pełny odczyt z bazy (resync) wykonywany jest raz na resync_interval
+    i rozsyłany do pozostałych procesów, które dzięki temu nie odpytują bazy same
+    """
+    def __init__(
+        self,
+        interval: float,
+        max_pending: int,
+        reader=_read_stats_with_new_session,
+        events=None,
+        resync_interval: Optional[float] = None,
+    ):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.resync_interval = interval if resync_interval is None else resync_interval
+        self._reader = reader
+        self.events = events
+        self._subscribers: set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._current: Optional[dict] = None
+        self._resync_at = 0.0
+        self.latest: Optional[dict] = None
+        self.resyncs = 0
+        if events is not None:
+            events.subscribe(STATS_CHANNEL, self._on_event)
+
+    def subscribe(self) -> Subscription:
+        """
+        Rejestruje nowego klienta i uruchamia zadanie rozgłaszające przy pierwszym kliencie
+        """
+        subscription = Subscription(self.max_pending)
+        if self.latest is not None:
+            subscription.offer(self.latest)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Wyrejestrowuje klienta i zatrzymuje zadanie gdy nikt nie słucha
+        """
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._current = None
+            self.latest = None
+
+    def publish(self, stats: dict):
+        """
+        Rozsyła statystyki do klientów, pomija niezmienione wartości i odłącza klientów którzy nie nadążają
+        """
+        if stats == self.latest:
+            return
+        self.latest = stats
+        for subscription in list(self._subscribers):
+            if not subscription.offer(stats):
+                self._subscribers.discard(subscription)
+                subscription.drop()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _on_event(self, event: dict):
+        """
+        Handler zdarzeń statystyk, wywoływany w wątku publikującym lub odbierającym zdarzenia
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._apply_event, event)
+
+    def _apply_event(self, event: dict):
+        """
+        Nakłada zmianę liczników lub statystyki odczytane z bazy przez inny proces
+        """
+        if self._task is None or self._current is None:
+            return
+        if "snapshot" in event:
+            if self.events is None or event.get("worker") != self.events.worker_id:
+                self._current = event["snapshot"]
+                self._schedule_resync()
+            return
+        self._current = {
+            "total_books": self._current["total_books"] + event["books"],
+            "total_reviews": self._current["total_reviews"] + event["reviews"],
+        }
+
+    def _schedule_resync(self):
+        # Losowe przesunięcie, żeby procesy nie odczytywały statystyk z bazy jednocześnie
+        self._resync_at = time.monotonic() + self.resync_interval * random.uniform(1, 1.2)
+
+    async def _resync(self):
+        """
+        Odczytuje statystyki z bazy i rozsyła je do pozostałych procesów
+        """
+        self._current = await self._reader()
+        self.resyncs += 1
+        self._schedule_resync()
+        if self.events is not None:
+            event = {"snapshot": self._current, "worker": self.events.worker_id}
+            await asyncio.to_thread(self.events.publish, STATS_CHANNEL, event)
+
+    async def _run(self):
+        """
+        Pętla rozgłaszania statystyk, zapytania resync wykonywane są asynchronicznie
+        """
+        while True:
+            try:
+                if self._current is None or time.monotonic() >= self._resync_at:
+                    await self._resync()
+                self.publish(self._current)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stats refresh failed")
+            await asyncio.sleep(self.interval)
+
+
+broadcaster = StatsBroadcaster(
+    settings.STATS_INTERVAL_SECONDS,
+    settings.STATS_MAX_PENDING,
+    events=pubsub,
+    resync_interval=settings.STATS_RESYNC_SECONDS,
+)
@@ -0,0 +1,60 @@
+import asyncio
+from collections import Counter
+import httpx
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from benchmarks.seed import seed_catalogue
+from benchmarks.workload import Workload, parse_sql_metrics, percentile, queries_per_request
+from src import models
+
+
+def test_percentile_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 95) == 0
+
+
+def test_queries_per_request_from_metrics():
+    before = parse_sql_metrics(
+        'http_request_sql_statements_sum{route="/books/"} 10.0\n'
+        'http_request_sql_statements_count{route="/books/"} 5\n'
+    )
+    after = parse_sql_metrics(
+        'http_request_sql_statements_sum{route="/books/"} 40.0\n'
+        'http_request_sql_statements_count{route="/books/"} 15\n'
+        'http_request_sql_duration_seconds_sum{route="/books/"} 0.05\n'
+    )
+    assert queries_per_request(before, after) == {"/books/": {"requests": 10, "statements": 3.0, "sql_ms": 5.0}}
+
+
+def test_seed_catalogue_is_skewed():
+    engine = create_engine("sqlite:///:memory:")
+    popularity = seed_catalogue(engine, books=200, reviews=5000, skew=1.1, seed=1)
+
+    with Session(engine) as db:
+        assert db.scalar(select(func.count(models.BookDB.id))) == 200
+        counts = Counter(dict(db.execute(select(models.BookDB.id, models.BookDB.review_count)).all()))
+        assert sum(counts.values()) == 5000
+        assert counts[popularity[0]] > 10 * counts[popularity[100]]
+        assert db.scalar(select(func.count()).select_from(models.book_genres)) >= 200
+
+
+def test_rejected_writes_are_not_counted_as_errors():
+    statuses = {"GET": 200, "POST": 429}
+    transport = httpx.MockTransport(lambda request: httpx.Response(statuses[request.method], json=[]))
+
+    async def run() -> dict:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            workload = Workload(client, [1, 2, 3], {"get_book": 1, "add_review": 1}, skew=1.1, seed=1)
+            await workload.run(concurrency=2, duration=0.05)
+            statuses["GET"] = 500
+            await workload.run(concurrency=1, duration=0.02)
+            return workload.report(0.07)
+
+    report = asyncio.run(run())
+    assert report["operations"]["add_review"]["rejected"] > 0
+    assert report["operations"]["add_review"]["errors"] == 0
+    assert report["operations"]["get_book"]["errors"] > 0
+    assert report["total"]["rejected"] == report["operations"]["add_review"]["rejected"]
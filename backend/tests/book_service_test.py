@@ -1,9 +1,11 @@
+import json
 import pytest
-from sqlalchemy import create_engine
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from src.database import Base
-from src.services import book_service
-from src import schemas
+from src.services import book_service, genre_service, review_service
+from src import encoding, models, schemas
 
 @pytest.fixture(scope="function")
 def db_session():
@@ -73,6 +75,47 @@ def test_get_books_all_and_filter(db_session):
     assert scifi_books[0].title == "SciFi Book"
 
 
+def test_get_books_keyset_pagination(db_session):
+    for i in range(5):
+        book_service.create_book(db_session, schemas.BookCreate(
+            title=f"Book {i}", author="AAAAA", description="A test description with enough length.",
+            year_published=2020, pages=100
+        ))
+
+    first_page = book_service.get_books(db_session, limit=2)
+    assert [b.title for b in first_page] == ["Book 0", "Book 1"]
+
+    second_page = book_service.get_books(db_session, limit=2, after=first_page[-1].id)
+    assert [b.title for b in second_page] == ["Book 2", "Book 3"]
+
+    last_page = book_service.get_books(db_session, limit=2, after=second_page[-1].id)
+    assert [b.title for b in last_page] == ["Book 4"]
+
+
+def test_get_top_books(db_session):
+    def add_book(title, genre, ratings):
+        book = book_service.create_book(db_session, schemas.BookCreate(
+            title=title, author="AAAAA", description="A test description with enough length.",
+            year_published=2020, pages=100, genres=[genre]
+        ))
+        for rating in ratings:
+            review_service.create_review(db_session, schemas.ReviewCreate(rating=rating, comment="Some comment"), book.id)
+        return book
+
+    add_book("Good", schemas.GenreEnum.FANTASY, [4, 5])
+    add_book("Best", schemas.GenreEnum.HISTORY, [5, 5])
+    add_book("Lucky", schemas.GenreEnum.FANTASY, [5])
+    add_book("Unrated", schemas.GenreEnum.FANTASY, [])
+
+    top = book_service.get_top_books(db_session, min_reviews=2)
+    assert [b.title for b in top] == ["Best", "Good"]
+
+    top_fantasy = book_service.get_top_books(db_session, genre=schemas.GenreEnum.FANTASY)
+    assert [b.title for b in top_fantasy] == ["Lucky", "Good"]
+
+    assert len(book_service.get_top_books(db_session, limit=1)) == 1
+
+
 def test_update_book_fields(db_session):
     book_in = schemas.BookCreate(
         title="Old Title", author="Old Author",
@@ -148,4 +191,143 @@ def test_count_books(db_session):
     )
     book_service.create_book(db_session, book_in)
 
-    assert book_service.count_books(db_session) == 1
\ No newline at end of file
+    assert book_service.count_books(db_session) == 1
+
+def test_genre_assignment_uses_cached_ids_and_diffs_rows(db_session):
+    genre_ids = genre_service.load_genre_ids(db_session)
+    assert set(genre_ids) == {genre.value for genre in schemas.GenreEnum}
+    genre_service.seed_genres(db_session)
+    assert db_session.query(models.GenreDB).count() == len(schemas.GenreEnum)
+
+    book = book_service.create_book(db_session, schemas.BookCreate(
+        title="Genres", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.FANTASY, schemas.GenreEnum.HISTORY]
+    ))
+    assert {genre.name for genre in book.genres} == {"Fantasy", "History"}
+
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    update = schemas.BookUpdate(
+        title="Genres", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.FANTASY, schemas.GenreEnum.ROMANCE]
+    )
+    book = book_service.update_book(db_session, book.id, update)
+    assert {genre.name for genre in book.genres} == {"Fantasy", "Romance"}
+    genre_writes = [sql for sql in statements if "book_genres" in sql and not sql.startswith("SELECT")]
+    assert len(genre_writes) == 2
+    assert not any("FROM genres" in sql and "genres.name =" in sql for sql in statements)
+
+
+def test_cold_genre_map_does_not_commit_the_callers_transaction(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'genres.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with session_local() as db:
+        genre_service.seed_genres(db)
+        db.add(models.BookDB(title="Kept", author="AAAAA", description="Description", year_published=2020, pages=10))
+        db.commit()
+
+    with session_local() as db:
+        db.query(models.BookDB).update({models.BookDB.title: "Half-finished"})
+        assert set(genre_service.get_genre_ids(db)) == {genre.value for genre in schemas.GenreEnum}
+        db.rollback()
+        assert db.query(models.BookDB.title).scalar() == "Kept"
+    engine.dispose()
+
+
+def test_multi_genre_filters_and_facets(db_session):
+    fiction, fantasy, history = schemas.GenreEnum.FICTION, schemas.GenreEnum.FANTASY, schemas.GenreEnum.HISTORY
+    for title, year, pages, genres in [
+        ("A", 1995, 100, [fiction]),
+        ("B", 2001, 300, [fiction, fantasy]),
+        ("C", 2009, 500, [fantasy, history]),
+        ("D", 2015, 50, []),
+    ]:
+        book_service.create_book(db_session, schemas.BookCreate(
+            title=title, author="AAAAA", description="A test description with enough length.",
+            year_published=year, pages=pages, genres=genres
+        ))
+
+    def titles(**filters):
+        return [book.title for book in book_service.get_books(db_session, filters=schemas.BookFilter(**filters))]
+
+    assert titles(genre=[fiction, fantasy]) == ["A", "B", "C"]
+    assert titles(genre=[fiction, fantasy], genre_match="all") == ["B"]
+    assert titles(year_from=2000, year_to=2010) == ["B", "C"]
+    assert titles(genre=[fantasy], pages_max=400) == ["B"]
+
+    facets = book_service.get_book_facets(db_session, schemas.BookFilter())
+    assert facets.total == 4
+    assert facets.genres == {"Fiction": 2, "Fantasy": 2, "History": 1}
+    assert facets.decades == {1990: 1, 2000: 2, 2010: 1}
+
+    facets = book_service.get_book_facets(db_session, schemas.BookFilter(genre=[fantasy], year_to=2005))
+    assert (facets.total, facets.genres, facets.decades) == (1, {"Fiction": 1, "Fantasy": 1}, {2000: 1})
+
+
+def test_book_rows_match_response_schemas(db_session):
+    for index, genres in enumerate([[schemas.GenreEnum.FANTASY, schemas.GenreEnum.HISTORY], [], [schemas.GenreEnum.ROMANCE]]):
+        book = book_service.create_book(db_session, schemas.BookCreate(
+            title=f"Book {index}", author="AAAAA", description="A test description with enough length.",
+            year_published=2000 + index, pages=100, genres=genres
+        ))
+        for rating in range(1, index + 3):
+            review_service.create_review(db_session, schemas.ReviewCreate(rating=rating, comment="Some comment"), book.id)
+
+    for include_reviews, schema in ((True, schemas.BookResponse), (False, schemas.BookListItem)):
+        adapter = TypeAdapter(list[schema])
+        expected = json.loads(adapter.dump_json(adapter.validate_python(
+            book_service.get_books(db_session, include_reviews=include_reviews), from_attributes=True
+        )))
+        rows = json.loads(encoding.dumps(book_service.get_book_rows(db_session, include_reviews=include_reviews)))
+        assert rows == expected
+
+    detail = book_service.get_book_rows(db_session, book_id=book.id)
+    assert schemas.BookResponse.model_validate(detail[0]).recent_reviews[0].rating == 4
+
+
+def test_book_rows_select_only_requested_fields(db_session):
+    book = book_service.create_book(db_session, schemas.BookCreate(
+        title="Sparse", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.FANTASY]
+    ))
+    book_id = book.id
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=5, comment="Great book"), book_id)
+
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    rows = book_service.get_book_rows(db_session, fields=("title", "author"))
+    assert rows == [{"id": book_id, "title": "Sparse", "author": "AAAAA"}]
+    assert len(statements) == 1
+    assert "description" not in statements[0] and "rating_count" not in statements[0]
+
+    summary = book_service.get_book_rows(db_session, book_id=book_id, fields=schemas.BOOK_FIELD_SETS["summary"])
+    assert schemas.BookSummary.model_validate(summary[0]).genres[0].name == schemas.GenreEnum.FANTASY
+    assert "recent_reviews" not in summary[0]
+
+
+@pytest.mark.parametrize("update_returning", [True, False])
+def test_update_book_checks_version_in_single_update(db_session, monkeypatch, update_returning):
+    monkeypatch.setattr(db_session.get_bind().dialect, "update_returning", update_returning)
+    book = book_service.create_book(db_session, schemas.BookCreate(
+        title="Versioned", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.FANTASY]
+    ))
+    book_id = book.id
+    assert book.version == 1
+
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    updated = book_service.update_book(db_session, book_id, schemas.BookPatch(pages=300), expected_version=1)
+    assert (updated.version, updated.pages, updated.title) == (2, 300, "Versioned")
+    assert updated.genres[0].name == "Fantasy"
+    updates = [sql for sql in statements if sql.startswith("UPDATE books")]
+    assert len(updates) == 1 and "books.version = ?" in updates[0]
+    book_reads = [sql for sql in statements if sql.startswith("SELECT") and "\nFROM books " in sql]
+    assert len(book_reads) == (0 if update_returning else 1)
+
+    with pytest.raises(book_service.VersionConflict) as conflict:
+        book_service.update_book(db_session, book_id, schemas.BookPatch(title="Stale"), expected_version=1)
+    assert conflict.value.current_version == 2
+    assert book_service.get_book_by_id(db_session, book_id).title == "Versioned"
+    assert book_service.update_book(db_session, 999, schemas.BookPatch(title="Missing")) is None
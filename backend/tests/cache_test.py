@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import fakeredis
+import pytest
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.cache import MemoryCacheBackend, NoCacheBackend, RedisCacheBackend, ResponseCache, response_cache
+from src.database import Base
+from src.services import book_service, review_service
+from src import schemas
+
+@pytest.fixture(scope="function")
+def db_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        response_cache.backend.clear()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        backend = MemoryCacheBackend(max_entries=2)
+    else:
+        backend = RedisCacheBackend(client=fakeredis.FakeRedis())
+    return ResponseCache(backend, ttl=60)
+
+
+def test_memory_backend_lru_and_ttl(monkeypatch):
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", b"1", ttl=60)
+    backend.set("b", b"2", ttl=60)
+    backend.get("a")
+    backend.set("c", b"3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+
+    assert backend.incr("gen:book:1", ttl=60) == 1
+    monkeypatch.setattr("src.cache.time.monotonic", lambda: 10 ** 9)
+    assert backend.get("a") is None
+    assert backend.get_counter("gen:book:1") == 0
+
+
+def test_response_cache_round_trip(cache):
+    stored = cache.set(cache.book_key(1), b'{"id": 1}')
+    assert stored.etag.startswith('"')
+    assert cache.get(cache.book_key(1)) == stored
+
+    cache.invalidate_book(1)
+    assert cache.get(cache.book_key(1)) is None
+
+
+def test_book_read_before_invalidation_is_not_served_after_it(cache):
+    key = cache.book_key(1)
+    cache.invalidate_book(1)
+    # Odpowiedź odczytana z bazy przed zapisem trafia pod klucz poprzedniej generacji
+    cache.set(key, b'{"id": 1, "title": "Old"}')
+
+    assert cache.book_key(1) != key
+    assert cache.get(cache.book_key(1)) is None
+
+
+def test_redis_invalidations_from_the_event_loop_run_in_background():
+    cache = ResponseCache(RedisCacheBackend(client=fakeredis.FakeRedis()), ttl=60)
+    key = cache.book_key(1)
+    cache.set(key, b"{}")
+    threads = []
+    incr = cache.backend.incr
+    cache.backend.incr = lambda *args, **kwargs: threads.append(threading.current_thread().name) or incr(*args, **kwargs)
+
+    async def write():
+        cache.invalidate_book(1, ["Fantasy"])
+        await cache.flush()
+        return await cache.run(cache.book_key, 1)
+
+    assert asyncio.run(write()) != key
+    assert threads and all(name.startswith("cache-invalidation") for name in threads)
+
+
+def test_listing_invalidated_only_for_affected_genres(cache):
+    all_key = cache.listing_key(None, limit=10)
+    fantasy_key = cache.listing_key("Fantasy", limit=10)
+    history_key = cache.listing_key("History", limit=10)
+    for key in (all_key, fantasy_key, history_key):
+        cache.set(key, b"[]")
+
+    cache.invalidate_book(5, ["Fantasy"])
+
+    assert cache.listing_key(None, limit=10) != all_key
+    assert cache.listing_key("Fantasy", limit=10) != fantasy_key
+    assert cache.listing_key("History", limit=10) == history_key
+    assert cache.get(history_key) is not None
+
+
+def test_writes_invalidate_cached_book(db_session):
+    book_in = schemas.BookCreate(
+        title="Cached", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.ROMANCE]
+    )
+    book = book_service.create_book(db_session, book_in)
+    romance_key = response_cache.listing_key("Romance")
+    response_cache.set(response_cache.book_key(book.id), b"{}")
+
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=3, comment="Average book"), book.id)
+
+    assert response_cache.get(response_cache.book_key(book.id)) is None
+    assert response_cache.listing_key("Romance") != romance_key
+
+
+def test_listing_validators_follow_catalogue_version(cache):
+    request = lambda headers: Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+    key = cache.listing_key("Fantasy", limit=10)
+    validators = cache.listing_validators("Fantasy", key)
+    assert validators.etag.startswith('W/"')
+    assert validators.matches(request({"If-None-Match": validators.etag}))
+    assert validators.matches(request({"If-None-Match": validators.etag.removeprefix("W/")}))
+    last_modified = validators.headers()["Last-Modified"]
+    assert validators.matches(request({"If-Modified-Since": last_modified}))
+
+    cache.invalidate_book(1, ["Fantasy"])
+    new_key = cache.listing_key("Fantasy", limit=10)
+    assert not cache.listing_validators("Fantasy", new_key).matches(request({"If-None-Match": validators.etag}))
+
+    cache.backend.clear()
+    assert cache.listing_key("Fantasy", limit=10) != key
+
+
+def test_listing_validators_expire_with_ttl(cache, monkeypatch):
+    request = lambda headers: Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+    now = 10 ** 9
+    monkeypatch.setattr("src.cache.time.time", lambda: now)
+    key = cache.listing_key(None, limit=10)
+    validators = cache.listing_validators(None, key)
+
+    # Zmiana katalogu poza aplikacją nie podbija generacji, ale po upływie ttl walidatory się zmieniają
+    now += cache.ttl
+    new_key = cache.listing_key(None, limit=10)
+    assert new_key != key
+    new_validators = cache.listing_validators(None, new_key)
+    assert not new_validators.matches(request({"If-None-Match": validators.etag}))
+    assert not new_validators.matches(request({"If-Modified-Since": validators.headers()["Last-Modified"]}))
+
+
+def test_invalidate_all_changes_every_key_and_validator(cache, monkeypatch):
+    request = lambda headers: Request({"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+    now = 10 ** 9
+    monkeypatch.setattr("src.cache.time.time", lambda: now)
+    cache.invalidate_book(1, ["Fantasy"])
+    book_key = cache.book_key(1)
+    key, validators = cache.listing("Fantasy", limit=10)
+
+    now += 1
+    cache.invalidate_all()
+
+    assert cache.book_key(1) != book_key
+    new_key, new_validators = cache.listing("Fantasy", limit=10)
+    assert new_key != key
+    assert not new_validators.matches(request({"If-None-Match": validators.etag}))
+    assert not new_validators.matches(request({"If-Modified-Since": validators.headers()["Last-Modified"]}))
+
+
+def test_disabled_cache_has_no_listing_validators():
+    cache = ResponseCache(NoCacheBackend(), ttl=60)
+    assert cache.listing_validators(None, cache.listing_key(None, limit=10)) is None
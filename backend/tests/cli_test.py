@@ -0,0 +1,33 @@
+from sqlalchemy import create_engine, inspect
+from src.cli import upgrade_schema
+from src.database import Base
+
+
+def test_upgrade_adds_missing_columns_and_indexes_to_existing_tables():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as connection:
+        # Schemat sprzed wersjonowania, zagregowanych ocen i usuwania logicznego
+        connection.exec_driver_sql(
+            "CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR(150), author VARCHAR(100),"
+            " description TEXT, year_published INTEGER, pages INTEGER)"
+        )
+        connection.exec_driver_sql("INSERT INTO books (title) VALUES ('Old book')")
+    Base.metadata.create_all(bind=engine)
+
+    applied = upgrade_schema(engine)
+
+    assert any("ADD COLUMN version" in statement for statement in applied)
+    assert any("ADD COLUMN deleted_at" in statement for statement in applied)
+    assert "CREATE INDEX ix_books_rating_rank ON books" in applied
+    assert upgrade_schema(engine) == []
+    with engine.connect() as connection:
+        row = connection.exec_driver_sql("SELECT version, review_count, average_rating, deleted_at FROM books").one()
+        assert tuple(row) == (1, 0, 0.0, None)
+        columns = {column["name"] for column in inspect(connection).get_columns("books")}
+    assert columns == set(Base.metadata.tables["books"].columns.keys())
+
+
+def test_upgrade_of_current_schema_does_nothing():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    assert upgrade_schema(engine) == []
@@ -0,0 +1,104 @@
+import asyncio
+import gzip
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.compression import CompressionMiddleware, choose_encoding
+from src.database import Base, get_async_db
+from src.routes import books
+
+PAYLOAD = '{"description": "' + "a long description " * 200 + '"}'
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+@app.get("/large")
+def large():
+    return Response(PAYLOAD, media_type="application/json", headers={"ETag": '"abc"'})
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("ok")
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse((f'{{"line": {i}}}\n' for i in range(1000)), media_type="application/x-ndjson")
+
+@app.get("/binary")
+def binary():
+    return Response(b"\x00" * 5000, media_type="application/octet-stream")
+
+client = TestClient(app)
+
+
+def test_choose_encoding_respects_quality_and_server_preference():
+    assert choose_encoding("gzip, br", ("br", "gzip")) == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5", ("br", "gzip")) == "gzip"
+    assert choose_encoding("br;q=0, *", ("br", "gzip")) == "gzip"
+    assert choose_encoding("identity", ("br", "gzip")) is None
+    assert choose_encoding("", ("gzip",)) is None
+
+
+def test_large_responses_are_compressed_and_etag_weakened():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(PAYLOAD) / 10
+    assert response.text == PAYLOAD
+
+
+def test_small_binary_and_unaccepted_responses_are_not_compressed():
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/binary", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_streaming_responses_are_compressed_chunk_by_chunk():
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert len(lines) == 1000 and lines[-1] == '{"line": 999}'
+
+
+def test_weakened_version_etag_round_trips_through_if_match():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+
+    async def create_schema():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    session_local = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get_db():
+        async with session_local() as db:
+            yield db
+
+    api = FastAPI()
+    api.add_middleware(CompressionMiddleware, minimum_size=100)
+    api.include_router(books.router)
+    api.dependency_overrides[get_async_db] = get_db
+    client = TestClient(api, headers={"Accept-Encoding": "gzip"})
+
+    book = client.post("/books/", json={
+        "title": "Compressed", "author": "AAAAA", "description": "A long description. " * 50,
+        "year_published": 2020, "pages": 100,
+    }).json()
+    etag = client.get(f"/books/{book['id']}").headers["etag"]
+    assert etag.startswith('W/"1-')
+
+    first = client.patch(f"/books/{book['id']}", json={"pages": 101}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"] == 'W/"2"'
+
+    second = client.patch(f"/books/{book['id']}", json={"pages": 102}, headers={"If-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] == 'W/"3"'
+    stale = client.patch(f"/books/{book['id']}", json={"pages": 103}, headers={"If-Match": first.headers["etag"]})
+    assert stale.status_code == 412
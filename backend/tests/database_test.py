@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.database import Base, PoolMetrics, TimedQueuePool, backoff_delays, pool_stats, to_async_url
+from src.services import book_service, review_service
+from src import schemas
+
+@pytest.fixture(scope="function")
+def loop():
+    loop = asyncio.new_event_loop()
+    try:
+        yield loop
+    finally:
+        loop.close()
+
+
+@pytest.fixture(scope="function")
+def async_session(loop):
+    """
+    Tworzy nową asynchroniczną bazę SQLite w pamięci dla każdego testu
+    """
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    session_local = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return session_local()
+
+    db = loop.run_until_complete(setup())
+    try:
+        yield db
+    finally:
+        loop.run_until_complete(db.close())
+        loop.run_until_complete(engine.dispose())
+
+
+def test_to_async_url():
+    assert to_async_url("mysql+pymysql://root:root@db/bookdb") == "mysql+aiomysql://root:root@db/bookdb"
+    assert to_async_url("sqlite:///books.db") == "sqlite+aiosqlite:///books.db"
+    assert to_async_url("mysql+aiomysql://root:root@db/bookdb") == "mysql+aiomysql://root:root@db/bookdb"
+
+
+def test_backoff_delays_grow_up_to_maximum():
+    assert list(itertools.islice(backoff_delays(0.1, 1.0), 6)) == [0.1, 0.2, 0.4, 0.8, 1.0, 1.0]
+
+
+def test_timed_pool_stats(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=TimedQueuePool, pool_logging_name="test-pool",
+        pool_size=1, max_overflow=0, pool_timeout=0.01
+    )
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        busy = pool_stats("test-pool", engine.pool)
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    stats = pool_stats("test-pool", engine.pool)
+    assert busy["checked_out"] == 1
+    assert stats["checked_out"] == 0
+    assert stats["size"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds"]["count"] == 2
+    assert stats["wait_seconds"]["buckets"]["+Inf"] == 2
+    assert stats["recent_wait_seconds"] > 0
+    engine.dispose()
+
+
+def test_recent_pool_wait_decays_without_checkouts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.database.time.monotonic", lambda: now[0])
+    metrics = PoolMetrics()
+    for _ in range(20):
+        metrics.observe_wait(1.0)
+    assert metrics.recent_wait() == pytest.approx(1.0, rel=0.02)
+    now[0] += 2
+    assert metrics.recent_wait() == pytest.approx(0.25, rel=0.02)
+
+
+def test_service_results_serialize_outside_session(loop, async_session):
+    book_in = schemas.BookCreate(
+        title="Async Book", author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.MYSTERY]
+    )
+
+    async def scenario():
+        created = await async_session.run_sync(book_service.create_book, book_in)
+        await async_session.run_sync(
+            review_service.create_review, schemas.ReviewCreate(rating=4, comment="Good ........"), created.id
+        )
+        found = await async_session.run_sync(book_service.get_book_by_id, created.id)
+        listed = await async_session.run_sync(book_service.get_books, None, 10, None, False)
+        return created, found, listed
+
+    created, found, listed = loop.run_until_complete(scenario())
+
+    # Walidacja poza run_sync nie może wywołać leniwego ładowania relacji
+    assert schemas.BookResponse.model_validate(created).genres[0].name == schemas.GenreEnum.MYSTERY
+    assert schemas.BookResponse.model_validate(found).recent_reviews[0].rating == 4
+    assert schemas.BookResponse.model_validate(found).review_count == 1
+    assert schemas.BookListItem.model_validate(listed[0]).title == "Async Book"
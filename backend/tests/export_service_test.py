@@ -0,0 +1,85 @@
+import asyncio
+import csv
+import json
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.database import Base
+from src.services import book_service, export_service, import_service, review_service
+from src import schemas
+
+@pytest.fixture(scope="function")
+def loop():
+    loop = asyncio.new_event_loop()
+    try:
+        yield loop
+    finally:
+        loop.close()
+
+
+@pytest.fixture(scope="function")
+def async_session(loop):
+    """
+    Tworzy nową asynchroniczną bazę SQLite w pamięci z trzema książkami
+    """
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    session_local = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    def add_catalogue(db):
+        for i in range(3):
+            book = book_service.create_book(db, schemas.BookCreate(
+                title=f"Book {i}", author="AAAAA", description="A test description with enough length.",
+                year_published=2020, pages=100, genres=[schemas.GenreEnum.FANTASY, schemas.GenreEnum.HISTORY][:i]
+            ))
+            review_service.create_review(db, schemas.ReviewCreate(rating=i + 1, comment="Some comment"), book.id)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        db = session_local()
+        await db.run_sync(add_catalogue)
+        return db
+
+    db = loop.run_until_complete(setup())
+    try:
+        yield db
+    finally:
+        loop.run_until_complete(db.close())
+        loop.run_until_complete(engine.dispose())
+
+
+def collect(loop, db, exporter):
+    async def run():
+        return "".join([chunk async for chunk in exporter(db)])
+
+    return loop.run_until_complete(run())
+
+
+def test_iter_book_batches(loop, async_session):
+    async def run():
+        return [batch async for batch in export_service.iter_book_batches(async_session, batch_size=2)]
+
+    batches = loop.run_until_complete(run())
+    assert [[book.title for book in batch] for batch in batches] == [["Book 0", "Book 1"], ["Book 2"]]
+
+
+def test_export_ndjson(loop, async_session):
+    rows = [json.loads(line) for line in collect(loop, async_session, export_service.export_ndjson).splitlines()]
+
+    assert [row["title"] for row in rows] == ["Book 0", "Book 1", "Book 2"]
+    assert rows[2]["genres"] == ["Fantasy", "History"]
+    assert rows[2]["review_count"] == 1
+    assert rows[2]["rating_count_3"] == 1
+
+
+def test_export_csv_can_be_imported_back(loop, async_session):
+    exported = collect(loop, async_session, export_service.export_csv)
+    rows = list(csv.DictReader(exported.splitlines()))
+    assert rows[2]["genres"] == "Fantasy|History"
+    assert rows[1]["average_rating"] == "2.0"
+
+    def reimport(db):
+        report = import_service.import_books(db, import_service.parse_rows(exported.splitlines(True), "csv"))
+        return report.imported_books, len(book_service.get_books(db, genre=schemas.GenreEnum.HISTORY))
+
+    assert loop.run_until_complete(async_session.run_sync(reimport)) == (3, 2)
@@ -0,0 +1,118 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.database import Base, get_db
+from src.routes import books
+from src.services import book_service, import_service, review_service
+from src import schemas
+
+@pytest.fixture(scope="function")
+def db_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def book_row(title, **extra):
+    return {
+        "title": title, "author": "AAAAA", "description": "A test description with enough length.",
+        "year_published": 2020, "pages": 100, **extra
+    }
+
+
+@pytest.mark.parametrize("returning", [True, False], ids=["insert-returning", "insert-per-book"])
+def test_import_ndjson_with_reviews(db_session, monkeypatch, returning):
+    # Bez RETURNING w kolejności parametrów (MySQL) książki wstawiane są pojedynczo
+    monkeypatch.setattr(
+        db_session.get_bind().dialect, "insert_executemany_returning_sort_by_parameter_order", returning
+    )
+    lines = [
+        json.dumps(book_row("First", genres=["Fantasy", "History"], reviews=[
+            {"rating": 5, "comment": "Great book!"}, {"rating": 3, "comment": "It was fine"}
+        ])),
+        "",
+        json.dumps(book_row("Second", genres=["Fantasy"])),
+        json.dumps(book_row("Third")),
+    ]
+    rows = import_service.parse_rows(lines, "ndjson")
+    report = import_service.import_books(db_session, rows, chunk_size=2)
+
+    assert report.processed == 3
+    assert report.imported_books == 3
+    assert report.imported_reviews == 2
+    assert report.failed == 0
+    assert book_service.count_books(db_session) == 3
+    assert review_service.count_reviews(db_session) == 2
+
+    first = book_service.get_books(db_session, limit=1)[0]
+    assert sorted(genre.name for genre in first.genres) == ["Fantasy", "History"]
+    assert first.review_count == 2
+    assert first.average_rating == 4
+    assert len(book_service.get_books(db_session, genre=schemas.GenreEnum.FANTASY)) == 2
+    second = book_service.get_books(db_session, genre=schemas.GenreEnum.FANTASY)[1]
+    assert second.title == "Second" and second.review_count == 0
+
+
+def test_import_csv_reports_row_errors(db_session):
+    lines = [
+        "title,author,description,year_published,pages,genres\n",
+        "Good,AAAAA,A test description with enough length.,2020,100,Fantasy|Romance\n",
+        "Bad,AAAAA,short,2020,100,\n",
+        "Unknown,AAAAA,A test description with enough length.,2020,100,Poetry\n",
+    ]
+    rows = import_service.parse_rows(lines, "csv")
+    report = import_service.import_books(db_session, rows)
+
+    assert report.processed == 3
+    assert report.imported_books == 1
+    assert report.failed == 2
+    assert [error.line for error in report.errors] == [3, 4]
+    assert report.errors[0].error.startswith("description")
+    assert book_service.count_books(db_session) == 1
+
+
+def test_import_ndjson_invalid_json(db_session):
+    report = import_service.import_books(db_session, import_service.parse_rows(["{not json"], "ndjson"))
+
+    assert report.failed == 1
+    assert report.errors[0].line == 1
+
+
+def test_bulk_import_route_accepts_uploaded_file():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_test_db():
+        with session_local() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(books.router)
+    app.dependency_overrides[get_db] = get_test_db
+    csv_file = (
+        "title,author,description,year_published,pages,genres\r\n"
+        "Zażółć,AAAAA,\"A test description, with enough length.\",2020,100,Fantasy|Romance\r\n"
+    ).encode()
+    try:
+        response = TestClient(app).post(
+            "/books/bulk", params={"format": "csv"}, files={"file": ("books.csv", csv_file, "text/csv")}
+        )
+        assert response.status_code == 200
+        assert response.json()["imported_books"] == 1
+        with session_local() as db:
+            assert [book.title for book in book_service.get_books(db)] == ["Zażółć"]
+    finally:
+        Base.metadata.drop_all(bind=engine)
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src import instrumentation, schemas
+from src.database import Base
+from src.instrumentation import InstrumentedRoute, instrument_engine, instrument_orm, record_request
+from src.services import book_service
+
+
+@pytest.fixture(scope="module")
+def client():
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    instrument_engine(engine)
+    instrument_orm(Base)
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = session_local()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with session_local() as db:
+        for title in ("First", "Second"):
+            book_service.create_book(db, schemas.BookCreate(
+                title=title, author="AAAAA", description="A test description with enough length.",
+                year_published=2020, pages=10
+            ))
+
+    router = APIRouter(route_class=InstrumentedRoute)
+
+    @router.get("/instrumented/{limit}", response_model=list[schemas.BookListItem])
+    def list_books(limit: int, db=Depends(get_db)):
+        return book_service.get_books(db, limit=limit, include_reviews=False)
+
+    app = FastAPI()
+    app.include_router(router)
+    app.middleware("http")(record_request)
+    yield TestClient(app)
+    Base.metadata.drop_all(bind=engine)
+
+
+def test_request_records_sql_rows_and_serialization(client):
+    histograms = [
+        family.labels("/instrumented/{limit}") for family in (
+            instrumentation.request_sql_statements, instrumentation.request_rows_loaded,
+            instrumentation.request_serialization,
+        )
+    ]
+    before = [(histogram.count, histogram.sum) for histogram in histograms]
+
+    assert len(client.get("/instrumented/10").json()) == 2
+
+    statements, rows, serialization = [
+        (histogram.count - count, histogram.sum - total) for histogram, (count, total) in zip(histograms, before)
+    ]
+    assert statements == (1, 2)
+    assert rows == (1, 2)
+    assert serialization[0] == 1 and serialization[1] > 0
+    duration = instrumentation.request_duration.labels("GET", "/instrumented/{limit}", 200)
+    assert duration.count >= 1
+
+
+def test_slow_requests_are_logged_with_sql(client, caplog, monkeypatch):
+    monkeypatch.setattr(instrumentation.settings, "SLOW_REQUEST_MS", 0)
+    with caplog.at_level("WARNING", logger="src.instrumentation"):
+        client.get("/instrumented/1")
+    assert "Slow request GET /instrumented/1 -> 200" in caplog.text
+    assert "SELECT books.id" in caplog.text
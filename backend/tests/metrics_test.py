@@ -0,0 +1,26 @@
+from src.metrics import Histogram, HistogramFamily, render_counters
+
+
+def test_histogram_cumulative_buckets():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == 3.65
+    assert snapshot["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+
+
+def test_histogram_family_renders_prometheus_text():
+    family = HistogramFamily("request_seconds", "Request latency", ("route",), buckets=(0.1, 1.0))
+    family.labels("/books/").observe(0.5)
+    family.labels('/a"b').observe(2.0)
+
+    lines = family.render()
+    assert lines[:2] == ["# HELP request_seconds Request latency", "# TYPE request_seconds histogram"]
+    assert 'request_seconds_bucket{route="/books/",le="0.1"} 0' in lines
+    assert 'request_seconds_bucket{route="/books/",le="1.0"} 1' in lines
+    assert 'request_seconds_count{route="/books/"} 1' in lines
+    assert 'request_seconds_bucket{route="/a\\"b",le="+Inf"} 1' in lines
+    assert render_counters("timeouts_total", "Timeouts", [({"pool": "sync"}, 3)])[-1] == 'timeouts_total{pool="sync"} 3'
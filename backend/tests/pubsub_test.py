@@ -0,0 +1,99 @@
+import threading
+import fakeredis
+import pytest
+from src.cache import MemoryCacheBackend, ResponseCache
+from src.pubsub import CACHE_CHANNEL, MemoryPubSub, RedisPubSub
+
+@pytest.fixture()
+def workers():
+    server = fakeredis.FakeServer()
+    workers = [RedisPubSub(client=fakeredis.FakeRedis(server=server), worker_id=f"worker-{i}") for i in range(2)]
+    yield workers
+    for worker in workers:
+        worker.stop()
+
+
+class Collector:
+    def __init__(self, expected: int):
+        self.events = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, event: dict):
+        self.events.append(event)
+        if len(self.events) >= self.expected:
+            self.done.set()
+
+
+def test_memory_pubsub_skips_own_events_when_asked():
+    events = MemoryPubSub()
+    received, remote_only = [], []
+    events.subscribe("stats", received.append)
+    events.subscribe("stats", remote_only.append, include_own=False)
+
+    events.publish("stats", {"books": 1, "reviews": 0})
+
+    assert received == [{"books": 1, "reviews": 0}]
+    assert remote_only == []
+
+
+def test_redis_pubsub_fans_out_between_workers(workers):
+    first, second = workers
+    all_events, remote_events = Collector(2), Collector(1)
+    first.subscribe("stats", all_events)
+    first.subscribe("stats", remote_events, include_own=False)
+    second.subscribe("stats", lambda event: None)
+    assert first.start() and second.start()
+
+    first.publish("stats", {"books": 1, "reviews": 0})
+    second.publish("stats", {"books": 0, "reviews": 2})
+
+    assert all_events.done.wait(5)
+    assert remote_events.done.wait(5)
+    assert {"books": 0, "reviews": 2} in all_events.events and {"books": 1, "reviews": 0} in all_events.events
+    assert remote_events.events == [{"books": 0, "reviews": 2}]
+
+
+def test_invalidation_reaches_memory_caches_of_other_workers(workers):
+    caches = [ResponseCache(MemoryCacheBackend(), ttl=60, events=worker) for worker in workers]
+    applied = Collector(1)
+    workers[1].subscribe(CACHE_CHANNEL, applied)
+    for worker in workers:
+        assert worker.start()
+    for cache in caches:
+        cache.set(cache.book_key(7), b"{}")
+    listing_key = caches[1].listing_key("Fantasy", limit=10)
+
+    caches[0].invalidate_book(7, ["Fantasy"])
+
+    assert applied.done.wait(5)
+    assert caches[1].get(caches[1].book_key(7)) is None
+    assert caches[1].listing_key("Fantasy", limit=10) != listing_key
+
+    applied = Collector(1)
+    workers[1].subscribe(CACHE_CHANNEL, applied)
+    book_key = caches[1].book_key(7)
+    caches[0].invalidate_all()
+    assert applied.done.wait(5)
+    assert caches[1].book_key(7) != book_key
+
+
+def test_redis_publish_does_not_wait_for_redis(workers):
+    release = threading.Event()
+    client = workers[0].client
+    sent = []
+
+    def slow_publish(channel, message):
+        release.wait(5)
+        sent.append(channel)
+        return client.__class__.publish(client, channel, message)
+
+    client.publish = slow_publish
+    workers[0].publish("stats", {"books": 1, "reviews": 0})
+    workers[0].publish(CACHE_CHANNEL, {"books": [1], "genres": []})
+
+    assert sent == [] and workers[0].stats()["pending"] == 2
+    release.set()
+    workers[0].flush()
+    assert sent == ["bookapp:stats", "bookapp:cache"]
+    assert workers[0].stats()["published"] == 2 and workers[0].stats()["pending"] == 0
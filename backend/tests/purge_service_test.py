@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from src.database import Base
+from src.services import book_service, review_service
+from src.services.purge_service import BookPurger
+from src import models, schemas
+
+@pytest.fixture(scope="function")
+def session_factory():
+    """
+    Tworzy nową bazę SQLite w pamięci dla każdego testu
+    """
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_book(db, title: str, reviews: int) -> int:
+    book = book_service.create_book(db, schemas.BookCreate(
+        title=title, author="AAAAA", description="A test description with enough length.",
+        year_published=2020, pages=10, genres=[schemas.GenreEnum.FANTASY]
+    ))
+    for rating in range(reviews):
+        review_service.create_review(db, schemas.ReviewCreate(rating=rating % 5 + 1, comment="Good book"), book.id)
+    return book.id
+
+
+def count_rows(db, table, book_id: int) -> int:
+    return db.scalar(select(func.count()).select_from(table).where(table.c.book_id == book_id))
+
+
+def test_deleted_book_is_hidden_before_purge(session_factory):
+    with session_factory() as db:
+        kept_id = create_book(db, "Kept", reviews=2)
+        deleted_id = create_book(db, "Deleted", reviews=3)
+
+        assert book_service.delete_book(db, deleted_id) is True
+        assert book_service.delete_book(db, deleted_id) is False
+
+        assert [book.id for book in book_service.get_books(db)] == [kept_id]
+        assert [row["id"] for row in book_service.get_book_rows(db)] == [kept_id]
+        assert book_service.get_book_by_id(db, deleted_id) is None
+        assert book_service.book_exists(db, deleted_id) is False
+        assert book_service.existing_book_ids(db, [kept_id, deleted_id]) == {kept_id}
+        assert book_service.update_book(db, deleted_id, schemas.BookPatch(title="Revived")) is None
+        assert book_service.count_books(db) == 1
+        assert book_service.get_book_facets(db, schemas.BookFilter()).total == 1
+        assert review_service.get_reviews(db, deleted_id) == []
+        assert review_service.count_reviews(db) == 2
+        # Recenzje zostają w bazie do czasu fizycznego usunięcia
+        assert count_rows(db, models.ReviewDB.__table__, deleted_id) == 3
+
+
+@pytest.mark.parametrize("returning", [True, False], ids=["update-returning", "select-for-update"])
+def test_delete_publishes_review_count_of_the_deleted_row(session_factory, monkeypatch, returning):
+    deltas = []
+    with session_factory() as db:
+        monkeypatch.setattr(db.get_bind().dialect, "update_returning", returning)
+        book_id = create_book(db, "Deleted", reviews=3)
+        monkeypatch.setattr(book_service, "publish_stats_delta", lambda **delta: deltas.append(delta))
+        assert book_service.delete_book(db, book_id) is True
+        assert book_service.delete_book(db, book_id) is False
+        assert book_service.delete_book(db, book_id + 1) is False
+
+    assert deltas == [{"books": -1, "reviews": -3}]
+
+
+def test_purge_removes_reviews_in_batches(session_factory):
+    with session_factory() as db:
+        kept_id = create_book(db, "Kept", reviews=2)
+        deleted_id = create_book(db, "Deleted", reviews=5)
+        book_service.delete_book(db, deleted_id)
+
+    purger = BookPurger(session_factory, batch_size=2, pause=0)
+    with session_factory() as db:
+        assert purger.purge_pending(db) == 1
+
+    assert purger.stats()["batches"] == 3
+    assert purger.stats()["reviews_purged"] == 5
+    assert purger.stats()["books_purged"] == 1
+    assert purger.stats()["current_book"] is None
+    with session_factory() as db:
+        assert db.get(models.BookDB, deleted_id) is None
+        assert count_rows(db, models.ReviewDB.__table__, deleted_id) == 0
+        assert count_rows(db, models.book_genres, deleted_id) == 0
+        assert count_rows(db, models.ReviewDB.__table__, kept_id) == 2
+        assert review_service.count_reviews(db) == 2
+        assert purger.purge_pending(db) == 0
+
+
+def test_review_count_stays_exact_during_purge(session_factory):
+    with session_factory() as db:
+        create_book(db, "Kept", reviews=1)
+        deleted_id = create_book(db, "Deleted", reviews=10)
+        book_service.delete_book(db, deleted_id)
+
+    purger = BookPurger(session_factory, batch_size=4, pause=0)
+    # Zatrzymanie po pierwszej paczce zostawia książkę w połowie usuwania
+    purger._stopping.set()
+    with session_factory() as db:
+        assert purger.purge_book(db, deleted_id) is False
+        assert count_rows(db, models.ReviewDB.__table__, deleted_id) == 6
+        assert review_service.count_reviews(db) == 1
+
+
+def test_purge_skips_books_that_are_not_deleted(session_factory):
+    with session_factory() as db:
+        book_id = create_book(db, "Kept", reviews=1)
+        assert BookPurger(session_factory).purge_book(db, book_id) is False
+        assert book_service.book_exists(db, book_id)
+        assert count_rows(db, models.ReviewDB.__table__, book_id) == 1
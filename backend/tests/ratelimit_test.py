@@ -0,0 +1,117 @@
+import fakeredis
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from src.ratelimit import BULK_BUCKET, AdmissionControl, MemoryTokenBuckets, RedisTokenBuckets
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def client_for(admission: AdmissionControl) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/write", dependencies=[Depends(admission.limit("write"))])
+    async def write():
+        return {"active": admission.concurrency.active()}
+
+    @app.post("/bulk", dependencies=[Depends(admission.limit("bulk", BULK_BUCKET))])
+    async def bulk():
+        return {}
+
+    return TestClient(app)
+
+
+def test_memory_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    buckets = MemoryTokenBuckets(clock=clock)
+    assert [buckets.take("client", rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("client", rate=2, burst=3) == pytest.approx(0.5)
+    assert buckets.take("other", rate=2, burst=3) == 0
+    clock.now += 0.5
+    assert buckets.take("client", rate=2, burst=3) == 0
+    assert buckets.take("client", rate=2, burst=3) > 0
+    clock.now += 10
+    assert [buckets.take("client", rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+
+
+def test_redis_bucket_is_shared_between_workers():
+    server = fakeredis.FakeServer()
+    workers = [RedisTokenBuckets(client=fakeredis.FakeRedis(server=server)) for _ in range(2)]
+    assert workers[0].take("client", rate=1, burst=2) == 0
+    assert workers[1].take("client", rate=1, burst=2) == 0
+    assert workers[0].take("client", rate=1, burst=2) > 0
+    assert workers[1].take("other", rate=1, burst=2) == 0
+
+
+def test_rate_limited_client_gets_429_with_retry_after():
+    admission = AdmissionControl(MemoryTokenBuckets(clock=FakeClock()), rate=0.5, burst=2)
+    client = client_for(admission)
+    assert [client.post("/write").status_code for _ in range(2)] == [200, 200]
+    response = client.post("/write")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert admission.stats()["rejected"] == {"rate_limited": 1}
+
+
+def test_bulk_writes_have_their_own_bucket():
+    admission = AdmissionControl(MemoryTokenBuckets(clock=FakeClock()), rate=100, burst=100, bulk_rate=0.1, bulk_burst=1)
+    client = client_for(admission)
+    assert [client.post("/bulk").status_code for _ in range(2)] == [200, 429]
+    assert client.post("/write").status_code == 200
+    assert admission.stats()["rejected"] == {"rate_limited": 1}
+
+
+def test_bulk_write_routes_are_limited():
+    from src.main import app
+    routes = {route.path: route for route in app.routes if hasattr(route, "dependant")}
+    for path in ("/books/bulk", "/reviews/batch"):
+        calls = [dependency.call.__qualname__ for dependency in routes[path].dependant.dependencies]
+        assert "AdmissionControl.limit.<locals>.dependency" in calls
+
+
+def test_writes_are_shed_when_pool_wait_is_high():
+    pool_wait = [0.5]
+    admission = AdmissionControl(
+        MemoryTokenBuckets(), rate=100, burst=100, max_pool_wait=0.2, pool_wait=lambda: pool_wait[0]
+    )
+    client = client_for(admission)
+    response = client.post("/write")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    pool_wait[0] = 0.01
+    assert client.post("/write").status_code == 200
+
+
+def test_concurrency_cap_per_route_is_released_after_request():
+    admission = AdmissionControl(MemoryTokenBuckets(), rate=100, burst=100, max_concurrency=1)
+    client = client_for(admission)
+    assert client.post("/write").json() == {"active": {"write": 1}}
+    assert admission.concurrency.active() == {}
+
+    assert admission.concurrency.try_acquire("write")
+    response = client.post("/write")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    admission.concurrency.release("write")
+    assert client.post("/write").status_code == 200
+
+
+def test_forwarded_client_is_the_address_added_by_proxy():
+    admission = AdmissionControl(MemoryTokenBuckets(clock=FakeClock()), rate=0.5, burst=1, trust_forwarded=True)
+    client = client_for(admission)
+    assert client.post("/write", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.7"}).status_code == 200
+    # Podmieniony przez klienta początek nagłówka nie daje nowego kubełka
+    assert client.post("/write", headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.7"}).status_code == 429
+    assert client.post("/write", headers={"X-Forwarded-For": "10.0.0.8"}).status_code == 200
+
+
+def test_shared_buckets_are_checked_through_the_http_route():
+    buckets = RedisTokenBuckets(client=fakeredis.FakeRedis())
+    client = client_for(AdmissionControl(buckets, rate=0.5, burst=1))
+    assert [client.post("/write").status_code for _ in range(2)] == [200, 429]
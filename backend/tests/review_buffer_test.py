@@ -0,0 +1,104 @@
+import fcntl
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from src.database import Base
+from src.services import book_service, review_service
+from src.services.review_buffer import ReviewBuffer, ReviewBufferFull
+from src import schemas
+
+@pytest.fixture(scope="function")
+def session_factory():
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_book(session_factory) -> int:
+    with session_factory() as db:
+        book = book_service.create_book(db, schemas.BookCreate(
+            title="Buffered", author="AAAAA", description="A test description with enough length.",
+            year_published=2020, pages=10
+        ))
+        return book.id
+
+
+def review(book_id, rating=5):
+    return schemas.ReviewBatchItem(book_id=book_id, rating=rating, comment="Buffered review")
+
+
+def test_buffer_flushes_reviews_and_drains_on_stop(session_factory, tmp_path):
+    book_id = create_book(session_factory)
+    spool = tmp_path / "spool.ndjson"
+    buffer = ReviewBuffer(session_factory, str(spool), batch_size=2, flush_interval=10)
+    buffer.start()
+    for rating in (5, 4, 3):
+        buffer.submit(review(book_id, rating))
+    buffer.stop()
+
+    with session_factory() as db:
+        assert review_service.count_reviews(db) == 3
+        book = book_service.get_book_by_id(db, book_id)
+        assert (book.review_count, book.average_rating) == (3, 4.0)
+    assert buffer.stats()["flushed"] == 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_buffer_recovers_uncommitted_reviews_from_spool(session_factory, tmp_path):
+    book_id = create_book(session_factory)
+    spool = tmp_path / "spool.ndjson"
+    records = [
+        {"seq": 1, "item": review(book_id, 1).model_dump()},
+        {"seq": 2, "item": review(book_id, 2).model_dump()},
+        {"committed": 2},
+        {"seq": 3, "item": review(book_id, 5).model_dump()},
+    ]
+    spool.write_text("".join(json.dumps(record) + "\n" for record in records) + '{"seq": 4, "it')
+
+    buffer = ReviewBuffer(session_factory, str(spool), flush_interval=0.01)
+    buffer.start()
+    buffer.stop()
+
+    with session_factory() as db:
+        assert [r.rating for r in review_service.get_reviews(db, book_id)] == [5]
+
+
+def test_buffer_takes_over_orphaned_spools_but_not_locked_ones(session_factory, tmp_path):
+    book_id = create_book(session_factory)
+    spool = tmp_path / "spool.ndjson"
+    orphan = tmp_path / "spool.ndjson.999999"
+    orphan.write_text(json.dumps({"seq": 7, "item": review(book_id, 2).model_dump()}) + "\n")
+    live = tmp_path / "spool.ndjson.999998"
+    live.write_text(json.dumps({"seq": 1, "item": review(book_id, 4).model_dump()}) + "\n")
+    with open(live) as live_spool:
+        # Spool działającego procesu jest zablokowany i nie może zostać przejęty
+        fcntl.flock(live_spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        buffer = ReviewBuffer(session_factory, str(spool), flush_interval=10)
+        buffer.start()
+        assert not orphan.exists()
+        assert buffer.stats()["pending"] == 1
+        buffer.stop()
+
+    assert live.exists()
+    with session_factory() as db:
+        assert [r.rating for r in review_service.get_reviews(db, book_id)] == [2]
+
+
+def test_full_buffer_rejects_reviews(session_factory, tmp_path):
+    book_id = create_book(session_factory)
+    buffer = ReviewBuffer(session_factory, str(tmp_path / "spool.ndjson"), capacity=2, flush_interval=10)
+    buffer.start()
+    buffer.submit(review(book_id))
+    buffer.submit(review(book_id))
+    with pytest.raises(ReviewBufferFull):
+        buffer.submit(review(book_id))
+    assert buffer.stats()["rejected"] == 1
+    buffer.stop()
+
+    with pytest.raises(ReviewBufferFull):
+        buffer.submit(review(book_id))
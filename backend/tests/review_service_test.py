@@ -1,6 +1,7 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from src.cache import response_cache
 from src.database import Base
 from src.services import review_service, book_service
 from src import schemas
@@ -49,4 +50,114 @@ def test_count_reviews(db_session):
     review_in = schemas.ReviewCreate(rating=4, comment="Good ..........")
     review_service.create_review(db_session, review_in, book.id)
 
-    assert review_service.count_reviews(db_session) == 1
\ No newline at end of file
+    assert review_service.count_reviews(db_session) == 1
+
+
+def test_create_review_updates_rating_aggregates(db_session):
+    book_in = schemas.BookCreate(
+        title="Rated Book", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    book = book_service.create_book(db_session, book_in)
+    assert book.review_count == 0
+    assert book.average_rating == 0
+
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=5, comment="Great book!"), book.id)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=2, comment="Not so great"), book.id)
+
+    db_session.refresh(book)
+    assert book.review_count == 2
+    assert book.rating_sum == 7
+    assert book.average_rating == 3.5
+    assert book.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
+
+
+def test_recompute_rating_aggregates(db_session):
+    book_in = schemas.BookCreate(
+        title="Drifted Book", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    book = book_service.create_book(db_session, book_in)
+    empty_book = book_service.create_book(db_session, book_in)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=4, comment="Good ..........."), book.id)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=1, comment="Bad ............"), book.id)
+
+    book.review_count = 10
+    empty_book.rating_sum = 50
+    db_session.commit()
+    book_key, listing_key = response_cache.book_key(book.id), response_cache.listing_key(None, limit=10)
+
+    assert review_service.recompute_rating_aggregates(db_session) == 1
+    # Odpowiedzi z cache nie mogą dalej pokazywać starych ocen
+    assert response_cache.book_key(book.id) != book_key
+    assert response_cache.listing_key(None, limit=10) != listing_key
+
+    db_session.refresh(book)
+    db_session.refresh(empty_book)
+    assert book.review_count == 2
+    assert book.average_rating == 2.5
+    assert book.rating_histogram == {1: 1, 2: 0, 3: 0, 4: 1, 5: 0}
+    assert empty_book.rating_sum == 0
+
+
+def test_get_reviews_keyset_pagination(db_session):
+    book_in = schemas.BookCreate(
+        title="Popular", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    book = book_service.create_book(db_session, book_in)
+    other = book_service.create_book(db_session, book_in)
+    for rating in (5, 4, 5, 3, 5):
+        review_service.create_review(db_session, schemas.ReviewCreate(rating=rating, comment="Some comment"), book.id)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=5, comment="Other book"), other.id)
+
+    first_page = review_service.get_reviews(db_session, book.id, limit=2)
+    assert [r.rating for r in first_page] == [5, 3]
+
+    second_page = review_service.get_reviews(db_session, book.id, after=first_page[-1].id, limit=2)
+    assert [r.rating for r in second_page] == [5, 4]
+    assert second_page[0].id < first_page[-1].id
+
+    five_stars = review_service.get_reviews(db_session, book.id, rating=5)
+    assert len(five_stars) == 3
+    assert all(r.book_id == book.id for r in five_stars)
+
+
+def test_book_review_previews_are_bounded(db_session):
+    book_in = schemas.BookCreate(
+        title="Previewed", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    books = [book_service.create_book(db_session, book_in) for _ in range(2)]
+    for i in range(book_service.REVIEW_PREVIEW_SIZE + 2):
+        review_service.create_review(db_session, schemas.ReviewCreate(rating=3, comment=f"Comment {i}"), books[0].id)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=4, comment="Only one"), books[1].id)
+
+    detail = book_service.get_book_by_id(db_session, books[0].id)
+    assert len(detail.recent_reviews) == book_service.REVIEW_PREVIEW_SIZE
+    assert detail.recent_reviews[0].comment == f"Comment {book_service.REVIEW_PREVIEW_SIZE + 1}"
+
+    listing = book_service.get_books(db_session)
+    assert [len(book.recent_reviews) for book in listing] == [book_service.REVIEW_PREVIEW_SIZE, 1]
+
+
+def test_create_reviews_batch(db_session):
+    book_in = schemas.BookCreate(
+        title="Batched", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    first = book_service.create_book(db_session, book_in)
+    second = book_service.create_book(db_session, book_in)
+    review_service.create_review(db_session, schemas.ReviewCreate(rating=1, comment="Existing review"), first.id)
+    items = [
+        schemas.ReviewBatchItem(book_id=first.id, rating=5, comment="Great book!"),
+        schemas.ReviewBatchItem(book_id=999, rating=4, comment="Missing book"),
+        schemas.ReviewBatchItem(book_id=second.id, rating=4, comment="Pretty good"),
+        schemas.ReviewBatchItem(book_id=first.id, rating=3, comment="It was fine"),
+    ]
+
+    result = review_service.create_reviews_batch(db_session, items, chunk_size=2)
+
+    assert (result.created, result.failed) == (3, 1)
+    assert [item.status for item in result.items] == ["created", "book_not_found", "created", "created"]
+    assert review_service.count_reviews(db_session) == 4
+
+    db_session.expire_all()
+    assert (first.review_count, first.rating_sum, first.average_rating) == (3, 9, 3.0)
+    assert first.rating_histogram == {1: 1, 2: 0, 3: 1, 4: 0, 5: 1}
+    assert (second.review_count, second.average_rating) == (1, 4.0)
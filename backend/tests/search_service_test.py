@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database import Base
+from src.services import book_service, search_service
+from src.services.search_service import SearchIndex, tokenize
+from src import schemas
+
+@pytest.fixture(scope="function")
+def db_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+        search_service.search_index.clear()
+
+
+def create_book(db, title, author="AAAAA", description="A test description with enough length."):
+    return book_service.create_book(db, schemas.BookCreate(
+        title=title, author=author, description=description, year_published=2020, pages=100
+    ))
+
+
+def test_tokenize_normalizes_text():
+    assert tokenize("Żółw i Łódź, PAN Tadeusz!") == ["zolw", "i", "lodz", "pan", "tadeusz"]
+
+
+def test_index_ranks_title_matches_first():
+    index = SearchIndex()
+    index.add(1, "Dragons of autumn", "Weis", "A story about a war.")
+    index.add(2, "The war", "Smith", "Dragons appear in this book about dragons.")
+    index.add(3, "Cooking", "Jones", "Recipes for every day.")
+
+    total, hits = index.search("dragons")
+    assert total == 2
+    assert [book_id for book_id, _ in hits] == [1, 2]
+
+    total, hits = index.search("drag", prefix=True)
+    assert total == 2
+
+    index.remove(1)
+    total, hits = index.search("dragons")
+    assert [book_id for book_id, _ in hits] == [2]
+    assert index.search("autumn") == (0, [])
+
+
+def test_index_paging():
+    index = SearchIndex(candidates_per_term=2)
+    for book_id in range(1, 6):
+        index.add(book_id, f"Space opera {book_id}", "Author", "Ships and stars.")
+
+    total, first_page = index.search("space", limit=2)
+    total, second_page = index.search("space", limit=2, offset=2)
+    assert total == 5
+    assert len(first_page) == 2 and len(second_page) == 2
+    assert not {hit[0] for hit in first_page} & {hit[0] for hit in second_page}
+
+
+def test_search_books_follows_writes(db_session):
+    create_book(db_session, "Solaris", author="Stanisław Lem")
+    total, books = search_service.search_books(db_session, "lem")
+    assert total == 1
+    assert books[0].title == "Solaris"
+
+    fiasco = create_book(db_session, "Fiasco", author="Stanisław Lem")
+    assert search_service.search_books(db_session, "stanislaw")[0] == 2
+
+    book_service.update_book(db_session, fiasco.id, schemas.BookUpdate(
+        title="Eden", author="Stanisław Lem", description="A test description with enough length.",
+        year_published=2020, pages=100
+    ))
+    assert search_service.search_books(db_session, "fiasco") == (0, [])
+    assert search_service.suggest_titles(db_session, "ed") == ["Eden"]
+
+    book_service.delete_book(db_session, fiasco.id)
+    assert search_service.search_books(db_session, "eden") == (0, [])
+
+
+def test_index_is_built_at_startup(db_session, monkeypatch):
+    from src import main
+    create_book(db_session, "Dragons of autumn")
+    create_book(db_session, "Cooking")
+    search_service.search_index.clear()
+    engine = db_session.get_bind()
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(bind=engine))
+
+    main.build_search_index()
+
+    assert search_service.search_index.ready
+    assert len(search_service.search_index) == 2
+    assert search_service.search_index.search("dragons")[0] == 1
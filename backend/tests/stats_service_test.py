@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.database import Base
+from src.pubsub import STATS_CHANNEL, MemoryPubSub
+from src.services import book_service, stats_service
+from src import schemas
+
+@pytest.fixture(scope="function")
+def db_session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+
+    session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_local()
+
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_read_stats(db_session):
+    assert stats_service.read_stats(db_session) == {"total_books": 0, "total_reviews": 0}
+
+    book_in = schemas.BookCreate(
+        title="BBBB", author="AAAAA", description="A test description with enough length.", year_published=2020, pages=10
+    )
+    book_service.create_book(db_session, book_in)
+
+    assert stats_service.read_stats(db_session) == {"total_books": 1, "total_reviews": 0}
+
+
+def test_broadcaster_sends_only_changes():
+    async def reader():
+        return {"total_books": 1}
+
+    async def scenario():
+        broadcaster = stats_service.StatsBroadcaster(interval=60, max_pending=8, reader=reader)
+        subscription = broadcaster.subscribe()
+        assert await subscription.get() == {"total_books": 1}
+
+        broadcaster.publish({"total_books": 1})
+        broadcaster.publish({"total_books": 2})
+        assert await subscription.get() == {"total_books": 2}
+        assert subscription.queue.empty()
+
+        broadcaster.unsubscribe(subscription)
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_broadcaster_drops_slow_subscriber():
+    async def reader():
+        return {"total_books": 0}
+
+    async def scenario():
+        broadcaster = stats_service.StatsBroadcaster(interval=60, max_pending=2, reader=reader)
+        subscription = broadcaster.subscribe()
+        await asyncio.sleep(0)
+
+        for i in range(1, 4):
+            broadcaster.publish({"total_books": i})
+
+        assert subscription.dropped is True
+        assert await subscription.get() is None
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_broadcaster_applies_published_deltas_without_polling():
+    reads = []
+
+    async def reader():
+        reads.append(1)
+        return {"total_books": 10, "total_reviews": 100}
+
+    async def scenario():
+        events = MemoryPubSub()
+        broadcaster = stats_service.StatsBroadcaster(
+            interval=0.01, max_pending=8, reader=reader, events=events, resync_interval=60
+        )
+        subscription = broadcaster.subscribe()
+        assert await subscription.get() == {"total_books": 10, "total_reviews": 100}
+
+        events.publish(STATS_CHANNEL, {"books": 1, "reviews": 0})
+        events.publish(STATS_CHANNEL, {"books": 0, "reviews": 3})
+        assert await asyncio.wait_for(subscription.get(), 1) == {"total_books": 11, "total_reviews": 103}
+
+        events.publish(STATS_CHANNEL, {"snapshot": {"total_books": 5, "total_reviews": 50}, "worker": "other"})
+        assert await asyncio.wait_for(subscription.get(), 1) == {"total_books": 5, "total_reviews": 50}
+        assert len(reads) == 1
+
+        broadcaster.unsubscribe(subscription)
+
+    asyncio.run(scenario())
@@ -1,14 +1,27 @@
 import axios from 'axios';
-import type {Book, BookCreate, BookUpdate, ReviewCreate} from './types';
+import type {Book, BookCreate, BookSummary, BookUpdate, Review, ReviewCreate} from './types';
 const API_URL = import.meta.env.VITE_SERVER_HOST;
 
 const api = axios.create({
     baseURL: API_URL,
 });
 
+const PAGE_SIZE = 500;
+export const REVIEWS_PAGE_SIZE = 20;
+
 export const getBooks = async () => {
-    const response = await api.get<Book[]>('/books');
-    return response.data;
+    const books: BookSummary[] = [];
+    let after: number | undefined = undefined;
+    while (true) {
+        const response = await api.get<BookSummary[]>('/books', {
+            params: { limit: PAGE_SIZE, after, fields: 'summary' },
+        });
+        books.push(...response.data);
+        if (response.data.length < PAGE_SIZE) {
+            return books;
+        }
+        after = response.data[response.data.length - 1].id;
+    }
 };
 
 export const getBook = async (id: string) => {
@@ -21,8 +34,9 @@ export const createBook = async (book: BookCreate) => {
     return response.data;
 };
 
-export const updateBook = async (id: number, book: BookUpdate) => {
-    const response = await api.put<Book>(`/books/${id}`, book);
+export const updateBook = async (id: number, book: BookUpdate, version?: number) => {
+    const headers = version === undefined ? {} : { 'If-Match': `"${version}"` };
+    const response = await api.put<Book>(`/books/${id}`, book, { headers });
     return response.data;
 };
 
@@ -33,4 +47,10 @@ export const deleteBook = async (id: number) => {
 export const addReview = async (bookId: number, review: ReviewCreate) => {
     const response = await api.post(`/reviews/${bookId}`, review);
     return response.data;
-};
\ No newline at end of file
+};
+export const getReviews = async (bookId: number, after?: number) => {
+    const response = await api.get<Review[]>(`/reviews/${bookId}`, {
+        params: { limit: REVIEWS_PAGE_SIZE, after },
+    });
+    return response.data;
+};
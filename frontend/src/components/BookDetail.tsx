@@ -1,18 +1,32 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { useForm } from 'react-hook-form';
-import { getBook, addReview } from '../api';
-import type { Book, ReviewCreate } from '../types';
+import axios from 'axios';
+import { getBook, getReviews, addReview, REVIEWS_PAGE_SIZE } from '../api';
+import type { Book, Review, ReviewCreate } from '../types';
 
 export const BookDetail = () => {
     const { id } = useParams();
     const [book, setBook] = useState<Book | null>(null);
+    const [reviews, setReviews] = useState<Review[]>([]);
+    const [hasMoreReviews, setHasMoreReviews] = useState(false);
     const { register, handleSubmit, reset } = useForm<ReviewCreate>();
 
     const fetchBook = async () => {
         if (id) {
             const data = await getBook(id);
             setBook(data);
+            const page = await getReviews(data.id);
+            setReviews(page);
+            setHasMoreReviews(page.length === REVIEWS_PAGE_SIZE);
+        }
+    };
+
+    const loadMoreReviews = async () => {
+        if (book && reviews.length > 0) {
+            const page = await getReviews(book.id, reviews[reviews.length - 1].id);
+            setReviews([...reviews, ...page]);
+            setHasMoreReviews(page.length === REVIEWS_PAGE_SIZE);
         }
     };
 
@@ -20,7 +34,15 @@ export const BookDetail = () => {
 
     const onReviewSubmit = async (data: ReviewCreate) => {
         if (book) {
-            await addReview(book.id, data);
+            try {
+                await addReview(book.id, data);
+            } catch (error) {
+                if (axios.isAxiosError(error) && (error.response?.status === 429 || error.response?.status === 503)) {
+                    alert(`Too many reviews right now. Try again in ${error.response.headers['retry-after'] ?? 1} s.`);
+                    return;
+                }
+                throw error;
+            }
             reset();
             fetchBook();
         }
@@ -35,10 +57,10 @@ export const BookDetail = () => {
             <p>{book.description}</p>
             <hr />
 
-            <h3>Reviews</h3>
-            {book.reviews.length === 0 ? <p>No reviews yet.</p> : (
+            <h3>Reviews ({book.review_count})</h3>
+            {reviews.length === 0 ? <p>No reviews yet.</p> : (
                 <ul style={{ listStyle: 'none', padding: 0 }}>
-                    {book.reviews.map((r) => (
+                    {reviews.map((r) => (
                         <li key={r.id} style={{ background: '#f9f9f9', padding: '10px', marginBottom: '10px', borderRadius: '5px' }}>
                             <strong>Rating: {r.rating}/5</strong>
                             <p>{r.comment}</p>
@@ -46,6 +68,11 @@ export const BookDetail = () => {
                     ))}
                 </ul>
             )}
+            {hasMoreReviews && (
+                <button onClick={loadMoreReviews} style={{ padding: '8px' }}>
+                    Load more reviews
+                </button>
+            )}
 
             <div style={{ marginTop: '30px', borderTop: '2px solid #eee', paddingTop: '20px' }}>
                 <h4>Add a Review</h4>
@@ -1,4 +1,5 @@
-import { useEffect } from 'react';
+import { useEffect, useRef } from 'react';
+import axios from 'axios';
 import { useForm } from 'react-hook-form';
 import { useNavigate, useParams } from 'react-router-dom';
 import { createBook, getBook, updateBook } from '../api';
@@ -9,12 +10,14 @@ export const BookForm = () => {
     const { id } = useParams();
     const navigate = useNavigate();
     const isEditMode = !!id;
+    const version = useRef<number | undefined>(undefined);
 
     const { register, handleSubmit, setValue, formState: { errors } } = useForm<BookCreate>();
 
     useEffect(() => {
         if (isEditMode) {
             getBook(id!).then((book) => {
+                version.current = book.version;
                 setValue('title', book.title);
                 setValue('author', book.author);
                 setValue('description', book.description);
@@ -28,12 +31,20 @@ export const BookForm = () => {
     const onSubmit = async (data: BookCreate) => {
         try {
             if (isEditMode) {
-                await updateBook(Number(id), data);
+                await updateBook(Number(id), data, version.current);
             } else {
                 await createBook(data);
             }
             navigate('/');
         } catch (error) {
+            if (axios.isAxiosError(error) && error.response?.status === 412) {
+                alert("This book was changed by someone else. Reload the page to see the latest version.");
+                return;
+            }
+            if (axios.isAxiosError(error) && (error.response?.status === 429 || error.response?.status === 503)) {
+                alert(`Too many changes right now. Try again in ${error.response.headers['retry-after'] ?? 1} s.`);
+                return;
+            }
             console.error("Error saving book", error);
             alert("Failed to save book. Check console for details.");
         }
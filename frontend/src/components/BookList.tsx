@@ -1,10 +1,10 @@
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { getBooks, deleteBook } from '../api';
-import type { Book } from '../types';
+import type { BookSummary } from '../types';
 
 export const BookList = () => {
-    const [books, setBooks] = useState<Book[]>([]);
+    const [books, setBooks] = useState<BookSummary[]>([]);
 
     useEffect(() => {
         loadBooks();
@@ -19,15 +19,29 @@ export interface Genre {
     name: GenreEnum;
 }
 
-export interface Book {
+export interface BookSummary {
     id: number;
     title: string;
     author: string;
+    genres: Genre[];
+}
+
+export interface BookListItem {
+    id: number;
+    version: number;
+    title: string;
+    author: string;
     description: string;
     year_published: number;
     pages: number;
     genres: Genre[];
-    reviews: Review[];
+    review_count: number;
+    average_rating: number;
+    rating_histogram: Record<number, number>;
+}
+
+export interface Book extends BookListItem {
+    recent_reviews: Review[];
 }
 
 export interface BookCreate {